@@ -0,0 +1,136 @@
+"""
+Benchmark da auditoria vetorizada (auditar_lote) contra a auditoria conta a conta
+Confere também que registros com campos ausentes (colunas_de_registros) recebem no lote
+os mesmos padrões de auditar_conta
+
+Uso: python -m benchmarks.bench_auditoria_lote [--contas 1000000] [--amostra 50000]
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from src.regras_auditoria import RegrasAuditoria
+from src.registros import RegistroConta, colunas_de_registros
+
+
+def gerar_lote(total: int, semente: int = 42):
+    """Gera um lote colunar com as variações de conta usadas nos dados simulados"""
+    aleatorio = np.random.default_rng(semente)
+    consumo = aleatorio.integers(20, 3000, total).astype(float)
+    tarifa = 0.27440 + 0.25141
+    # Cerca de 10% das contas com valor de energia fora da tolerância
+    erro_energia = np.where(aleatorio.random(total) < 0.1, aleatorio.uniform(1.1, 1.5, total), 1.0)
+    valor_total = consumo * tarifa * 1.3
+    bandeiras = np.array(['verde', 'amarela', 'vermelha_1', 'vermelha_2'])
+    bandeira = aleatorio.integers(0, 4, total)
+    valor_kwh_bandeira = np.array([0.0, 0.01874, 0.03971, 0.09492])[bandeira]
+    return {
+        'consumo_kwh': consumo,
+        'valor_energia': consumo * tarifa * erro_energia,
+        'valor_total': valor_total,
+        'icms': np.where(aleatorio.random(total) < 0.05, valor_total * 0.3, valor_total / 1.25 * 0.25),
+        # Cerca de 5% das contas sem o adicional de bandeira
+        'valor_bandeira': np.where(aleatorio.random(total) < 0.05, 0.0, consumo * valor_kwh_bandeira),
+        'bandeira_tarifaria': bandeiras[bandeira],
+        'subgrupo': np.array(['B3', 'B3', 'B3', 'B1', 'B4A'])[aleatorio.integers(0, 5, total)],
+        'tipo_consumidor': np.array(['Poder Público', 'Residencial'])[aleatorio.integers(0, 2, total)],
+        'tipo_ligacao': np.array(['monofasico', 'bifasico', 'trifasico'])[aleatorio.integers(0, 3, total)],
+        # Histórico próximo do consumo atual, com picos ocasionais
+        'historico_consumo': np.column_stack([
+            consumo * aleatorio.uniform(0.8, 1.2, total),
+            consumo * aleatorio.uniform(0.8, 1.2, total),
+            consumo * np.where(aleatorio.random(total) < 0.03, 2.0, 1.0),
+        ]),
+    }
+
+
+def linha(lote, indice: int):
+    """Converte a linha do lote no dicionário usado por auditar_conta"""
+    dados = {}
+    for campo, coluna in lote.items():
+        valor = coluna[indice]
+        dados[campo] = valor.tolist() if isinstance(valor, np.ndarray) else valor.item()
+    return dados
+
+
+def gerar_contas_incompletas(total: int, semente: int = 42):
+    """Dicionários de conta com cerca de 20% dos campos ausentes, como os extraídos de contas ilegíveis"""
+    aleatorio = random.Random(semente)
+    for _ in range(total):
+        dados = {
+            'consumo_kwh': aleatorio.choice([0, 50, 300, 1200]),
+            'valor_energia': aleatorio.uniform(10, 900),
+            'valor_total': aleatorio.uniform(50, 1500),
+            'icms': aleatorio.uniform(5, 300),
+            'valor_bandeira': aleatorio.choice([0.0, 5.5]),
+            'bandeira_tarifaria': aleatorio.choice(['verde', 'Amarela', 'vermelha_1']),
+            'subgrupo': aleatorio.choice(['B3', 'B1', 'b1', 'B4A', 'A4']),
+            'tipo_consumidor': aleatorio.choice(['Residencial', 'Poder Público']),
+            'tipo_ligacao': aleatorio.choice(['monofasico', 'Trifasico', 'bifasico']),
+            'distribuidora': aleatorio.choice(['ENERGISA RONDÔNIA', 'CEMIG']),
+            'mes_referencia': aleatorio.choice(['05/2025', '01/2024']),
+            'historico_consumo': [aleatorio.uniform(50, 900) for _ in range(3)],
+        }
+        yield {campo: valor for campo, valor in dados.items() if aleatorio.random() >= 0.2}
+
+
+def divergencias_registros(regras: RegrasAuditoria, total: int) -> int:
+    """Contas em que auditar_lote sobre colunas_de_registros difere de auditar_conta"""
+    contas = list(gerar_contas_incompletas(total))
+    lote = regras.auditar_lote(colunas_de_registros(RegistroConta.from_dict(dados) for dados in contas))
+    divergencias = 0
+    for dados, vetorial in zip(contas, lote):
+        individual = regras.auditar_conta(dados)
+        if individual['irregularidades'] != vetorial['irregularidades'] or individual['resumo'] != vetorial['resumo']:
+            divergencias += 1
+    return divergencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--contas', type=int, default=1_000_000)
+    parser.add_argument('--amostra', type=int, default=50_000,
+                        help='contas auditadas individualmente para estimar o caminho conta a conta')
+    parser.add_argument('--incompletas', type=int, default=5_000,
+                        help='contas com campos ausentes conferidas entre o lote e a auditoria individual')
+    args = parser.parse_args()
+
+    regras = RegrasAuditoria()
+    lote = gerar_lote(args.contas)
+
+    inicio = time.perf_counter()
+    avaliacao = regras.avaliar_lote(lote)
+    tempo_vetorial = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resultados = regras.auditar_lote(lote)
+    tempo_lote = time.perf_counter() - inicio
+
+    amostra = min(args.amostra, args.contas)
+    contas = [linha(lote, indice) for indice in range(amostra)]
+    inicio = time.perf_counter()
+    individuais = [regras.auditar_conta(dados) for dados in contas]
+    tempo_individual = (time.perf_counter() - inicio) * args.contas / amostra
+
+    divergencias = sum(
+        1 for individual, vetorial in zip(individuais, resultados)
+        if individual['irregularidades'] != vetorial['irregularidades']
+        or individual['resumo'] != vetorial['resumo']
+    )
+    irregulares = int(sum(1 for resultado in resultados if resultado['irregularidades']))
+
+    print(f"Contas: {args.contas:,} ({irregulares:,} com irregularidades)")
+    print(f"avaliar_lote (somente regras vetoriais):  {tempo_vetorial:.2f} s")
+    print(f"auditar_lote (com resultados por conta):  {tempo_lote:.2f} s")
+    print(f"auditar_conta (estimado a partir de {amostra:,}): {tempo_individual:.2f} s")
+    print(f"Aceleração auditar_lote:                  {tempo_individual / tempo_lote:.1f}x")
+    print(f"Divergências na amostra:                  {divergencias}")
+    print(f"Divergências com campos ausentes:         {divergencias_registros(regras, args.incompletas)}")
+    del avaliacao
+
+
+if __name__ == '__main__':
+    main()
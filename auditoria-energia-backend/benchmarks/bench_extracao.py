@@ -0,0 +1,156 @@
+"""
+Benchmark da extração de campos por regex em textos de OCR longos
+Compara a extração campo a campo original com a extração com padrões pré-compilados
+Antes de medir, confere que extrair_campos devolve o mesmo que a extração original
+(re.search sem compilação sobre uma cópia dos padrões) em um corpus sintético embaralhado
+(linhas repetidas, fora de ordem e com rótulos ambíguos)
+
+Uso: python -m benchmarks.bench_extracao [--paginas 200] [--repeticoes 5] [--amostras 20000]
+"""
+
+import argparse
+import copy
+import random
+import re
+import sys
+import time
+from typing import Dict, Optional
+
+from src.extrator_dados import ExtratorDados
+
+LINHAS_RUIDO = [
+    'Informações importantes sobre o uso consciente de energia elétrica',
+    'Central de atendimento 0800 647 0120 disponível 24 horas',
+    'Leitura realizada conforme calendário da distribuidora',
+    'Tributos federais incidentes conforme legislação vigente',
+    'Medidor 0012345 constante 1 leitura anterior 45210 leitura atual 46460',
+    'Débitos anteriores quitados em 12,50 e juros de 1,20 no período',
+]
+
+CABECALHO_CONTA = (
+    'ENERGISA RONDÔNIA\nNº Instalação: {instalacao}\nReferência: {mes}/2025\n'
+    '{rotulo_subgrupo}: B3 Poder Público\nConsumo faturado {consumo} kWh\n'
+)
+
+RODAPE_CONTA = (
+    'Energia elétrica R$ {energia},45\nAdicional bandeira amarela\n'
+    'ICMS R$ {icms},30\nTotal a pagar R$ {total},40\n'
+)
+
+
+def gerar_texto(paginas: int, semente: int = 42) -> str:
+    """Gera um texto de OCR com cabeçalho na primeira página e valores na última"""
+    aleatorio = random.Random(semente)
+    partes = [CABECALHO_CONTA.format(
+        instalacao=aleatorio.randint(10 ** 6, 10 ** 7), mes=f"{aleatorio.randint(1, 12):02d}",
+        rotulo_subgrupo=aleatorio.choice(['Subgrupo', 'Classe']), consumo=aleatorio.randint(100, 3000)
+    )]
+    for _ in range(paginas):
+        partes.extend(aleatorio.choice(LINHAS_RUIDO) for _ in range(40))
+    partes.append(RODAPE_CONTA.format(
+        energia=aleatorio.randint(100, 900), icms=aleatorio.randint(20, 300),
+        total=aleatorio.randint(200, 1500)
+    ))
+    return '\n'.join(partes)
+
+
+LINHAS_CAMPOS = [
+    'Nº Instalação: {numero}', 'Instalação {numero}', 'Referência: {mes:02d}/2025', 'Mês {mes:02d}/2024',
+    'Subgrupo: B{digito} Residencial', 'Classe B{digito}', 'Consumo faturado {numero3} kWh', 'Consumo {numero3}',
+    'Energia elétrica R$ {valor}', 'ICMS R$ {valor}', 'Total a pagar R$ {valor}', 'Valor total {valor}',
+    'Adicional bandeira {bandeira}', 'bandeira {bandeira}', 'Adicional bandeira {bandeira} R$ {valor}',
+    'Ligação {ligacao}', 'Fornecimento {ligacao}',
+]
+
+
+def gerar_texto_embaralhado(aleatorio: random.Random) -> str:
+    """Texto curto com campos repetidos, fora de ordem e vizinhos entre si (casos de padrões concorrentes)"""
+    linhas = []
+    for _ in range(aleatorio.randint(3, 18)):
+        modelo = aleatorio.choice(LINHAS_CAMPOS + LINHAS_RUIDO)
+        linhas.append(modelo.format(
+            numero=aleatorio.randint(10 ** 6, 10 ** 9), mes=aleatorio.randint(1, 12), digito=aleatorio.randint(1, 4),
+            numero3=aleatorio.randint(10, 5000), valor=f'{aleatorio.randint(1, 2000)},{aleatorio.randint(0, 99):02d}',
+            bandeira=aleatorio.choice(['verde', 'amarela', 'vermelha']),
+            ligacao=aleatorio.choice(['monofásica', 'bifásica', 'trifásica'])
+        ))
+    separador = aleatorio.choice(['\n', ' ', ' - '])
+    return separador.join(linhas)
+
+
+def verificar_equivalencia(extrator: ExtratorDados, padroes: Dict[str, list], amostras: int,
+                           semente: int = 7) -> list:
+    """Textos em que extrair_campos difere de extrair_legado sobre os padrões informados (vazio se equivalentes)"""
+    aleatorio = random.Random(semente)
+    divergencias = []
+    for _ in range(amostras):
+        texto = gerar_texto_embaralhado(aleatorio)
+        obtido = extrator.extrair_campos(texto)
+        esperado = extrair_legado(padroes, texto)
+        if obtido != esperado:
+            divergencias.append((texto, esperado, obtido))
+    return divergencias
+
+
+def extrair_legado(padroes: Dict[str, list], texto: str) -> Dict[str, Optional[str]]:
+    """Reprodução da extração original: normaliza e busca campo a campo"""
+    resultado = {}
+    for campo, lista in padroes.items():
+        resultado[campo] = None
+        texto_limpo = texto.lower().replace('\n', ' ')
+        for padrao in lista:
+            match = re.search(padrao, texto_limpo, re.IGNORECASE)
+            if match:
+                resultado[campo] = match.group(1)
+                break
+    return resultado
+
+
+def medir(funcao, repeticoes: int) -> float:
+    """Retorna o melhor tempo (em segundos) entre as repetições"""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--paginas', type=int, default=200)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--amostras', type=int, default=20000)
+    args = parser.parse_args()
+
+    extrator = ExtratorDados()
+    # Cópia congelada dos padrões em texto: a referência não passa pelo código otimizado
+    padroes = copy.deepcopy(extrator.padroes)
+
+    # Velocidade só vale com a mesma saída: diverge, não mede
+    falhas = verificar_equivalencia(extrator, padroes, args.amostras)
+    print(f"Equivalência com a extração original: {args.amostras - len(falhas)}/{args.amostras} textos iguais")
+    if falhas:
+        texto, esperado, obtido = falhas[0]
+        print(f"Primeira divergência:\n{texto}\nesperado: {esperado}\nobtido:   {obtido}")
+        sys.exit(1)
+    texto = gerar_texto(args.paginas)
+
+    esperado = extrair_legado(padroes, texto)
+    obtido = extrator.extrair_campos(texto)
+    divergencias = {c: (esperado[c], obtido[c]) for c in esperado if esperado[c] != obtido[c]}
+
+    # Aquece o cache interno de regex do módulo re para não favorecer a versão nova
+    extrair_legado(padroes, texto)
+    tempo_legado = medir(lambda: extrair_legado(padroes, texto), args.repeticoes)
+    tempo_novo = medir(lambda: extrator.extrair_campos(texto), args.repeticoes)
+
+    print(f"Texto: {len(texto) / 1024:.0f} KiB ({args.paginas} páginas)")
+    print(f"Extração campo a campo: {tempo_legado * 1000:.2f} ms")
+    print(f"Padrões pré-compilados: {tempo_novo * 1000:.2f} ms")
+    print(f"Aceleração:             {tempo_legado / tempo_novo:.1f}x")
+    print(f"Divergências:           {divergencias or 'nenhuma'}")
+
+
+if __name__ == '__main__':
+    main()
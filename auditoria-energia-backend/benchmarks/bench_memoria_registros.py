@@ -0,0 +1,82 @@
+"""
+Benchmark de memória dos registros compactos contra os dicionários por conta
+
+Uso: python -m benchmarks.bench_memoria_registros [--contas 100000]
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from src.regras_auditoria import RegrasAuditoria
+from src.registros import RegistroConta
+from benchmarks.bench_auditoria_lote import gerar_lote, linha
+
+
+def contas_extraidas(lote, total: int):
+    """Dicionários no formato de extrair_dados_simulado, um por conta"""
+    for indice in range(total):
+        dados = linha(lote, indice)
+        dados.update({
+            'pis': round(dados['valor_total'] * 0.0117, 2),
+            'cofins': round(dados['valor_total'] * 0.0536, 2),
+            'numero_instalacao': str(100000000 + indice),
+            'mes_referencia': f"{indice % 12 + 1:02d}/2025",
+            'distribuidora': ''.join(['ENERGISA ', 'RONDÔNIA']),
+            'endereco': f'Rua das Palmeiras, {indice} - Centro - Porto Velho/RO',
+            'data_vencimento': '2025-06-15',
+            'data_leitura': '2025-05-20'
+        })
+        yield dados
+
+
+def medir(funcao):
+    """Retorna (objeto criado, bytes retidos) de funcao()"""
+    gc.collect()
+    tracemalloc.start()
+    objeto = funcao()
+    gc.collect()
+    retido, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objeto, retido
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--contas', type=int, default=100_000)
+    args = parser.parse_args()
+
+    lote = gerar_lote(args.contas)
+    regras = RegrasAuditoria()
+
+    dicionarios, memoria_dicionarios = medir(lambda: list(contas_extraidas(lote, args.contas)))
+    registros, memoria_registros = medir(
+        lambda: [RegistroConta.from_dict(dados) for dados in contas_extraidas(lote, args.contas)]
+    )
+    divergencias_contas = sum(
+        1 for dados, registro in zip(dicionarios, registros) if registro.to_dict() != dados
+    )
+    del dicionarios, registros
+
+    resultados, memoria_resultados = medir(lambda: regras.auditar_lote(lote))
+    compactos, memoria_compactos = medir(lambda: regras.auditar_lote(lote, compacto=True))
+    # data_auditoria difere entre as duas execuções
+    divergencias_resultados = sum(
+        1 for resultado, compacto in zip(resultados, compactos)
+        if dict(compacto.to_dict(), data_auditoria=None) != dict(resultado, data_auditoria=None)
+    )
+    irregularidades = sum(len(resultado['irregularidades']) for resultado in resultados)
+
+    mb = 1024 * 1024
+    print(f"Contas: {args.contas:,} ({irregularidades:,} irregularidades)")
+    print(f"Dados extraídos  dict: {memoria_dicionarios / mb:8.1f} MB   "
+          f"RegistroConta: {memoria_registros / mb:8.1f} MB   "
+          f"({memoria_dicionarios / memoria_registros:.1f}x)")
+    print(f"Resultados       dict: {memoria_resultados / mb:8.1f} MB   "
+          f"compactos:     {memoria_compactos / mb:8.1f} MB   "
+          f"({memoria_resultados / memoria_compactos:.1f}x)")
+    print(f"Divergências no JSON: contas {divergencias_contas}, resultados {divergencias_resultados}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Teste de carga HTTP: requisições por segundo e latências (p50, p95, p99)
+
+Uso:
+    python -m benchmarks.carga [--url http://127.0.0.1:5000/api/saude] [--conexoes 16] [--duracao 30]
+    python -m benchmarks.carga --url http://127.0.0.1:5000/api/upload --arquivo conta.pdf
+
+Cada conexão é uma thread com conexão HTTP persistente (keep-alive)
+"""
+
+import argparse
+import http.client
+import os
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+def corpo_multipart(caminho: str) -> Tuple[bytes, str]:
+    """Corpo multipart/form-data com o arquivo no campo 'file', como o frontend envia"""
+    fronteira = uuid.uuid4().hex
+    with open(caminho, 'rb') as arquivo:
+        conteudo = arquivo.read()
+    corpo = (
+        f'--{fronteira}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{os.path.basename(caminho)}"\r\n'
+        'Content-Type: application/octet-stream\r\n\r\n'
+    ).encode('utf-8') + conteudo + f'\r\n--{fronteira}--\r\n'.encode('utf-8')
+    return corpo, f'multipart/form-data; boundary={fronteira}'
+
+
+def percentil(valores: List[float], fracao: float) -> float:
+    if not valores:
+        return 0.0
+    return valores[min(int(len(valores) * fracao), len(valores) - 1)]
+
+
+class Carga:
+    def __init__(self, url: str, conexoes: int, duracao: float, corpo: Optional[bytes] = None,
+                 tipo_conteudo: Optional[str] = None):
+        partes = urlsplit(url)
+        self.https = partes.scheme == 'https'
+        self.host = partes.hostname
+        self.porta = partes.port or (443 if self.https else 80)
+        self.caminho = (partes.path or '/') + (f'?{partes.query}' if partes.query else '')
+        self.conexoes = conexoes
+        self.duracao = duracao
+        self.corpo = corpo
+        self.tipo_conteudo = tipo_conteudo
+        self.latencias: List[List[float]] = [[] for _ in range(conexoes)]
+        self.erros = [0] * conexoes
+        self.status: List[dict] = [{} for _ in range(conexoes)]
+
+    def _conectar(self) -> http.client.HTTPConnection:
+        classe = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return classe(self.host, self.porta, timeout=60)
+
+    def _executar(self, indice: int, fim: float):
+        conexao = self._conectar()
+        metodo = 'POST' if self.corpo is not None else 'GET'
+        cabecalhos = {'Content-Type': self.tipo_conteudo} if self.tipo_conteudo else {}
+        latencias, status = self.latencias[indice], self.status[indice]
+        while time.monotonic() < fim:
+            inicio = time.perf_counter()
+            try:
+                conexao.request(metodo, self.caminho, body=self.corpo, headers=cabecalhos)
+                resposta = conexao.getresponse()
+                resposta.read()
+            except (OSError, http.client.HTTPException):
+                self.erros[indice] += 1
+                conexao.close()
+                conexao = self._conectar()
+                continue
+            latencias.append(time.perf_counter() - inicio)
+            status[resposta.status] = status.get(resposta.status, 0) + 1
+            if resposta.status >= 500:
+                self.erros[indice] += 1
+        conexao.close()
+
+    def executar(self) -> float:
+        fim = time.monotonic() + self.duracao
+        inicio = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._executar, args=(indice, fim), daemon=True)
+            for indice in range(self.conexoes)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000/api/saude')
+    parser.add_argument('--conexoes', type=int, default=16)
+    parser.add_argument('--duracao', type=float, default=30.0, help='Segundos de carga')
+    parser.add_argument('--arquivo', help='Envia o arquivo por POST multipart (ex.: /api/upload)')
+    args = parser.parse_args()
+
+    corpo, tipo_conteudo = corpo_multipart(args.arquivo) if args.arquivo else (None, None)
+    carga = Carga(args.url, args.conexoes, args.duracao, corpo, tipo_conteudo)
+    decorrido = carga.executar()
+
+    latencias = sorted(latencia for lista in carga.latencias for latencia in lista)
+    status = {}
+    for parcial in carga.status:
+        for codigo, quantidade in parcial.items():
+            status[codigo] = status.get(codigo, 0) + quantidade
+
+    print(f"URL: {args.url}  conexões: {args.conexoes}  duração: {decorrido:.1f}s")
+    print(f"Requisições: {len(latencias):,}  erros: {sum(carga.erros):,}  status: {dict(sorted(status.items()))}")
+    print(f"Requisições/s: {len(latencias) / decorrido:,.1f}")
+    print("Latência (ms): " + "  ".join(
+        f"{nome} {percentil(latencias, fracao) * 1000:.1f}"
+        for nome, fracao in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99))
+    ) + f"  máx {latencias[-1] * 1000 if latencias else 0:.1f}")
+
+
+if __name__ == '__main__':
+    main()
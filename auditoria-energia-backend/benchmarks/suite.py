@@ -0,0 +1,366 @@
+"""
+Suíte de benchmarks e regressão do pipeline de extração e auditoria
+Gera localmente um corpus sintético com as variações de extrair_dados_simulado
+(normal, alto/comercial, baixo/residencial, erro) e mede latência por conta
+(p50, p95, p99) e vazão de _extrair_campo, auditar_conta, processar_conta
+(com a duração média de cada etapa) e do endpoint /api/upload
+
+Uso:
+    python -m benchmarks.suite executar [--tamanhos 1,1000,100000] [--casos auditar_conta,processar_conta]
+                                        [--repeticoes 3] [--saida resultado.json]
+                                        [--comparar base.json --limite 0.15]
+    python -m benchmarks.suite comparar base.json atual.json [--limite 0.15]
+
+O upload usa o cliente de teste do Flask (pilha WSGI completa, sem rede) com os
+bancos em um diretório temporário (DIRETORIO_DADOS); compare apenas resultados
+gerados na mesma máquina
+"""
+
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from src.extrator_dados import ExtratorDados, fitz
+from src.regras_auditoria import RegrasAuditoria
+from src.historico_consumo import HistoricoConsumo
+from src.cache_auditoria import CacheAuditoria
+from src.processamento import processar_conta, versao_pipeline
+from src.metricas import duracao_etapa
+
+VARIANTES = ('normal', 'alto', 'baixo', 'erro')
+TAMANHOS_PADRAO = (1, 1000, 100000)
+
+# PDFs distintos gerados por execução; os demais reutilizam o conteúdo com um sufixo único
+PDFS_DISTINTOS = 256
+
+# Chamadas descartadas antes da medição de cada caso
+AQUECIMENTO = 20
+
+# Casos com menos amostras que isto não entram na comparação (latência de uma chamada isolada varia demais)
+MIN_AMOSTRAS_COMPARACAO = 20
+
+LIMITE_PADRAO = 0.15
+
+MODELO_TEXTO = (
+    '{distribuidora}\nNº Instalação: {numero_instalacao}\nReferência: {mes_referencia}\n'
+    'Subgrupo: {subgrupo} {tipo_consumidor}\nConsumo faturado {consumo_kwh} kWh\n'
+    'Energia elétrica R$ {valor_energia}\nAdicional bandeira {bandeira}\n'
+    'ICMS R$ {icms}\nTotal a pagar R$ {valor_total}\n'
+)
+
+
+def _moeda(valor: float) -> str:
+    return f'{valor:.2f}'.replace('.', ',')
+
+
+class Corpus:
+    """Contas sintéticas determinísticas: a conta i depende só da semente e de i"""
+
+    def __init__(self, semente: int = 42):
+        self.semente = semente
+        self.extrator = ExtratorDados()
+        self._bases = {
+            variante: self.extrator.extrair_dados_simulado(f'conta_{variante}.pdf') for variante in VARIANTES
+        }
+        self._pdfs: Dict[int, bytes] = {}
+        # Conteúdos únicos por envio: o cache de uploads devolveria envios repetidos sem processá-los
+        self.execucao = uuid.uuid4().hex
+        self._envios = itertools.count()
+
+    def variante(self, indice: int) -> str:
+        return VARIANTES[indice % len(VARIANTES)]
+
+    def nome(self, indice: int) -> str:
+        return f'conta_{self.variante(indice)}_{indice:06d}.pdf'
+
+    def dados(self, indice: int) -> Dict[str, Any]:
+        """Dados extraídos da variação com consumo e valores escalados (a variação 'erro' continua inconsistente)"""
+        aleatorio = random.Random(self.semente * 1000003 + indice)
+        dados = dict(self._bases[self.variante(indice)])
+        fator = aleatorio.uniform(0.8, 1.2)
+        dados['consumo_kwh'] = round(dados['consumo_kwh'] * fator)
+        for campo in ('valor_total', 'valor_energia', 'valor_bandeira', 'icms', 'pis', 'cofins'):
+            dados[campo] = round(dados[campo] * fator, 2)
+        dados['historico_consumo'] = [round(consumo * aleatorio.uniform(0.9, 1.1)) for consumo in dados['historico_consumo']]
+        dados['numero_instalacao'] = str(100000000 + indice)
+        dados['mes_referencia'] = f'{indice % 12 + 1:02d}/2025'
+        return dados
+
+    def texto(self, indice: int) -> str:
+        dados = self.dados(indice)
+        return MODELO_TEXTO.format(
+            distribuidora=dados['distribuidora'], numero_instalacao=dados['numero_instalacao'],
+            mes_referencia=dados['mes_referencia'], subgrupo=dados['subgrupo'],
+            tipo_consumidor=dados['tipo_consumidor'], consumo_kwh=dados['consumo_kwh'],
+            valor_energia=_moeda(dados['valor_energia']), bandeira=dados['bandeira_tarifaria'].split('_')[0],
+            icms=_moeda(dados['icms']), valor_total=_moeda(dados['valor_total'])
+        )
+
+    def preparar_pdfs(self, tamanho: int):
+        """Gera antes da medição os PDFs que as contas 0..tamanho-1 vão usar"""
+        for indice in range(min(tamanho, PDFS_DISTINTOS)):
+            self.pdf(indice)
+
+    def pdf(self, indice: int, unico: bool = False) -> Optional[bytes]:
+        """PDF de uma página com o texto da conta (None sem PyMuPDF); unico evita conteúdos repetidos"""
+        if fitz is None:
+            return None
+        base = indice % PDFS_DISTINTOS
+        conteudo = self._pdfs.get(base)
+        if conteudo is None:
+            with fitz.open() as documento:
+                documento.new_page().insert_text((50, 72), self.texto(base), fontsize=10)
+                conteudo = self._pdfs[base] = documento.tobytes()
+        return conteudo + f'\n% conta {self.execucao} {next(self._envios)}\n'.encode('ascii') if unico else conteudo
+
+
+def percentil(valores: List[float], fracao: float) -> float:
+    return valores[min(int(len(valores) * fracao), len(valores) - 1)] if valores else 0.0
+
+
+def medir(operacao: Callable[[int], Any], total: int) -> Tuple[List[float], float, int]:
+    """Latências (s) de cada chamada, tempo total e falhas (operação retornando False)"""
+    for indice in range(min(AQUECIMENTO, total)):
+        operacao(indice)
+    latencias = []
+    falhas = 0
+    relogio = time.perf_counter
+    inicio = relogio()
+    for indice in range(total):
+        antes = relogio()
+        if operacao(indice) is False:
+            falhas += 1
+        latencias.append(relogio() - antes)
+    return latencias, relogio() - inicio, falhas
+
+
+def resumir(caso: str, tamanho: int, latencias: List[float], decorrido: float, falhas: int,
+            **extra) -> Dict[str, Any]:
+    ordenadas = sorted(latencias)
+    resultado = {
+        'caso': caso,
+        'tamanho': tamanho,
+        'amostras': len(latencias),
+        'falhas': falhas,
+        'total_s': round(decorrido, 6),
+        'vazao_por_s': round(len(latencias) / decorrido, 2) if decorrido else None,
+        'latencia_ms': {
+            'media': round(sum(latencias) / len(latencias) * 1000, 4) if latencias else 0.0,
+            'p50': round(percentil(ordenadas, 0.50) * 1000, 4),
+            'p95': round(percentil(ordenadas, 0.95) * 1000, 4),
+            'p99': round(percentil(ordenadas, 0.99) * 1000, 4),
+            'max': round(ordenadas[-1] * 1000, 4) if ordenadas else 0.0
+        }
+    }
+    resultado.update(extra)
+    return resultado
+
+
+def _etapas() -> Dict[str, Tuple[float, int]]:
+    return {valores[0]: (serie.soma, serie.total) for valores, serie in list(duracao_etapa._series.items())}
+
+
+def caso_extrair_campo(corpus: Corpus, tamanho: int) -> Dict[str, Any]:
+    extrator = corpus.extrator
+    campos = list(extrator.padroes)
+    textos = [corpus.texto(indice) for indice in range(tamanho)]
+
+    def operacao(indice):
+        texto = textos[indice]
+        return None not in [extrator._extrair_campo(texto, campo) for campo in campos]
+
+    return resumir('extrair_campo', tamanho, *medir(operacao, tamanho), campos_por_conta=len(campos))
+
+
+def caso_auditar_conta(corpus: Corpus, tamanho: int) -> Dict[str, Any]:
+    regras = RegrasAuditoria()
+    contas = [corpus.dados(indice) for indice in range(tamanho)]
+
+    def operacao(indice):
+        return 'erro' not in regras.auditar_conta(contas[indice])
+
+    return resumir('auditar_conta', tamanho, *medir(operacao, tamanho))
+
+
+def caso_processar_conta(corpus: Corpus, tamanho: int) -> Dict[str, Any]:
+    """Pipeline completo sem histórico e sem cache de resultados, para medir o cálculo de cada conta"""
+    extrator, regras = ExtratorDados(), RegrasAuditoria()
+    historico, cache = HistoricoConsumo(), CacheAuditoria(capacidade=0)
+    nomes = [corpus.nome(indice) for indice in range(tamanho)]
+    corpus.preparar_pdfs(tamanho)
+
+    def operacao(indice):
+        resultado = processar_conta(nomes[indice], extrator, regras, conteudo=corpus.pdf(indice),
+                                    historico=historico, cache=cache)
+        return resultado.get('status') != 'erro'
+
+    antes = _etapas()
+    latencias, decorrido, falhas = medir(operacao, tamanho)
+    depois = _etapas()
+    etapas = {}
+    for etapa, (soma, total) in depois.items():
+        soma_antes, total_antes = antes.get(etapa, (0.0, 0))
+        if total > total_antes:
+            etapas[etapa] = round((soma - soma_antes) / (total - total_antes) * 1000, 4)
+    return resumir('processar_conta', tamanho, latencias, decorrido, falhas,
+                   extracao='pdf' if fitz is not None else 'simulada', etapas_ms=etapas)
+
+
+def caso_upload_http(corpus: Corpus, tamanho: int) -> Dict[str, Any]:
+    """POST multipart em /api/upload: recebimento, gravação, auditoria e registro no banco"""
+    from src.main import app
+
+    cliente = app.test_client()
+    corpus.preparar_pdfs(tamanho)
+
+    def operacao(indice):
+        conteudo = corpus.pdf(indice, unico=True) or f'conta {indice}'.encode('ascii')
+        resposta = cliente.post(
+            '/api/upload', data={'file': (io.BytesIO(conteudo), corpus.nome(indice))},
+            content_type='multipart/form-data'
+        )
+        return resposta.status_code == 200 and resposta.get_json()['resultado'].get('status') != 'erro'
+
+    return resumir('upload_http', tamanho, *medir(operacao, tamanho))
+
+
+CASOS = {
+    'extrair_campo': caso_extrair_campo,
+    'auditar_conta': caso_auditar_conta,
+    'processar_conta': caso_processar_conta,
+    'upload_http': caso_upload_http,
+}
+
+
+def executar(tamanhos: List[int], casos: List[str], semente: int = 42, repeticoes: int = 1) -> Dict[str, Any]:
+    """Executa cada caso em cada tamanho; com repetições, fica a de menor p50 (menos ruído da máquina)"""
+    corpus = Corpus(semente)
+    resultados = []
+    for caso in casos:
+        for tamanho in tamanhos:
+            resultado = min(
+                (CASOS[caso](corpus, tamanho) for _ in range(max(repeticoes, 1))),
+                key=lambda execucao: execucao['latencia_ms']['p50']
+            )
+            resultado['repeticoes'] = max(repeticoes, 1)
+            resultados.append(resultado)
+            latencia = resultado['latencia_ms']
+            print(f"{caso:16} {tamanho:>7}  {resultado['vazao_por_s']:>10,.1f}/s  "
+                  f"p50 {latencia['p50']:8.3f} ms  p95 {latencia['p95']:8.3f} ms  p99 {latencia['p99']:8.3f} ms"
+                  + (f"  falhas {resultado['falhas']}" if resultado['falhas'] else ''), file=sys.stderr)
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': {
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'versao_pipeline': versao_pipeline(),
+            'pymupdf': fitz is not None,
+            'semente': semente,
+            'repeticoes': max(repeticoes, 1)
+        },
+        'resultados': resultados
+    }
+
+
+def comparar(base: Dict[str, Any], atual: Dict[str, Any], limite: float) -> List[str]:
+    """Regressões de latência p50 ou vazão acima do limite (fração) entre casos presentes nas duas execuções"""
+    anteriores = {(r['caso'], r['tamanho']): r for r in base['resultados']}
+    regressoes = []
+    for resultado in atual['resultados']:
+        chave = (resultado['caso'], resultado['tamanho'])
+        anterior = anteriores.get(chave)
+        if anterior is None or min(anterior['amostras'], resultado['amostras']) < MIN_AMOSTRAS_COMPARACAO:
+            continue
+        nome = f'{chave[0]} ({chave[1]})'
+        p50_base, p50_atual = anterior['latencia_ms']['p50'], resultado['latencia_ms']['p50']
+        if p50_base and p50_atual > p50_base * (1 + limite):
+            regressoes.append(f'{nome}: p50 {p50_base:.3f} -> {p50_atual:.3f} ms (+{p50_atual / p50_base - 1:.0%})')
+        vazao_base, vazao_atual = anterior['vazao_por_s'], resultado['vazao_por_s']
+        if vazao_base and vazao_atual < vazao_base * (1 - limite):
+            regressoes.append(f'{nome}: vazão {vazao_base:,.1f} -> {vazao_atual:,.1f}/s ({vazao_atual / vazao_base - 1:.0%})')
+        if resultado['falhas'] > anterior['falhas']:
+            regressoes.append(f"{nome}: falhas {anterior['falhas']} -> {resultado['falhas']}")
+    return regressoes
+
+
+def _relatar(regressoes: List[str], limite: float) -> int:
+    if regressoes:
+        print(f'Regressões acima de {limite:.0%}:')
+        for regressao in regressoes:
+            print(f'  {regressao}')
+        return 1
+    print(f'Nenhuma regressão acima de {limite:.0%}')
+    return 0
+
+
+def _carregar(caminho: str) -> Dict[str, Any]:
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description=__doc__.strip().splitlines()[0])
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    executar_parser = comandos.add_parser('executar', help='Executa os casos e grava o resultado em JSON')
+    executar_parser.add_argument('--tamanhos', default=','.join(str(t) for t in TAMANHOS_PADRAO),
+                                 help='Quantidades de contas separadas por vírgula')
+    executar_parser.add_argument('--casos', default=','.join(CASOS), help=f"Entre: {', '.join(CASOS)}")
+    executar_parser.add_argument('--semente', type=int, default=42)
+    executar_parser.add_argument('--repeticoes', type=int, default=1,
+                                 help='Execuções por caso, mantendo a de menor p50 (use 3 ou mais ao comparar)')
+    executar_parser.add_argument('--saida', '-o', help='Arquivo JSON (padrão: saída padrão)')
+    executar_parser.add_argument('--comparar', help='Resultado anterior: falha se houver regressão')
+    executar_parser.add_argument('--limite', type=float, default=LIMITE_PADRAO, help='Piora tolerada (fração)')
+
+    comparar_parser = comandos.add_parser('comparar', help='Compara dois resultados gravados')
+    comparar_parser.add_argument('base')
+    comparar_parser.add_argument('atual')
+    comparar_parser.add_argument('--limite', type=float, default=LIMITE_PADRAO, help='Piora tolerada (fração)')
+
+    args = parser.parse_args(argv)
+
+    if args.comando == 'comparar':
+        return _relatar(comparar(_carregar(args.base), _carregar(args.atual), args.limite), args.limite)
+
+    casos = [caso for caso in args.casos.split(',') if caso]
+    desconhecidos = set(casos) - set(CASOS)
+    if desconhecidos:
+        parser.error(f"casos desconhecidos: {', '.join(sorted(desconhecidos))}")
+    tamanhos = [int(tamanho) for tamanho in args.tamanhos.split(',') if tamanho]
+
+    # Bancos e fila do upload em diretório temporário, sem tocar nos dados da aplicação
+    diretorio = tempfile.mkdtemp(prefix='auditoria-bench-')
+    os.environ.setdefault('DIRETORIO_DADOS', diretorio)
+    os.environ.setdefault('FILA_INICIAR', '0')
+
+    try:
+        resultado = executar(tamanhos, casos, args.semente, args.repeticoes)
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(texto + '\n')
+    else:
+        print(texto)
+
+    if args.comparar:
+        return _relatar(comparar(_carregar(args.comparar), resultado, args.limite), args.limite)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
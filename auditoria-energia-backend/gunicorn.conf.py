@@ -0,0 +1,59 @@
+"""
+Configuração do Gunicorn para produção
+
+    gunicorn -c gunicorn.conf.py src.wsgi:app
+
+Processos de trabalho com threads (gthread): a extração e a auditoria usam CPU
+enquanto uploads e downloads passam a maior parte do tempo esperando a rede.
+A aplicação é pré-carregada no mestre e compartilhada por copy-on-write
+"""
+
+import os
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+
+# Um processo por núcleo; as threads cobrem a espera de rede de cada processo
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Uploads síncronos processam a conta na própria requisição
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+# Tempo para concluir as requisições em andamento após SIGTERM
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Após SIGTERM, segundos em que cada processo segue aceitando conexões com a prontidão em 503,
+# para o balanceador retirá-lo antes do laço de aceitação parar (parte do graceful_timeout)
+drenagem = min(float(os.environ.get('GUNICORN_DRENAGEM', 10)), graceful_timeout / 2)
+keepalive = 5
+
+# Reinicia cada processo periodicamente para limitar o crescimento de memória
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+
+preload_app = True
+accesslog = '-'
+errorlog = '-'
+
+# Os trabalhadores da fila são threads: iniciados em cada processo, depois do fork
+os.environ.setdefault('FILA_INICIAR', '0')
+
+
+def post_fork(server, worker):
+    from src.servidor import apos_fork
+    from src.wsgi import app
+    apos_fork(app)
+
+
+def post_worker_init(worker):
+    from src.servidor import instalar_drenagem
+    instalar_drenagem(worker, drenagem)
+
+
+def worker_exit(server, worker):
+    from src.servidor import estado_servidor
+    estado_servidor.drenar(graceful_timeout)
+
+
+def when_ready(server):
+    from src.wsgi import preparacao
+    server.log.info('Aplicação pré-carregada: %s', preparacao)
@@ -0,0 +1,286 @@
+"""
+Módulo da detecção periódica de anomalias em todas as auditorias armazenadas
+As auditorias são lidas em blocos de ids (memória limitada ao tamanho do bloco),
+agregadas em paralelo por processos de trabalho e comparadas no conjunto:
+
+- consumo de cada unidade consumidora contra as demais do mesmo subgrupo e tipo de ligação
+- tarifa média de energia de cada distribuidora e subgrupo contra a competência anterior
+
+Os achados de cada execução vão para a tabela anomalia_portfolio. Execução periódica:
+
+    flask --app src.main detectar-anomalias
+"""
+
+import math
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import repeat
+from typing import Dict, List, Any, Optional, Tuple
+
+from src.models.user import db
+from src.models.anomalia import AnomaliaPortfolio, ExecucaoAnomalias
+
+# NumPy é necessário apenas para a pontuação das anomalias
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Auditorias lidas por bloco
+TAMANHO_BLOCO = 5000
+
+# Consumo fora do padrão: escore robusto (mediana/MAD) e unidades mínimas no grupo de pares
+LIMITE_ESCORE_PARES = 3.5
+PARES_MINIMOS = 10
+
+# Salto de tarifa: variação mínima e contas mínimas por competência
+LIMITE_SALTO_TARIFA = 0.15
+CONTAS_MINIMAS_TARIFA = 5
+
+# Execuções mantidas na tabela de anomalias
+EXECUCOES_MANTIDAS = 10
+
+# Tipos de anomalia
+CONSUMO_FORA_DO_PADRAO = 'consumo_fora_do_padrao'
+SALTO_TARIFA = 'salto_tarifa'
+
+# Apenas a auditoria mais recente de cada unidade e competência (reauditorias substituem as anteriores).
+# O + em +b.competencia mantém a subconsulta no índice por unidade, com poucas linhas por unidade
+_CONSULTA_BLOCO = """
+SELECT a.id, a.numero_instalacao, a.competencia, a.distribuidora,
+       d.subgrupo, d.tipo_ligacao, d.consumo_kwh, d.valor_energia
+FROM auditoria a JOIN dados_extraidos d ON d.auditoria_id = a.id
+WHERE a.id >= ? AND a.id < ? AND a.status != 'erro' AND a.numero_instalacao IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM auditoria b
+                  WHERE b.numero_instalacao = a.numero_instalacao AND +b.competencia IS a.competencia
+                    AND b.id > a.id)
+"""
+
+
+def _agregar_bloco(caminho_db: str, inicio: int, fim: int) -> Tuple[int, Dict[str, list], Dict[tuple, list]]:
+    """
+    Agrega as auditorias com id em [inicio, fim)
+
+    Returns:
+        (auditorias lidas, {instalação: [contas, soma do log do consumo, último id, subgrupo,
+        tipo de ligação, distribuidora]}, {(distribuidora, subgrupo, competência): [contas,
+        soma do valor de energia, soma do consumo]})
+    """
+    conexao = sqlite3.connect(caminho_db, timeout=30)
+    try:
+        linhas = conexao.execute(_CONSULTA_BLOCO, (inicio, fim)).fetchall()
+    finally:
+        conexao.close()
+
+    instalacoes: Dict[str, list] = {}
+    tarifas: Dict[tuple, list] = {}
+    for auditoria_id, instalacao, competencia, distribuidora, subgrupo, tipo_ligacao, consumo, valor in linhas:
+        if not consumo or consumo <= 0:
+            continue
+        subgrupo = (subgrupo or '').upper() or None
+        tipo_ligacao = (tipo_ligacao or '').lower() or None
+        distribuidora = (distribuidora or '').strip().upper() or None
+
+        agregado = instalacoes.get(instalacao)
+        if agregado is None:
+            instalacoes[instalacao] = [1, math.log(consumo), auditoria_id, subgrupo, tipo_ligacao, distribuidora]
+        else:
+            agregado[0] += 1
+            agregado[1] += math.log(consumo)
+            if auditoria_id > agregado[2]:
+                agregado[2:] = [auditoria_id, subgrupo, tipo_ligacao, distribuidora]
+
+        if competencia and distribuidora and valor and valor > 0:
+            chave = (distribuidora, subgrupo, competencia)
+            tarifa = tarifas.get(chave)
+            if tarifa is None:
+                tarifas[chave] = [1, valor, consumo]
+            else:
+                tarifa[0] += 1
+                tarifa[1] += valor
+                tarifa[2] += consumo
+
+    return len(linhas), instalacoes, tarifas
+
+
+def _combinar(destino: Dict, origem: Dict, mais_recente: bool = False):
+    """Soma agregados parciais; com mais_recente, os atributos vêm do maior id"""
+    for chave, parcial in origem.items():
+        agregado = destino.get(chave)
+        if agregado is None:
+            destino[chave] = parcial
+            continue
+        for posicao in range(2 if mais_recente else len(parcial)):
+            agregado[posicao] += parcial[posicao]
+        if mais_recente and parcial[2] > agregado[2]:
+            agregado[2:] = parcial[2:]
+
+
+class DetectorAnomalias:
+    """Análise em lote das auditorias armazenadas, com gravação dos achados por execução"""
+
+    def __init__(self, tamanho_bloco: int = TAMANHO_BLOCO, max_processos: Optional[int] = None):
+        self.tamanho_bloco = tamanho_bloco
+        self.max_processos = max_processos or os.cpu_count() or 1
+
+    def init_app(self, app):
+        """Registra o comando detectar-anomalias na CLI do Flask"""
+        self.tamanho_bloco = app.config.get('ANOMALIAS_TAMANHO_BLOCO', self.tamanho_bloco)
+        self.max_processos = app.config.get('ANOMALIAS_MAX_PROCESSOS', self.max_processos)
+
+        @app.cli.command('detectar-anomalias')
+        def detectar_anomalias():
+            """Analisa todas as auditorias e grava as anomalias encontradas"""
+            resumo = self.executar()
+            print(f"Execução {resumo['execucao']}: {resumo['auditorias']} auditorias, "
+                  f"{resumo['instalacoes']} unidades, {resumo['anomalias']} anomalias "
+                  f"em {resumo['duracao']:.1f}s")
+
+    def agregar(self, caminho_db: str) -> Tuple[int, Dict[str, list], Dict[tuple, list]]:
+        """Lê as auditorias em blocos de ids, em paralelo, e combina os agregados"""
+        conexao = sqlite3.connect(caminho_db, timeout=30)
+        try:
+            menor, maior = conexao.execute('SELECT MIN(id), MAX(id) FROM auditoria').fetchone()
+        finally:
+            conexao.close()
+        if menor is None:
+            return 0, {}, {}
+
+        inicios = list(range(menor, maior + 1, self.tamanho_bloco))
+        fins = [inicio + self.tamanho_bloco for inicio in inicios]
+        total, instalacoes, tarifas = 0, {}, {}
+
+        if len(inicios) == 1 or self.max_processos == 1:
+            parciais = map(_agregar_bloco, repeat(caminho_db), inicios, fins)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=min(self.max_processos, len(inicios)))
+            parciais = executor.map(_agregar_bloco, repeat(caminho_db), inicios, fins)
+        try:
+            for lidas, parcial_instalacoes, parcial_tarifas in parciais:
+                total += lidas
+                _combinar(instalacoes, parcial_instalacoes, mais_recente=True)
+                _combinar(tarifas, parcial_tarifas)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return total, instalacoes, tarifas
+
+    def consumo_fora_do_padrao(self, instalacoes: Dict[str, list]) -> List[Dict[str, Any]]:
+        """Unidades com consumo médio distante da mediana das unidades do mesmo subgrupo e tipo de ligação"""
+        if np is None:
+            raise RuntimeError('NumPy é necessário para a detecção de anomalias')
+
+        grupos: Dict[tuple, List[str]] = {}
+        for instalacao, (_, _, _, subgrupo, tipo_ligacao, _) in instalacoes.items():
+            grupos.setdefault((subgrupo, tipo_ligacao), []).append(instalacao)
+
+        anomalias = []
+        for (subgrupo, tipo_ligacao), membros in grupos.items():
+            if len(membros) < PARES_MINIMOS:
+                continue
+            # Média geométrica do consumo: a distribuição do consumo é assimétrica
+            consumos = np.fromiter(
+                (instalacoes[membro][1] / instalacoes[membro][0] for membro in membros),
+                dtype=np.float64, count=len(membros)
+            )
+            mediana = np.median(consumos)
+            desvio_absoluto = np.median(np.abs(consumos - mediana))
+            if desvio_absoluto == 0:
+                continue
+            escores = 0.6745 * (consumos - mediana) / desvio_absoluto
+            referencia = math.exp(mediana)
+            for posicao in np.flatnonzero(np.abs(escores) > LIMITE_ESCORE_PARES).tolist():
+                instalacao = membros[posicao]
+                valor = math.exp(consumos[posicao])
+                anomalias.append({
+                    'tipo': CONSUMO_FORA_DO_PADRAO,
+                    'numero_instalacao': instalacao,
+                    'distribuidora': instalacoes[instalacao][5],
+                    'subgrupo': subgrupo,
+                    'tipo_ligacao': tipo_ligacao,
+                    'valor': valor,
+                    'referencia': referencia,
+                    'escore': float(escores[posicao]),
+                    'descricao': (
+                        f"Consumo médio de {valor:.0f} kWh {'acima' if valor > referencia else 'abaixo'} "
+                        f"da mediana de {referencia:.0f} kWh entre {len(membros)} unidades "
+                        f"{subgrupo or '?'}/{tipo_ligacao or '?'}"
+                    )
+                })
+        return anomalias
+
+    def saltos_tarifa(self, tarifas: Dict[tuple, list]) -> List[Dict[str, Any]]:
+        """Competências em que a tarifa média de energia de uma distribuidora muda bruscamente"""
+        series: Dict[tuple, List[Tuple[str, float]]] = {}
+        for (distribuidora, subgrupo, competencia), (contas, valor, consumo) in tarifas.items():
+            if contas >= CONTAS_MINIMAS_TARIFA:
+                series.setdefault((distribuidora, subgrupo), []).append((competencia, valor / consumo))
+
+        anomalias = []
+        for (distribuidora, subgrupo), serie in series.items():
+            serie.sort()
+            for (_, anterior), (competencia, atual) in zip(serie, serie[1:]):
+                variacao = atual / anterior - 1
+                if abs(variacao) < LIMITE_SALTO_TARIFA:
+                    continue
+                anomalias.append({
+                    'tipo': SALTO_TARIFA,
+                    'distribuidora': distribuidora,
+                    'subgrupo': subgrupo,
+                    'competencia': competencia,
+                    'valor': atual,
+                    'referencia': anterior,
+                    'escore': variacao,
+                    'descricao': (
+                        f"Tarifa média de energia da {distribuidora} ({subgrupo or '?'}) passou de "
+                        f"R$ {anterior:.5f}/kWh para R$ {atual:.5f}/kWh ({variacao:+.0%}) em {competencia}"
+                    )
+                })
+        return anomalias
+
+    def executar(self, caminho_db: Optional[str] = None) -> Dict[str, Any]:
+        """Executa a análise completa e grava as anomalias (requer contexto da aplicação)"""
+        inicio = time.monotonic()
+        caminho_db = caminho_db or db.engine.url.database
+        total, instalacoes, tarifas = self.agregar(caminho_db)
+        anomalias = self.consumo_fora_do_padrao(instalacoes) + self.saltos_tarifa(tarifas)
+
+        execucao = ExecucaoAnomalias(
+            id=uuid.uuid4().hex, data_execucao=datetime.now(),
+            auditorias=total, instalacoes=len(instalacoes), anomalias=len(anomalias)
+        )
+        db.session.add(execucao)
+        for posicao in range(0, len(anomalias), 1000):
+            db.session.add_all([
+                AnomaliaPortfolio(execucao=execucao.id, data_execucao=execucao.data_execucao, **anomalia)
+                for anomalia in anomalias[posicao:posicao + 1000]
+            ])
+            db.session.flush()
+        self._descartar_execucoes_antigas()
+        execucao.duracao = time.monotonic() - inicio
+        db.session.commit()
+        return execucao.to_dict()
+
+    def _descartar_execucoes_antigas(self):
+        antigas = [
+            execucao for execucao, in db.session.query(ExecucaoAnomalias.id)
+            .order_by(ExecucaoAnomalias.data_execucao.desc())
+            .offset(EXECUCOES_MANTIDAS)
+            .all()
+        ]
+        if antigas:
+            AnomaliaPortfolio.query.filter(AnomaliaPortfolio.execucao.in_(antigas)).delete(synchronize_session=False)
+            ExecucaoAnomalias.query.filter(ExecucaoAnomalias.id.in_(antigas)).delete(synchronize_session=False)
+
+
+def ultima_execucao() -> Optional[ExecucaoAnomalias]:
+    """Execução mais recente da análise de anomalias"""
+    return ExecucaoAnomalias.query.order_by(ExecucaoAnomalias.data_execucao.desc()).first()
+
+
+detector_anomalias = DetectorAnomalias()
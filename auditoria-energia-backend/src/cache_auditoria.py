@@ -0,0 +1,212 @@
+"""
+Módulo do cache de resultados de auditoria
+A chave é o hash dos campos normalizados da conta e dos campos de conta.dados que
+as regras ativas declaram ler (campos_dados), combinado com a versão das regras e
+da tabela de tarifas: dados iguais vindos de outra digitalização ou de uma nova
+auditoria reaproveitam o resultado, e uma troca de tarifas ou de regras muda a chave
+em vez de esvaziar o cache. Há um nível em memória (LRU limitado) e, opcionalmente,
+um nível SQLite compartilhado entre processos
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from operator import attrgetter
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+from src.registro_regras import CAMPOS, ContaNormalizada
+from src.metricas import metricas
+
+consultas_cache = metricas.contador(
+    'auditoria_cache_consultas_total', 'Consultas ao cache de resultados de auditoria por nível', ('nivel',)
+)
+_ACERTO_MEMORIA = consultas_cache.rotular('memoria')
+_ACERTO_SQLITE = consultas_cache.rotular('sqlite')
+_FALHA = consultas_cache.rotular('falha')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cache_auditoria (
+    chave TEXT PRIMARY KEY,
+    versao TEXT NOT NULL,
+    resultado TEXT NOT NULL,
+    gravado_em REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cache_auditoria_gravado ON cache_auditoria (gravado_em);
+"""
+
+# Gravações no SQLite entre duas verificações do limite de linhas
+INTERVALO_LIMPEZA = 500
+
+
+# Campos lidos de uma vez, na ordem fixa de CAMPOS
+_LER_CAMPOS = attrgetter(*CAMPOS)
+_POSICAO_ESTATISTICAS = 1 + CAMPOS.index('estatisticas_consumo')
+
+
+def chave_conta(conta: ContaNormalizada, versao: str, campos_dados: Tuple[str, ...] = ()) -> str:
+    """
+    Hash estável dos campos normalizados, dos campos_dados lidos de conta.dados e da versão
+    das regras; os campos entram em ordem fixa e o repr de números, textos, listas e
+    dicionários é determinístico
+    """
+    valores = [versao, *_LER_CAMPOS(conta)]
+    if hasattr(conta.estatisticas_consumo, 'to_dict'):
+        valores[_POSICAO_ESTATISTICAS] = conta.estatisticas_consumo.to_dict()
+    if campos_dados:
+        get = conta.dados.get
+        valores.extend((campo, get(campo)) for campo in campos_dados)
+    return hashlib.blake2b(repr(valores).encode('utf-8'), digest_size=20).hexdigest()
+
+
+def _copiar(resultado_auditoria: Dict[str, Any], recomendacoes: List[str]) -> Tuple[Dict[str, Any], List[str]]:
+    """Cópia do resultado até as irregularidades (dicionários planos); o guardado nunca é entregue"""
+    copia = dict(resultado_auditoria)
+    copia['irregularidades'] = [dict(irregularidade) for irregularidade in resultado_auditoria['irregularidades']]
+    copia['resumo'] = dict(resultado_auditoria['resumo'])
+    return copia, list(recomendacoes)
+
+
+class CacheAuditoria:
+    """Resultados de auditar_conta e gerar_recomendacoes por conta normalizada e versão"""
+
+    def __init__(self, capacidade: int = 4096, caminho_db: Optional[str] = None,
+                 max_linhas_db: int = 200000):
+        self.capacidade = capacidade
+        self.caminho_db = caminho_db
+        self.max_linhas_db = max_linhas_db
+        self._memoria: 'OrderedDict[str, str]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._gravacoes = 0
+
+    def init_app(self, app):
+        """Configura capacidade e o nível SQLite (opcional) a partir da aplicação Flask"""
+        self.capacidade = app.config.get('CACHE_AUDITORIA_CAPACIDADE', self.capacidade)
+        self.caminho_db = app.config.get('CACHE_AUDITORIA_DATABASE_PATH', self.caminho_db)
+        self.max_linhas_db = app.config.get('CACHE_AUDITORIA_MAX_LINHAS', self.max_linhas_db)
+        if self.caminho_db:
+            os.makedirs(os.path.dirname(os.path.abspath(self.caminho_db)), exist_ok=True)
+            self._conexao()
+
+    @property
+    def habilitado(self) -> bool:
+        return self.capacidade > 0 or bool(self.caminho_db)
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Retorna a conexão SQLite da thread atual (reaberta em processos filhos do lote)"""
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            conexao = sqlite3.connect(self.caminho_db, timeout=30, isolation_level=None)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('PRAGMA synchronous=NORMAL')
+            conexao.executescript(ESQUEMA)
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    def _guardar_memoria(self, chave: str, resultado: Tuple[Dict[str, Any], List[str]]):
+        if self.capacidade <= 0:
+            return
+        with self._lock:
+            self._memoria[chave] = resultado
+            self._memoria.move_to_end(chave)
+            while len(self._memoria) > self.capacidade:
+                self._memoria.popitem(last=False)
+
+    def obter(self, chave: str) -> Optional[Tuple[Dict[str, Any], List[str]]]:
+        """Resultado e recomendações da chave, procurados na memória e depois no SQLite"""
+        with self._lock:
+            resultado = self._memoria.get(chave)
+            if resultado is not None:
+                self._memoria.move_to_end(chave)
+        if resultado is not None:
+            _ACERTO_MEMORIA.inc()
+            return resultado
+
+        if self.caminho_db:
+            try:
+                linha = self._conexao().execute(
+                    'SELECT resultado FROM cache_auditoria WHERE chave = ?', (chave,)
+                ).fetchone()
+            except sqlite3.Error:
+                linha = None
+            if linha is not None:
+                _ACERTO_SQLITE.inc()
+                resultado = tuple(json.loads(linha[0]))
+                self._guardar_memoria(chave, resultado)
+                return resultado
+
+        _FALHA.inc()
+        return None
+
+    def gravar(self, chave: str, versao: str, resultado: Tuple[Dict[str, Any], List[str]]):
+        self._guardar_memoria(chave, resultado)
+        if not self.caminho_db:
+            return
+        try:
+            serializado = json.dumps(resultado, ensure_ascii=False, separators=(',', ':'))
+        except (TypeError, ValueError):
+            # Regra externa com valores não serializáveis: o resultado fica só na memória
+            return
+        try:
+            conexao = self._conexao()
+            conexao.execute(
+                'INSERT OR REPLACE INTO cache_auditoria (chave, versao, resultado, gravado_em) VALUES (?, ?, ?, ?)',
+                (chave, versao, serializado, time.time())
+            )
+            self._gravacoes += 1
+            if self._gravacoes % INTERVALO_LIMPEZA == 0:
+                self.limpar(versao)
+        except sqlite3.Error:
+            # O nível compartilhado é só uma otimização: falhas (banco ocupado) não interrompem a auditoria
+            pass
+
+    def limpar(self, versao_atual: str):
+        """Remove do SQLite as entradas de outras versões e as mais antigas acima do limite"""
+        conexao = self._conexao()
+        conexao.execute('DELETE FROM cache_auditoria WHERE versao != ?', (versao_atual,))
+        excesso = conexao.execute('SELECT COUNT(*) FROM cache_auditoria').fetchone()[0] - self.max_linhas_db
+        if excesso > 0:
+            conexao.execute(
+                'DELETE FROM cache_auditoria WHERE chave IN '
+                '(SELECT chave FROM cache_auditoria ORDER BY gravado_em LIMIT ?)',
+                (excesso,)
+            )
+
+    def auditar(self, regras, dados_conta: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """auditar_conta e gerar_recomendacoes, reaproveitando o resultado de dados equivalentes"""
+        conta = ContaNormalizada(dados_conta)
+        if not self.habilitado or conta.erros:
+            return regras.auditar_conta(dados_conta), regras.gerar_recomendacoes(dados_conta)
+
+        versao = regras.versao
+        chave = chave_conta(conta, versao, regras.campos_dados)
+        armazenado = self.obter(chave)
+        if armazenado is not None:
+            resultado_auditoria, recomendacoes = _copiar(*armazenado)
+            resultado_auditoria['data_auditoria'] = datetime.now().isoformat()
+            return resultado_auditoria, recomendacoes
+
+        resultado_auditoria = regras.auditar_conta(dados_conta)
+        recomendacoes = regras.gerar_recomendacoes(dados_conta)
+        if 'erro' not in resultado_auditoria:
+            self.gravar(chave, versao, _copiar(resultado_auditoria, recomendacoes))
+        return resultado_auditoria, recomendacoes
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            em_memoria = len(self._memoria)
+        return {
+            'entradas_memoria': em_memoria,
+            'capacidade': self.capacidade,
+            'sqlite': bool(self.caminho_db)
+        }
+
+
+# Instância padrão: só memória até init_app configurar o nível SQLite
+cache_auditoria = CacheAuditoria()
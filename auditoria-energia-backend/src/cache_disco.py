@@ -0,0 +1,122 @@
+"""
+Módulo de cache em disco endereçado por conteúdo
+Mantém os itens em arquivos, com remoção dos menos usados (LRU) quando o
+tamanho total ultrapassa o limite configurado
+"""
+
+import json
+import os
+import threading
+import uuid
+from typing import Dict, Any, Optional
+
+
+class CacheDisco:
+    """Cache chave/valor em disco com limite de tamanho e contadores de uso"""
+
+    def __init__(self, diretorio: str, tamanho_maximo: int = 256 * 1024 * 1024):
+        self.diretorio = diretorio
+        self.tamanho_maximo = tamanho_maximo
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+        self._tamanho_atual: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _caminho(self, chave: str) -> str:
+        # Subdiretórios pelo prefixo da chave evitam diretórios muito grandes
+        return os.path.join(self.diretorio, chave[:2], chave)
+
+    def _calcular_tamanho(self) -> int:
+        total = 0
+        for raiz, _, arquivos in os.walk(self.diretorio):
+            for nome in arquivos:
+                try:
+                    total += os.path.getsize(os.path.join(raiz, nome))
+                except OSError:
+                    pass
+        return total
+
+    def obter(self, chave: str) -> Optional[bytes]:
+        """Retorna o conteúdo armazenado ou None"""
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, 'rb') as arquivo:
+                conteudo = arquivo.read()
+            # Atualiza o horário de acesso usado na ordem LRU
+            os.utime(caminho)
+        except OSError:
+            with self._lock:
+                self.falhas += 1
+            return None
+
+        with self._lock:
+            self.acertos += 1
+        return conteudo
+
+    def gravar(self, chave: str, conteudo: bytes):
+        """Armazena o conteúdo e remove itens antigos se o limite for excedido"""
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+
+        # Escrita atômica para que leitores concorrentes nunca vejam arquivo parcial
+        temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+        with open(temporario, 'wb') as arquivo:
+            arquivo.write(conteudo)
+        try:
+            tamanho_anterior = os.path.getsize(caminho)
+        except OSError:
+            tamanho_anterior = 0
+        os.replace(temporario, caminho)
+
+        with self._lock:
+            if self._tamanho_atual is None:
+                self._tamanho_atual = self._calcular_tamanho()
+            else:
+                self._tamanho_atual += len(conteudo) - tamanho_anterior
+            if self._tamanho_atual > self.tamanho_maximo:
+                self._remover_antigos()
+
+    def obter_json(self, chave: str) -> Optional[Any]:
+        conteudo = self.obter(chave)
+        return json.loads(conteudo) if conteudo is not None else None
+
+    def gravar_json(self, chave: str, valor: Any):
+        self.gravar(chave, json.dumps(valor, ensure_ascii=False, default=str).encode('utf-8'))
+
+    def _remover_antigos(self):
+        """Remove os itens menos usados até ficar abaixo de 90% do limite"""
+        itens = []
+        for raiz, _, arquivos in os.walk(self.diretorio):
+            for nome in arquivos:
+                caminho = os.path.join(raiz, nome)
+                try:
+                    estado = os.stat(caminho)
+                except OSError:
+                    continue
+                itens.append((estado.st_mtime, estado.st_size, caminho))
+
+        alvo = self.tamanho_maximo * 0.9
+        total = sum(tamanho for _, tamanho, _ in itens)
+        for _, tamanho, caminho in sorted(itens):
+            if total <= alvo:
+                break
+            try:
+                os.remove(caminho)
+            except OSError:
+                continue
+            total -= tamanho
+            self.remocoes += 1
+        self._tamanho_atual = total
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'remocoes': self.remocoes,
+                'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+                'tamanho_bytes': self._tamanho_atual,
+                'tamanho_maximo_bytes': self.tamanho_maximo
+            }
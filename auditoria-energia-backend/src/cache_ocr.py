@@ -0,0 +1,139 @@
+"""
+Módulo do cache em disco dos artefatos do OCR
+Guarda as páginas renderizadas e o texto reconhecido, endereçados pelo conteúdo da
+página (hash do fluxo de conteúdo e das imagens do PDF, ou dos pixels da imagem)
+combinado com os parâmetros da etapa (recorte, DPI, idioma e versão do Tesseract).
+Reextrair uma conta após mudar padrões ou regras não renderiza nem executa o OCR de
+novo; páginas iguais em arquivos diferentes (reenvios, PDFs divididos) também aproveitam
+"""
+
+import hashlib
+import io
+import os
+from typing import Dict, Any, Optional
+
+from src.cache_disco import CacheDisco
+
+try:
+    import pytesseract
+    from PIL import Image
+except ImportError:
+    pytesseract = None
+    Image = None
+
+
+# Limites padrão de cada tipo de artefato (os textos são pequenos; as páginas, PNG em tons de cinza)
+TAMANHO_MAXIMO_TEXTOS = 64 * 1024 * 1024
+TAMANHO_MAXIMO_IMAGENS = 1024 * 1024 * 1024
+
+
+def impressao_pagina(pagina) -> str:
+    """Hash do conteúdo de uma página PDF: dimensões, rotação, fluxo de conteúdo, imagens e XObjects"""
+    resumo = hashlib.blake2b(digest_size=20)
+    resumo.update(repr((tuple(pagina.rect), pagina.rotation)).encode('utf-8'))
+    resumo.update(pagina.read_contents())
+    documento = pagina.parent
+    # Os dados brutos (ainda comprimidos) identificam as imagens sem decodificá-las
+    for xref in sorted({imagem[0] for imagem in pagina.get_images(full=True)}
+                       | {xobjeto[0] for xobjeto in pagina.get_xobjects()}):
+        resumo.update(documento.xref_stream_raw(xref) or b'')
+    return resumo.hexdigest()
+
+
+def impressao_imagem(imagem) -> str:
+    """Hash dos pixels de uma imagem (independe do formato do arquivo)"""
+    resumo = hashlib.blake2b(digest_size=20)
+    resumo.update(repr((imagem.mode, imagem.size)).encode('utf-8'))
+    resumo.update(imagem.tobytes())
+    return resumo.hexdigest()
+
+
+def chave(impressao: str, *parametros: Any) -> str:
+    return hashlib.blake2b(repr((impressao, parametros)).encode('utf-8'), digest_size=20).hexdigest()
+
+
+_versao_tesseract: Optional[str] = None
+
+
+def versao_tesseract() -> str:
+    """Versão do Tesseract instalado (parte da chave do texto: outra versão reconhece diferente)"""
+    global _versao_tesseract
+    if _versao_tesseract is None:
+        try:
+            _versao_tesseract = str(pytesseract.get_tesseract_version())
+        except Exception:
+            _versao_tesseract = 'indisponivel'
+    return _versao_tesseract
+
+
+class CacheOcr:
+    """Páginas renderizadas (PNG) e textos do OCR, cada tipo com o seu limite de tamanho"""
+
+    def __init__(self, diretorio: Optional[str] = None, tamanho_maximo_textos: int = TAMANHO_MAXIMO_TEXTOS,
+                 tamanho_maximo_imagens: int = TAMANHO_MAXIMO_IMAGENS):
+        self.configurar(diretorio, tamanho_maximo_textos, tamanho_maximo_imagens)
+
+    def configurar(self, diretorio: Optional[str], tamanho_maximo_textos: int = TAMANHO_MAXIMO_TEXTOS,
+                   tamanho_maximo_imagens: int = TAMANHO_MAXIMO_IMAGENS):
+        """Pasta do cache (None desativa); limite de imagens 0 guarda só os textos"""
+        self.diretorio = diretorio
+        self.textos: Optional[CacheDisco] = None
+        self.imagens: Optional[CacheDisco] = None
+        if diretorio:
+            self.textos = CacheDisco(os.path.join(diretorio, 'textos'), tamanho_maximo_textos)
+            if tamanho_maximo_imagens > 0:
+                self.imagens = CacheDisco(os.path.join(diretorio, 'imagens'), tamanho_maximo_imagens)
+
+    def init_app(self, app):
+        """Configura a pasta (vazia desativa o cache) e os limites a partir da aplicação Flask"""
+        self.configurar(
+            app.config.get('CACHE_OCR_PASTA', self.diretorio),
+            app.config.get('CACHE_OCR_TAMANHO_TEXTOS', TAMANHO_MAXIMO_TEXTOS),
+            app.config.get('CACHE_OCR_TAMANHO_IMAGENS', TAMANHO_MAXIMO_IMAGENS)
+        )
+
+    @property
+    def habilitado(self) -> bool:
+        return self.textos is not None
+
+    def obter_texto(self, chave_texto: str) -> Optional[str]:
+        conteudo = self.textos.obter(chave_texto) if self.textos is not None else None
+        return conteudo.decode('utf-8') if conteudo is not None else None
+
+    def gravar_texto(self, chave_texto: str, texto: str):
+        if self.textos is not None:
+            try:
+                self.textos.gravar(chave_texto, texto.encode('utf-8'))
+            except OSError:
+                # Disco cheio ou sem permissão: o texto só não fica guardado
+                pass
+
+    def obter_imagem(self, chave_imagem: str):
+        conteudo = self.imagens.obter(chave_imagem) if self.imagens is not None else None
+        if conteudo is None:
+            return None
+        imagem = Image.open(io.BytesIO(conteudo))
+        imagem.load()
+        return imagem
+
+    def gravar_imagem(self, chave_imagem: str, imagem):
+        if self.imagens is None:
+            return
+        # Compressão rápida: o PNG é gravado só quando o OCR da página também será executado
+        buffer = io.BytesIO()
+        imagem.save(buffer, format='PNG', compress_level=1)
+        try:
+            self.imagens.gravar(chave_imagem, buffer.getvalue())
+        except OSError:
+            pass
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            'habilitado': self.habilitado,
+            'textos': self.textos.estatisticas() if self.textos is not None else None,
+            'imagens': self.imagens.estatisticas() if self.imagens is not None else None
+        }
+
+
+# Instância padrão: desativada até init_app (ou configurar) informar a pasta
+cache_ocr = CacheOcr()
@@ -0,0 +1,390 @@
+"""
+Linha de comando para auditoria em massa de contas arquivadas, sem o servidor Flask
+
+    python -m src.cli auditar contas/ --saida resultados.jsonl
+    python -m src.cli auditar contas.zip --saida resultados.csv --processos 8
+
+Os arquivos são lidos sob demanda e processados por um pool de processos com
+número limitado de arquivos em andamento; PDFs que concatenam várias contas são
+divididos e geram um resultado por conta. Cada arquivo concluído é registrado no
+arquivo de checkpoint; executar o mesmo comando novamente continua de onde parou
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Any, Iterator, Optional, Set, Tuple
+
+from src.processamento import resultado_erro, regras_auditoria
+from src.processamento_lote import processar_conta_ingerida
+from src.ingestao import contas_arquivo
+from src.layouts_distribuidora import registro_layouts
+from src.cache_ocr import cache_ocr
+
+# Parquet é opcional: requer pyarrow
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+
+EXTENSOES = {'pdf', 'png', 'jpg', 'jpeg'}
+FORMATOS = ('jsonl', 'csv', 'parquet')
+
+# Contas por arquivo de parte no formato Parquet
+CONTAS_POR_PARTE = 10000
+
+# Colunas do CSV e do Parquet (o JSON Lines guarda o resultado completo)
+COLUNAS = (
+    'origem', 'arquivo', 'paginas', 'status', 'status_geral', 'total_irregularidades', 'impacto_financeiro',
+    'tipos_irregularidades', 'numero_instalacao', 'mes_referencia', 'distribuidora', 'subgrupo',
+    'consumo_kwh', 'valor_total', 'erro'
+)
+
+# Arquivos ZIP abertos em cada processo de trabalho (evita reler o diretório central a cada conta)
+_zips_abertos: Dict[str, zipfile.ZipFile] = {}
+
+
+def listar_arquivos(origem: str) -> List[str]:
+    """Identificadores das contas: caminhos relativos à pasta ou nomes dos membros do ZIP"""
+    if zipfile.is_zipfile(origem):
+        with zipfile.ZipFile(origem) as arquivo_zip:
+            nomes = [membro.filename for membro in arquivo_zip.infolist() if not membro.is_dir()]
+    else:
+        nomes = []
+        for pasta, subpastas, arquivos in os.walk(origem):
+            subpastas.sort()
+            nomes.extend(os.path.relpath(os.path.join(pasta, arquivo), origem) for arquivo in sorted(arquivos))
+    return [nome for nome in nomes if '.' in nome and nome.rsplit('.', 1)[1].lower() in EXTENSOES]
+
+
+def auditar_arquivo(origem: str, nome: str) -> List[Dict[str, Any]]:
+    """
+    Executa o pipeline para as contas de um arquivo (executado nos processos de trabalho)
+    Um PDF com várias contas gera um resultado por conta, todos com o arquivo como origem
+    """
+    try:
+        if os.path.isdir(origem):
+            contas = contas_arquivo(nome, caminho=os.path.join(origem, nome))
+        else:
+            arquivo_zip = _zips_abertos.get(origem)
+            if arquivo_zip is None:
+                arquivo_zip = _zips_abertos[origem] = zipfile.ZipFile(origem)
+            contas = contas_arquivo(nome, conteudo=arquivo_zip.read(nome))
+        resultados = [processar_conta_ingerida(conta) for conta in contas]
+    except Exception as e:
+        resultados = [resultado_erro(nome, f'Erro ao ler arquivo: {str(e)}')]
+    for resultado in resultados:
+        resultado['origem'] = nome
+    return resultados
+
+
+def linha_resumo(resultado: Dict[str, Any]) -> Dict[str, Any]:
+    """Resultado achatado nas COLUNAS"""
+    dados = resultado.get('dados_extraidos') or {}
+    resumo = resultado.get('resumo') or {}
+    return {
+        'origem': resultado.get('origem'),
+        'arquivo': resultado.get('arquivo'),
+        'paginas': resultado.get('paginas'),
+        'status': resultado.get('status'),
+        'status_geral': resumo.get('status_geral'),
+        'total_irregularidades': resumo.get('total_irregularidades', 0),
+        'impacto_financeiro': resumo.get('impacto_financeiro', 0.0),
+        'tipos_irregularidades': ';'.join(
+            irregularidade.get('tipo', '') for irregularidade in resultado.get('irregularidades', [])
+        ),
+        'numero_instalacao': _texto(dados.get('numero_instalacao')),
+        'mes_referencia': _texto(dados.get('mes_referencia')),
+        'distribuidora': _texto(dados.get('distribuidora')),
+        'subgrupo': _texto(dados.get('subgrupo')),
+        'consumo_kwh': _numero(dados.get('consumo_kwh')),
+        'valor_total': _numero(dados.get('valor_total')),
+        'erro': resultado.get('erro')
+    }
+
+
+def _texto(valor: Any) -> Optional[str]:
+    return None if valor is None else str(valor)
+
+
+def _numero(valor: Any) -> Optional[float]:
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _origens(resultados: List[Dict[str, Any]]) -> List[str]:
+    """Origens distintas, na ordem (as contas de um PDF concatenado têm a mesma origem)"""
+    return list(dict.fromkeys(resultado['origem'] for resultado in resultados))
+
+
+class SaidaJsonl:
+    """Uma linha JSON por conta, com o resultado completo"""
+
+    def __init__(self, caminho: str):
+        self.arquivo = open(caminho, 'a', encoding='utf-8')
+
+    def escrever(self, resultados: List[Dict[str, Any]]) -> List[str]:
+        """Grava os resultados de um arquivo e retorna as origens já persistidas (para o checkpoint)"""
+        self.arquivo.write(''.join(
+            json.dumps(resultado, ensure_ascii=False, default=str) + '\n' for resultado in resultados
+        ))
+        self.arquivo.flush()
+        return _origens(resultados)
+
+    def fechar(self) -> List[str]:
+        self.arquivo.close()
+        return []
+
+
+class SaidaCsv:
+    """Uma linha por conta nas COLUNAS"""
+
+    def __init__(self, caminho: str):
+        novo = not os.path.exists(caminho) or os.path.getsize(caminho) == 0
+        self.arquivo = open(caminho, 'a', encoding='utf-8', newline='')
+        self.escritor = csv.DictWriter(self.arquivo, fieldnames=COLUNAS)
+        if novo:
+            self.escritor.writeheader()
+
+    def escrever(self, resultados: List[Dict[str, Any]]) -> List[str]:
+        self.escritor.writerows(linha_resumo(resultado) for resultado in resultados)
+        self.arquivo.flush()
+        return _origens(resultados)
+
+    def fechar(self) -> List[str]:
+        self.arquivo.close()
+        return []
+
+
+class SaidaParquet:
+    """
+    Pasta com arquivos de parte (Parquet não permite acrescentar linhas a um arquivo);
+    as contas entram no checkpoint quando a parte que as contém é gravada
+    """
+
+    def __init__(self, caminho: str, contas_por_parte: int = CONTAS_POR_PARTE):
+        if pyarrow is None:
+            raise RuntimeError('O formato parquet requer o pacote pyarrow')
+        os.makedirs(caminho, exist_ok=True)
+        self.caminho = caminho
+        self.contas_por_parte = contas_por_parte
+        self.linhas: List[Dict[str, Any]] = []
+        self.parte = len([nome for nome in os.listdir(caminho) if nome.endswith('.parquet')])
+
+    def escrever(self, resultados: List[Dict[str, Any]]) -> List[str]:
+        # As contas de um arquivo entram sempre na mesma parte
+        self.linhas.extend(linha_resumo(resultado) for resultado in resultados)
+        if len(self.linhas) >= self.contas_por_parte:
+            return self._gravar_parte()
+        return []
+
+    def _gravar_parte(self) -> List[str]:
+        if not self.linhas:
+            return []
+        tabela = pyarrow.Table.from_pylist(self.linhas)
+        destino = os.path.join(self.caminho, f'parte-{self.parte:05d}.parquet')
+        pq.write_table(tabela, destino + '.tmp')
+        os.replace(destino + '.tmp', destino)
+        self.parte += 1
+        origens = _origens(self.linhas)
+        self.linhas = []
+        return origens
+
+    def fechar(self) -> List[str]:
+        return self._gravar_parte()
+
+
+SAIDAS = {'jsonl': SaidaJsonl, 'csv': SaidaCsv, 'parquet': SaidaParquet}
+
+
+class Checkpoint:
+    """Origens já gravadas na saída, uma por linha"""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.concluidos: Set[str] = set()
+        if os.path.exists(caminho):
+            with open(caminho, encoding='utf-8') as arquivo:
+                self.concluidos = {linha.rstrip('\n') for linha in arquivo if linha.strip()}
+        self.arquivo = open(caminho, 'a', encoding='utf-8')
+
+    def registrar(self, origens: List[str]):
+        if origens:
+            self.arquivo.write(''.join(f'{origem}\n' for origem in origens))
+            self.arquivo.flush()
+
+    def fechar(self):
+        self.arquivo.close()
+
+
+class Progresso:
+    """Arquivos por segundo e tempo restante estimado, atualizados no terminal"""
+
+    def __init__(self, total: int, ja_concluidas: int, exibir: bool = True, intervalo: float = 1.0):
+        self.total = total
+        self.ja_concluidas = ja_concluidas
+        self.exibir = exibir
+        self.intervalo = intervalo
+        self.concluidas = 0
+        self.contas = 0
+        self.erros = 0
+        self.inicio = time.monotonic()
+        self._ultima_exibicao = 0.0
+
+    def atualizar(self, resultados: List[Dict[str, Any]]):
+        self.concluidas += 1
+        self.contas += len(resultados)
+        self.erros += sum(1 for resultado in resultados if resultado.get('status') == 'erro')
+        agora = time.monotonic()
+        if self.exibir and agora - self._ultima_exibicao >= self.intervalo:
+            self._ultima_exibicao = agora
+            sys.stderr.write('\r' + self.linha() + ' ' * 4)
+            sys.stderr.flush()
+
+    @property
+    def taxa(self) -> float:
+        decorrido = time.monotonic() - self.inicio
+        return self.concluidas / decorrido if decorrido > 0 else 0.0
+
+    def linha(self) -> str:
+        feitas = self.ja_concluidas + self.concluidas
+        restantes = self.total - feitas
+        taxa = self.taxa
+        eta = _duracao(restantes / taxa) if taxa > 0 else '--:--:--'
+        return (f"{feitas}/{self.total} arquivos ({feitas / max(self.total, 1):.1%}) | "
+                f"{self.contas} contas | {taxa:.1f} arquivos/s | ETA {eta} | erros {self.erros}")
+
+    def finalizar(self):
+        if self.exibir:
+            sys.stderr.write('\r' + self.linha() + ' ' * 4 + '\n')
+            sys.stderr.flush()
+
+
+def _duracao(segundos: float) -> str:
+    segundos = int(segundos)
+    return f"{segundos // 3600:02d}:{segundos % 3600 // 60:02d}:{segundos % 60:02d}"
+
+
+def auditar(origem: str, saida: str, formato: str, processos: int, em_andamento: int,
+            checkpoint: str, exibir_progresso: bool = True) -> Tuple[int, int, int]:
+    """
+    Audita os arquivos da origem que ainda não estão no checkpoint
+
+    Returns:
+        (arquivos processados nesta execução, contas auditadas, contas com erro)
+    """
+    arquivos = listar_arquivos(origem)
+    registro = Checkpoint(checkpoint)
+    pendentes = [nome for nome in arquivos if nome not in registro.concluidos]
+    progresso = Progresso(len(arquivos), len(arquivos) - len(pendentes), exibir_progresso)
+    escritor = SAIDAS[formato](saida)
+
+    def concluir(resultados):
+        registro.registrar(escritor.escrever(resultados))
+        progresso.atualizar(resultados)
+
+    nomes: Iterator[str] = iter(pendentes)
+    try:
+        if processos == 1:
+            for nome in nomes:
+                concluir(auditar_arquivo(origem, nome))
+        else:
+            with ProcessPoolExecutor(max_workers=processos) as executor:
+                # No máximo em_andamento arquivos submetidos e ainda não gravados
+                futuros = {executor.submit(auditar_arquivo, origem, nome) for nome in _proximos(nomes, em_andamento)}
+                try:
+                    while futuros:
+                        concluidos, futuros = wait(futuros, return_when=FIRST_COMPLETED)
+                        for futuro in concluidos:
+                            concluir(futuro.result())
+                        futuros |= {
+                            executor.submit(auditar_arquivo, origem, nome)
+                            for nome in _proximos(nomes, len(concluidos))
+                        }
+                except BaseException:
+                    for futuro in futuros:
+                        futuro.cancel()
+                    raise
+    finally:
+        registro.registrar(escritor.fechar())
+        registro.fechar()
+        progresso.finalizar()
+
+    return progresso.concluidas, progresso.contas, progresso.erros
+
+
+def _proximos(nomes: Iterator[str], quantidade: int) -> List[str]:
+    proximos = []
+    for nome in nomes:
+        proximos.append(nome)
+        if len(proximos) >= quantidade:
+            break
+    return proximos
+
+
+def _formato_da_saida(saida: str) -> str:
+    extensao = saida.rsplit('.', 1)[-1].lower() if '.' in os.path.basename(saida) else ''
+    return extensao if extensao in FORMATOS else 'jsonl'
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m src.cli', description='Auditoria de contas de energia')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    auditar_parser = comandos.add_parser('auditar', help='Audita uma pasta ou arquivo ZIP de contas')
+    auditar_parser.add_argument('origem', help='Pasta (percorrida recursivamente) ou arquivo ZIP')
+    auditar_parser.add_argument('--saida', '-o', help='Arquivo de resultados (padrão: <origem>.resultados.jsonl)')
+    auditar_parser.add_argument('--formato', choices=FORMATOS,
+                                help='Formato da saída (padrão: pela extensão da saída, ou jsonl)')
+    auditar_parser.add_argument('--processos', type=int, default=os.cpu_count() or 1)
+    auditar_parser.add_argument('--em-andamento', type=int,
+                                help='Máximo de arquivos em processamento (padrão: 4 por processo)')
+    auditar_parser.add_argument('--checkpoint', help='Arquivo de checkpoint (padrão: <saida>.checkpoint)')
+    auditar_parser.add_argument('--tarifas', help='Tabela de tarifas (JSON ou SQLite)')
+    auditar_parser.add_argument('--layouts', help='Layouts de conta adicionais por distribuidora (JSON)')
+    auditar_parser.add_argument('--cache-ocr', help='Pasta do cache de páginas renderizadas e textos do OCR')
+    auditar_parser.add_argument('--sem-progresso', action='store_true', help='Não exibe o progresso')
+
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.origem):
+        parser.error(f'origem não encontrada: {args.origem}')
+    saida = args.saida or f"{args.origem.rstrip(os.sep)}.resultados.{args.formato or 'jsonl'}"
+    formato = args.formato or _formato_da_saida(saida)
+    processos = max(args.processos, 1)
+
+    # Carregados antes de criar o pool: os processos herdam tabela, layouts e cache do OCR
+    if args.tarifas:
+        regras_auditoria.carregar_tarifas(args.tarifas)
+    if args.layouts:
+        registro_layouts.carregar_arquivo(args.layouts)
+    if args.cache_ocr:
+        cache_ocr.configurar(args.cache_ocr)
+
+    inicio = time.monotonic()
+    try:
+        processados, contas, erros = auditar(
+            args.origem, saida, formato, processos,
+            args.em_andamento or processos * 4,
+            args.checkpoint or f'{saida}.checkpoint',
+            exibir_progresso=not args.sem_progresso
+        )
+    except KeyboardInterrupt:
+        print('Interrompido; execute o mesmo comando para continuar', file=sys.stderr)
+        return 130
+
+    print(f"{processados} arquivos, {contas} contas auditadas ({erros} com erro) em {_duracao(time.monotonic() - inicio)}; "
+          f"resultados em {saida}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+Módulo de entrega do frontend compilado (src/static)
+Os arquivos são comprimidos (gzip e brotli) no build e lidos uma única vez na
+inicialização para um manifesto em memória: as requisições não consultam o disco,
+recebem ETag forte e respondem 304 quando o navegador já tem a versão atual.
+Arquivos com hash no nome (assets/ do Vite) são servidos como imutáveis
+
+Uso no build:
+    python -m src.estaticos [pasta]    (ou flask comprimir-estaticos)
+"""
+
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+from typing import Dict, List, Optional
+
+from flask import Response, abort, request
+
+# Brotli é opcional: sem ele apenas as versões gzip são geradas
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Extensões que valem a compressão (imagens e fontes já são comprimidas)
+EXTENSOES_COMPRIMIVEIS = {
+    '.html', '.js', '.mjs', '.css', '.json', '.map', '.svg', '.txt', '.xml', '.ico', '.wasm', '.webmanifest'
+}
+
+# Codificações na ordem de preferência e o sufixo do arquivo pré-comprimido
+CODIFICACOES = (('br', '.br'), ('gzip', '.gz'))
+
+# Arquivos menores que isto não são comprimidos
+TAMANHO_MINIMO_COMPRESSAO = 256
+
+# Arquivos maiores que isto ficam no disco e são lidos a cada requisição
+TAMANHO_MAXIMO_MEMORIA = 4 * 1024 * 1024
+
+# Nome gerado pelo Vite em assets/: nome-<hash>.ext
+_NOME_COM_HASH = re.compile(r'-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+CACHE_REVALIDAR = 'no-cache'
+
+
+def _comprimir(conteudo: bytes, codificacao: str) -> bytes:
+    if codificacao == 'br':
+        return brotli.compress(conteudo, quality=11)
+    return gzip.compress(conteudo, compresslevel=9, mtime=0)
+
+
+def _codificacoes_disponiveis() -> List[tuple]:
+    return [(nome, sufixo) for nome, sufixo in CODIFICACOES if nome != 'br' or brotli is not None]
+
+
+def _listar(pasta: str):
+    """Caminhos relativos (com '/') dos arquivos originais da pasta"""
+    sufixos = tuple(sufixo for _, sufixo in CODIFICACOES)
+    for raiz, _, arquivos in os.walk(pasta):
+        for nome in arquivos:
+            if nome.endswith(sufixos) or nome.startswith('.'):
+                continue
+            caminho = os.path.join(raiz, nome)
+            yield os.path.relpath(caminho, pasta).replace(os.sep, '/'), caminho
+
+
+def comprimir_estaticos(pasta: str) -> Dict[str, int]:
+    """
+    Gera ao lado de cada arquivo comprimível as versões .br e .gz (passo do build);
+    versões atualizadas são mantidas e as que não reduzem o tamanho são removidas
+    """
+    totais = {'arquivos': 0, 'gerados': 0, 'bytes_originais': 0, 'bytes_comprimidos': 0}
+    for _, caminho in _listar(pasta):
+        if os.path.splitext(caminho)[1].lower() not in EXTENSOES_COMPRIMIVEIS:
+            continue
+        tamanho = os.path.getsize(caminho)
+        if tamanho < TAMANHO_MINIMO_COMPRESSAO:
+            continue
+        totais['arquivos'] += 1
+        totais['bytes_originais'] += tamanho
+        modificacao = os.path.getmtime(caminho)
+        conteudo = None
+        menor = tamanho
+        for codificacao, sufixo in _codificacoes_disponiveis():
+            destino = caminho + sufixo
+            if os.path.exists(destino) and os.path.getmtime(destino) >= modificacao:
+                menor = min(menor, os.path.getsize(destino))
+                continue
+            if conteudo is None:
+                with open(caminho, 'rb') as arquivo:
+                    conteudo = arquivo.read()
+            comprimido = _comprimir(conteudo, codificacao)
+            if len(comprimido) >= tamanho:
+                if os.path.exists(destino):
+                    os.remove(destino)
+                continue
+            with open(destino, 'wb') as arquivo:
+                arquivo.write(comprimido)
+            totais['gerados'] += 1
+            menor = min(menor, len(comprimido))
+        totais['bytes_comprimidos'] += menor
+    return totais
+
+
+class Variante:
+    """Uma representação do arquivo (original ou comprimida)"""
+
+    __slots__ = ('codificacao', 'etag', 'tamanho', 'conteudo', 'caminho')
+
+    def __init__(self, codificacao: Optional[str], etag: str, tamanho: int,
+                 conteudo: Optional[bytes], caminho: str):
+        self.codificacao = codificacao
+        self.etag = etag
+        self.tamanho = tamanho
+        self.conteudo = conteudo
+        self.caminho = caminho
+
+    def corpo(self):
+        if self.conteudo is not None:
+            return self.conteudo
+        with open(self.caminho, 'rb') as arquivo:
+            return arquivo.read()
+
+
+class Ativo:
+    """Entrada do manifesto: tipo, política de cache e variantes por codificação"""
+
+    __slots__ = ('tipo', 'cache', 'variantes')
+
+    def __init__(self, tipo: str, cache: str, variantes: Dict[Optional[str], Variante]):
+        self.tipo = tipo
+        self.cache = cache
+        self.variantes = variantes
+
+
+def _ler(caminho: str, tamanho: int) -> Optional[bytes]:
+    if tamanho > TAMANHO_MAXIMO_MEMORIA:
+        return None
+    with open(caminho, 'rb') as arquivo:
+        return arquivo.read()
+
+
+def _etag(caminho: str) -> str:
+    resumo = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            resumo.update(bloco)
+    return resumo.hexdigest()[:32]
+
+
+def montar_manifesto(pasta: str) -> Dict[str, Ativo]:
+    """Lê a pasta uma vez: caminho relativo -> ativo com suas variantes"""
+    manifesto: Dict[str, Ativo] = {}
+    if not pasta or not os.path.isdir(pasta):
+        return manifesto
+
+    for relativo, caminho in _listar(pasta):
+        tamanho = os.path.getsize(caminho)
+        base = _etag(caminho)
+        variantes = {None: Variante(None, f'"{base}"', tamanho, _ler(caminho, tamanho), caminho)}
+        modificacao = os.path.getmtime(caminho)
+        for codificacao, sufixo in CODIFICACOES:
+            comprimido = caminho + sufixo
+            # Versões mais antigas que o original ficaram de um build anterior
+            if os.path.exists(comprimido) and os.path.getmtime(comprimido) >= modificacao:
+                tamanho_comprimido = os.path.getsize(comprimido)
+                variantes[codificacao] = Variante(
+                    codificacao, f'"{base}-{codificacao}"', tamanho_comprimido,
+                    _ler(comprimido, tamanho_comprimido), comprimido
+                )
+
+        tipo = mimetypes.guess_type(relativo)[0] or 'application/octet-stream'
+        if tipo.startswith('text/') or tipo in ('application/javascript', 'application/json', 'image/svg+xml'):
+            tipo += '; charset=utf-8'
+        com_hash = relativo.startswith('assets/') and _NOME_COM_HASH.search(relativo) is not None
+        manifesto[relativo] = Ativo(tipo, CACHE_IMUTAVEL if com_hash else CACHE_REVALIDAR, variantes)
+    return manifesto
+
+
+def _etag_confere(etag: str, cabecalho: str) -> bool:
+    """Comparação fraca do If-None-Match (RFC 9110): W/"x" confere com "x" """
+    if cabecalho.strip() == '*':
+        return True
+    return any(
+        candidato.strip().removeprefix('W/') == etag for candidato in cabecalho.split(',')
+    )
+
+
+class AtivosEstaticos:
+    """Manifesto do frontend e rota que o serve, com o index.html como retorno das rotas do SPA"""
+
+    def __init__(self):
+        self.manifesto: Dict[str, Ativo] = {}
+        self.pasta: Optional[str] = None
+
+    def carregar(self, pasta: Optional[str]):
+        self.pasta = pasta
+        self.manifesto = montar_manifesto(pasta)
+
+    def init_app(self, app):
+        """Monta o manifesto, registra a rota de arquivos e o comando comprimir-estaticos"""
+        self.carregar(app.config.get('ESTATICOS_PASTA', app.static_folder))
+
+        app.add_url_rule('/', 'serve', self.servir, defaults={'path': ''})
+        app.add_url_rule('/<path:path>', 'serve', self.servir)
+
+        @app.cli.command('comprimir-estaticos')
+        def comprimir():
+            """Gera as versões .br/.gz do frontend (executar após copiar o build para src/static)"""
+            totais = comprimir_estaticos(self.pasta)
+            print(f"{totais['arquivos']} arquivos comprimíveis, {totais['gerados']} versões geradas; "
+                  f"{totais['bytes_originais']:,} -> {totais['bytes_comprimidos']:,} bytes")
+
+    def _escolher(self, ativo: Ativo) -> Variante:
+        if len(ativo.variantes) > 1:
+            aceitas = request.accept_encodings
+            for codificacao, _ in CODIFICACOES:
+                if codificacao in ativo.variantes and aceitas[codificacao] > 0:
+                    return ativo.variantes[codificacao]
+        return ativo.variantes[None]
+
+    def responder(self, ativo: Ativo) -> Response:
+        variante = self._escolher(ativo)
+        cabecalhos = {'ETag': variante.etag, 'Cache-Control': ativo.cache}
+        if len(ativo.variantes) > 1:
+            cabecalhos['Vary'] = 'Accept-Encoding'
+
+        condicao = request.headers.get('If-None-Match')
+        if condicao and _etag_confere(variante.etag, condicao):
+            return Response(status=304, headers=cabecalhos)
+
+        if variante.codificacao:
+            cabecalhos['Content-Encoding'] = variante.codificacao
+        return Response(variante.corpo(), headers=cabecalhos, content_type=ativo.tipo)
+
+    def servir(self, path: str):
+        if self.pasta is None:
+            return "Static folder not configured", 404
+
+        ativo = self.manifesto.get(path)
+        if ativo is None:
+            # Rotas do SPA (sem extensão) recebem o index.html; arquivos e a API inexistentes, 404
+            ultimo = path.rsplit('/', 1)[-1]
+            if path.startswith('api/') or path == 'api' or '.' in ultimo:
+                abort(404)
+            ativo = self.manifesto.get('index.html')
+            if ativo is None:
+                return "index.html not found", 404
+        return self.responder(ativo)
+
+
+ativos_estaticos = AtivosEstaticos()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m src.estaticos',
+                                     description='Gera as versões .br/.gz dos arquivos do frontend')
+    parser.add_argument('pasta', nargs='?', default=os.path.join(os.path.dirname(__file__), 'static'))
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.pasta):
+        parser.error(f'pasta não encontrada: {args.pasta}')
+    if brotli is None:
+        print('brotli não instalado: apenas versões gzip serão geradas', file=sys.stderr)
+    totais = comprimir_estaticos(args.pasta)
+    print(f"{totais['arquivos']} arquivos comprimíveis, {totais['gerados']} versões geradas; "
+          f"{totais['bytes_originais']:,} -> {totais['bytes_comprimidos']:,} bytes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
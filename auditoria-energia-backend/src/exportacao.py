@@ -0,0 +1,214 @@
+"""
+Módulo de exportação do relatório consolidado (CSV e XLSX) em fluxo
+As linhas vêm dos resumos mensais lidos em blocos pelo cursor do banco e os
+arquivos são gerados por partes, sem manter o resultado nem o arquivo em memória
+"""
+
+import csv
+import io
+import re
+import zipfile
+from typing import Iterator, List, Any, Optional, Sequence
+from xml.sax.saxutils import escape
+
+from src.models.user import db
+from src.models.resumo import ResumoMensalInstalacao
+
+# Linhas lidas do banco por vez
+LINHAS_POR_BLOCO = 1000
+
+# Limite de linhas de uma planilha do Excel; acima dele o relatório continua em nova planilha
+LINHAS_POR_PLANILHA = 1048576
+
+CABECALHO = (
+    'Distribuidora', 'Unidade consumidora', 'Competência', 'Auditorias',
+    'Não conformes', 'Irregularidades', 'Impacto financeiro (R$)'
+)
+
+
+def linhas_relatorio(competencia_inicio: Optional[str] = None, competencia_fim: Optional[str] = None,
+                     distribuidora: Optional[str] = None, subtotais: bool = True) -> Iterator[List[Any]]:
+    """
+    Linhas do relatório por distribuidora, unidade consumidora e competência, na ordem
+    da chave dos resumos, com subtotal por distribuidora e total geral
+    """
+    consulta = db.select(
+        ResumoMensalInstalacao.distribuidora, ResumoMensalInstalacao.numero_instalacao,
+        ResumoMensalInstalacao.competencia, ResumoMensalInstalacao.auditorias,
+        ResumoMensalInstalacao.nao_conformes, ResumoMensalInstalacao.irregularidades,
+        ResumoMensalInstalacao.impacto_financeiro
+    )
+    if competencia_inicio:
+        consulta = consulta.where(ResumoMensalInstalacao.competencia >= competencia_inicio)
+    if competencia_fim:
+        consulta = consulta.where(ResumoMensalInstalacao.competencia <= competencia_fim)
+    if distribuidora:
+        consulta = consulta.where(ResumoMensalInstalacao.distribuidora == distribuidora)
+    consulta = consulta.order_by(
+        ResumoMensalInstalacao.distribuidora, ResumoMensalInstalacao.numero_instalacao,
+        ResumoMensalInstalacao.competencia
+    ).execution_options(yield_per=LINHAS_POR_BLOCO)
+
+    atual = None
+    subtotal = [0, 0, 0, 0.0]
+    total = [0, 0, 0, 0.0]
+    for linha in db.session.execute(consulta):
+        if subtotais and atual is not None and linha.distribuidora != atual:
+            yield [f'Subtotal {atual or "(sem distribuidora)"}', '', ''] + _arredondar(subtotal)
+            subtotal = [0, 0, 0, 0.0]
+        atual = linha.distribuidora
+        valores = [linha.auditorias, linha.nao_conformes, linha.irregularidades, linha.impacto_financeiro]
+        for posicao, valor in enumerate(valores):
+            subtotal[posicao] += valor
+            total[posicao] += valor
+        yield [linha.distribuidora, linha.numero_instalacao, linha.competencia] + _arredondar(valores)
+
+    if subtotais and atual is not None:
+        yield [f'Subtotal {atual or "(sem distribuidora)"}', '', ''] + _arredondar(subtotal)
+        yield ['Total geral', '', ''] + _arredondar(total)
+
+
+def _arredondar(valores: List[Any]) -> List[Any]:
+    return valores[:3] + [round(valores[3], 2)]
+
+
+def gerar_csv(linhas: Iterator[Sequence[Any]], cabecalho: Sequence[str] = CABECALHO) -> Iterator[bytes]:
+    """CSV (separador ';' e BOM, como o Excel espera em pt-BR) gerado em blocos"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';')
+    buffer.write('\ufeff')
+    escritor.writerow(cabecalho)
+    for indice, linha in enumerate(linhas, 1):
+        escritor.writerow(
+            [f'{valor:.2f}'.replace('.', ',') if isinstance(valor, float) else valor for valor in linha]
+        )
+        if indice % LINHAS_POR_BLOCO == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _FluxoSaida(io.RawIOBase):
+    """Destino não posicionável do zipfile: acumula os bytes até serem consumidos"""
+
+    def __init__(self):
+        self.partes: List[bytes] = []
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def consumir(self) -> bytes:
+        dados = b''.join(self.partes)
+        self.partes = []
+        return dados
+
+
+# Caracteres de controle não aceitos em XML
+_CARACTERES_INVALIDOS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _celula(valor: Any) -> str:
+    if valor is None:
+        valor = ''
+    if isinstance(valor, (int, float)):
+        return f'<c><v>{valor}</v></c>'
+    texto = escape(_CARACTERES_INVALIDOS.sub('', str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _linha_xml(linha: Sequence[Any]) -> str:
+    return '<row>' + ''.join(_celula(valor) for valor in linha) + '</row>'
+
+
+_INICIO_PLANILHA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_FIM_PLANILHA = '</sheetData></worksheet>'
+
+
+def gerar_xlsx(linhas: Iterator[Sequence[Any]], cabecalho: Sequence[str] = CABECALHO,
+               nome_planilha: str = 'Relatório') -> Iterator[bytes]:
+    """
+    Planilha XLSX gerada em blocos: as planilhas usam textos em linha (sem tabela de
+    textos compartilhados) e o pacote ZIP é escrito sem posicionamento no arquivo
+    """
+    fluxo = _FluxoSaida()
+    pacote = zipfile.ZipFile(fluxo, 'w', zipfile.ZIP_DEFLATED)
+    planilhas = 0
+    planilha = None
+    linhas_planilha = 0
+
+    for linha in linhas:
+        if planilha is None or linhas_planilha >= LINHAS_POR_PLANILHA:
+            if planilha is not None:
+                planilha.write(_FIM_PLANILHA.encode('utf-8'))
+                planilha.close()
+            planilhas += 1
+            planilha = pacote.open(f'xl/worksheets/sheet{planilhas}.xml', 'w', force_zip64=True)
+            planilha.write((_INICIO_PLANILHA + _linha_xml(cabecalho)).encode('utf-8'))
+            linhas_planilha = 1
+        planilha.write(_linha_xml(linha).encode('utf-8'))
+        linhas_planilha += 1
+        if linhas_planilha % LINHAS_POR_BLOCO == 0:
+            dados = fluxo.consumir()
+            if dados:
+                yield dados
+
+    if planilha is None:
+        planilhas = 1
+        pacote.writestr('xl/worksheets/sheet1.xml', _INICIO_PLANILHA + _linha_xml(cabecalho) + _FIM_PLANILHA)
+    else:
+        planilha.write(_FIM_PLANILHA.encode('utf-8'))
+        planilha.close()
+
+    nomes = [nome_planilha if indice == 1 else f'{nome_planilha} {indice}' for indice in range(1, planilhas + 1)]
+    pacote.writestr('[Content_Types].xml', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        + ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{indice}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for indice in range(1, planilhas + 1)
+        )
+        + '</Types>'
+    ))
+    pacote.writestr('_rels/.rels', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/></Relationships>'
+    ))
+    pacote.writestr('xl/workbook.xml', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+        + ''.join(
+            f'<sheet name="{escape(nome[:31])}" sheetId="{indice}" r:id="rId{indice}"/>'
+            for indice, nome in enumerate(nomes, 1)
+        )
+        + '</sheets></workbook>'
+    ))
+    pacote.writestr('xl/_rels/workbook.xml.rels', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + ''.join(
+            f'<Relationship Id="rId{indice}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{indice}.xml"/>'
+            for indice in range(1, planilhas + 1)
+        )
+        + '</Relationships>'
+    ))
+    pacote.close()
+    yield fluxo.consumir()
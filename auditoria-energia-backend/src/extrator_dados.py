@@ -3,15 +3,137 @@ Módulo para extração de dados de contas de energia elétrica
 Utiliza OCR e processamento de texto para extrair informações relevantes
 """
 
+import io
 import re
 import os
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Any, Optional, Iterable, Tuple
 from datetime import datetime
 
+from src.layouts_distribuidora import (
+    RegistroLayouts, LayoutDistribuidora, registro_layouts, normalizar, REGIAO_CABECALHO
+)
+from src.cache_ocr import CacheOcr, cache_ocr, chave, impressao_imagem, impressao_pagina, versao_tesseract
+
+# Dependências opcionais: sem elas o extrator recorre aos dados simulados
+try:
+    import pymupdf as fitz
+except ImportError:
+    try:
+        import fitz  # Versões antigas do PyMuPDF
+    except ImportError:
+        fitz = None
+
+try:
+    import pytesseract
+    from PIL import Image
+except ImportError:
+    pytesseract = None
+    Image = None
+
+# Versão do extrator; deve ser alterada sempre que padrões ou conversões mudarem
+VERSAO_EXTRATOR = '1.2.0'
+
+# Páginas com menos caracteres que isso na camada de texto são tratadas como imagem
+MIN_CARACTERES_CAMADA_TEXTO = 50
+
+# Parâmetros do OCR
+OCR_DPI = 300
+OCR_IDIOMA = 'por'
+OCR_MAX_THREADS = os.cpu_count() or 1
+
+EXTENSOES_IMAGEM = {'png', 'jpg', 'jpeg'}
+
+# Região com a página inteira (frações da largura e da altura)
+PAGINA_INTEIRA = (0.0, 0.0, 1.0, 1.0)
+
+# Campos que identificam uma conta; a mudança de um deles entre páginas marca o início de outra conta
+CAMPOS_IDENTIFICACAO = ('numero_instalacao', 'mes_referencia')
+
+# Expressões usadas nas conversões numéricas
+_NAO_MONETARIO = re.compile(r'[^\d,.]')
+_NAO_NUMERICO = re.compile(r'[^\d,]')
+
+class _PaginaPdf:
+    """Texto de regiões de uma página PDF: palavras da camada de texto ou OCR só do recorte"""
+
+    def __init__(self, extrator: 'ExtratorDados', pagina):
+        self.extrator = extrator
+        self.pagina = pagina
+        self.largura = pagina.rect.width
+        self.altura = pagina.rect.height
+        # Sem sort=True (reordenar a página inteira custa mais que o próprio texto): só as
+        # palavras de cada região são ordenadas
+        self.palavras = pagina.get_text('words')
+        self.digitalizada = sum(len(palavra[4]) for palavra in self.palavras) < MIN_CARACTERES_CAMADA_TEXTO
+
+    def _absoluto(self, retangulo: Tuple[float, float, float, float]) -> Tuple[float, float, float, float]:
+        x0, y0, x1, y1 = retangulo
+        return x0 * self.largura, y0 * self.altura, x1 * self.largura, y1 * self.altura
+
+    def textos(self, retangulos: List[Tuple[float, float, float, float]]) -> List[str]:
+        if not self.digitalizada:
+            textos = []
+            for retangulo in retangulos:
+                x0, y0, x1, y1 = self._absoluto(retangulo)
+                # Palavra pertence à região pelo centro da sua caixa; ordem de leitura por linha e coluna
+                palavras = sorted(
+                    (round(palavra[3]), palavra[0], palavra[4]) for palavra in self.palavras
+                    if x0 <= (palavra[0] + palavra[2]) / 2 <= x1 and y0 <= (palavra[1] + palavra[3]) / 2 <= y1
+                )
+                textos.append(' '.join(palavra[2] for palavra in palavras))
+            return textos
+        if pytesseract is None:
+            return [''] * len(retangulos)
+        return self.extrator._ocr_recortes_pagina(
+            self.pagina, [fitz.Rect(*self._absoluto(retangulo)) for retangulo in retangulos]
+        )
+
+
+class _PaginaImagem:
+    """Texto de regiões de uma imagem digitalizada: OCR de cada recorte"""
+
+    digitalizada = True
+
+    def __init__(self, extrator: 'ExtratorDados', imagem):
+        self.extrator = extrator
+        self.imagem = imagem if imagem.mode == 'L' else imagem.convert('L')
+        self._impressao: Optional[str] = None
+
+    def textos(self, retangulos: List[Tuple[float, float, float, float]]) -> List[str]:
+        largura, altura = self.imagem.size
+        caixas = [
+            (int(x0 * largura), int(y0 * altura), int(x1 * largura), int(y1 * altura))
+            for x0, y0, x1, y1 in retangulos
+        ]
+        cache = self.extrator.cache_ocr
+        chaves: List[Optional[str]] = [None] * len(caixas)
+        if cache.habilitado:
+            # Pixels da imagem inteira lidos uma vez; cada recorte tem a sua chave
+            self._impressao = self._impressao or impressao_imagem(self.imagem)
+            chaves = [chave(self._impressao, caixa, OCR_IDIOMA, versao_tesseract()) for caixa in caixas]
+        return self.extrator._ocr_com_cache(chaves, lambda faltantes: [
+            self.imagem if caixas[indice] == (0, 0, largura, altura) else self.imagem.crop(caixas[indice])
+            for indice in faltantes
+        ])
+
+
 class ExtratorDados:
     """Classe para extrair dados de contas de energia elétrica"""
     
-    def __init__(self):
+    def __init__(self, layouts: Optional[RegistroLayouts] = None, cache: Optional[CacheOcr] = None,
+                 simulado: Optional[bool] = None):
+        # Layouts por distribuidora; sem layout reconhecido valem os padrões genéricos abaixo
+        self.layouts = layouts if layouts is not None else registro_layouts
+
+        # Dados simulados para arquivos sem texto legível só em demonstrações (EXTRACAO_SIMULADA=1);
+        # fora delas a conta é rejeitada. Lido do ambiente para valer também nos processos de trabalho
+        self.simulado = simulado if simulado is not None else os.environ.get('EXTRACAO_SIMULADA', '0') == '1'
+
+        # Páginas renderizadas e textos do OCR já obtidos (desativado até a pasta ser configurada)
+        self.cache_ocr = cache if cache is not None else cache_ocr
+        
         # Padrões regex para extração de dados
         self.padroes = {
             'consumo_kwh': [
@@ -50,6 +172,12 @@ class ExtratorDados:
                 r'período[:\s]*(\d{2}/\d{4})'
             ]
         }
+        self.compilar_padroes()
+
+    @property
+    def versao(self) -> str:
+        """Versão dos padrões combinada com os layouts registrados"""
+        return f"{VERSAO_EXTRATOR}+layouts-{self.layouts.versao}"
 
     def extrair_dados_simulado(self, filepath: str) -> Dict[str, Any]:
         """
@@ -104,40 +232,335 @@ class ExtratorDados:
             
         return dados_simulados
 
-    def extrair_dados_ocr(self, filepath: str) -> Dict[str, Any]:
+    def extrair_dados_ocr(self, filepath: str, conteudo: Optional[Any] = None) -> Dict[str, Any]:
         """
-        Extrai dados usando OCR (implementação futura)
-        Por enquanto, retorna dados simulados
+        Extrai dados da conta a partir do texto do PDF/imagem
+        Em layouts conhecidos lê só as regiões dos campos; nos demais usa a camada de texto
+        dos PDFs digitais e OCR apenas nas páginas digitalizadas. Se nenhum texto puder ser
+        obtido, levanta ValueError (ou retorna dados simulados no modo de demonstração).
+        O conteúdo (bytes ou arquivo mapeado em memória) evita reabrir o arquivo pelo caminho
         """
-        # TODO: Implementar OCR real
-        # 1. Converter PDF para imagem se necessário
-        # 2. Aplicar pré-processamento na imagem
-        # 3. Usar Tesseract OCR para extrair texto
-        # 4. Aplicar regex patterns para extrair dados específicos
-        
-        return self.extrair_dados_simulado(filepath)
+        campos = self.extrair_campos_arquivo(filepath, conteudo)
+        if campos is None:
+            if self.simulado:
+                return self.extrair_dados_simulado(filepath)
+            raise ValueError('Nenhum texto legível no arquivo')
+
+        return self._converter_campos(campos)
+
+    def extrair_dados_texto(self, texto: str) -> Dict[str, Any]:
+        """Aplica os padrões regex ao texto e converte os campos encontrados"""
+        return self._converter_campos(self.extrair_campos(texto))
+
+    def _converter_campos(self, campos: Dict[str, Optional[str]]) -> Dict[str, Any]:
+        """Converte os valores capturados nos tipos dos dados da conta"""
+        dados = {}
+
+        consumo = campos.get('consumo_kwh')
+        if consumo:
+            dados['consumo_kwh'] = self._converter_consumo(consumo)
+
+        for campo in ('valor_total', 'valor_energia', 'icms'):
+            valor = campos.get(campo)
+            if valor:
+                dados[campo] = self._converter_valor_monetario(valor)
+
+        subgrupo = campos.get('subgrupo')
+        if subgrupo:
+            dados['subgrupo'] = subgrupo.upper()
+
+        bandeira = campos.get('bandeira_tarifaria')
+        if bandeira:
+            dados['bandeira_tarifaria'] = bandeira.lower()
+
+        for campo in ('numero_instalacao', 'mes_referencia', 'distribuidora'):
+            valor = campos.get(campo)
+            if valor:
+                dados[campo] = valor
+
+        return dados
+
+    def extrair_texto(self, filepath: str, conteudo: Optional[Any] = None) -> str:
+        """Obtém o texto do arquivo, retornando string vazia se não for possível"""
+        extensao = filepath.rsplit('.', 1)[-1].lower() if '.' in filepath else ''
+
+        try:
+            if extensao == 'pdf' and fitz is not None:
+                with self._abrir_pdf(filepath, conteudo) as documento:
+                    return self._extrair_texto_documento(documento)
+            if extensao in EXTENSOES_IMAGEM and pytesseract is not None:
+                texto, = _PaginaImagem(self, self._abrir_imagem(filepath, conteudo)).textos([PAGINA_INTEIRA])
+                return texto
+        except Exception:
+            # Arquivo corrompido ou motor de OCR indisponível
+            return ''
+
+        return ''
+
+    def extrair_campos_arquivo(self, filepath: str,
+                               conteudo: Optional[Any] = None) -> Optional[Dict[str, Optional[str]]]:
+        """
+        Valores capturados de cada campo (e a distribuidora do layout reconhecido),
+        ou None se nenhum texto puder ser obtido do arquivo
+        """
+        extensao = filepath.rsplit('.', 1)[-1].lower() if '.' in filepath else ''
+
+        try:
+            if extensao == 'pdf' and fitz is not None:
+                with self._abrir_pdf(filepath, conteudo) as documento:
+                    return self._campos_documento(documento)
+            if extensao in EXTENSOES_IMAGEM and pytesseract is not None:
+                return self._campos_imagem(self._abrir_imagem(filepath, conteudo))
+        except Exception:
+            # Arquivo corrompido ou motor de OCR indisponível
+            return None
 
-    def _extrair_campo(self, texto: str, campo: str) -> Optional[str]:
+        return None
+
+    @contextmanager
+    def _abrir_pdf(self, filepath: str, conteudo: Optional[Any] = None):
+        if conteudo is None:
+            with fitz.open(filepath) as documento:
+                yield documento
+            return
+
+        # O PyMuPDF lê direto do buffer, sem cópia para um novo arquivo
+        with memoryview(conteudo) as buffer, fitz.open(stream=buffer, filetype='pdf') as documento:
+            yield documento
+
+    def _abrir_imagem(self, filepath: str, conteudo: Optional[Any] = None):
+        if conteudo is None:
+            return Image.open(filepath)
+        # Arquivos mapeados já se comportam como arquivo; bytes são envolvidos
+        return Image.open(conteudo if hasattr(conteudo, 'read') else io.BytesIO(conteudo))
+
+    def _campos_layout(self, pagina) -> Tuple[Optional[LayoutDistribuidora], Dict[str, str]]:
+        """Identifica o layout pelo cabeçalho e lê apenas as regiões dos seus campos"""
+        if not len(self.layouts):
+            return None, {}
+        cabecalho, = pagina.textos([REGIAO_CABECALHO])
+        layout = self.layouts.identificar(cabecalho)
+        if layout is None:
+            return None, {}
+
+        campos = {'distribuidora': layout.distribuidora}
+        textos = pagina.textos([regiao.retangulo for regiao in layout.regioes])
+        for regiao, texto in zip(layout.regioes, textos):
+            for campo, valor in regiao.extrair(normalizar(texto)).items():
+                campos.setdefault(campo, valor)
+        return layout, campos
+
+    def identificar_pagina(self, pagina) -> Dict[str, Optional[str]]:
+        """
+        Número da instalação e mês de referência impressos em uma página PDF
+        Páginas digitalizadas só são identificadas por um layout conhecido (OCR apenas das regiões)
+        """
+        texto = pagina.get_text()
+        if len(texto.strip()) >= MIN_CARACTERES_CAMADA_TEXTO or pytesseract is None or not len(self.layouts):
+            texto = self._normalizar_texto(texto)
+            return {campo: self._extrair_campo(texto, campo, normalizado=True) for campo in CAMPOS_IDENTIFICACAO}
+
+        _, campos = self._campos_layout(_PaginaPdf(self, pagina))
+        return {campo: campos.get(campo) for campo in CAMPOS_IDENTIFICACAO}
+
+    def _completar_campos(self, campos: Dict[str, Optional[str]], texto: str) -> Dict[str, Optional[str]]:
+        """Preenche com os padrões genéricos os campos que o layout não encontrou"""
+        genericos = self.extrair_campos(texto)
+        for campo in self.padroes:
+            if campos.get(campo) is None:
+                campos[campo] = genericos.get(campo)
+        return campos
+
+    def _campos_documento(self, documento) -> Optional[Dict[str, Optional[str]]]:
+        campos: Dict[str, Optional[str]] = {}
+        if len(documento) and len(self.layouts):
+            _, campos = self._campos_layout(_PaginaPdf(self, documento[0]))
+
+        faltantes = set(self.padroes) - set(campos)
+        if not faltantes:
+            return campos
+        texto = self._extrair_texto_documento(documento, faltantes)
+        if not texto and not campos:
+            return None
+        return self._completar_campos(campos, texto)
+
+    def _campos_imagem(self, imagem) -> Optional[Dict[str, Optional[str]]]:
+        pagina = _PaginaImagem(self, imagem)
+        _, campos = self._campos_layout(pagina)
+
+        if not set(self.padroes) - set(campos):
+            return campos
+        texto, = pagina.textos([PAGINA_INTEIRA])
+        if not texto and not campos:
+            return None
+        return self._completar_campos(campos, texto)
+
+    def _extrair_texto_documento(self, documento, campos_faltantes: Optional[Iterable[str]] = None) -> str:
+        """Texto das páginas de um documento PyMuPDF já aberto, até encontrar os campos faltantes"""
+        partes: Dict[int, str] = {}
+        pendentes = {}
+        campos_faltantes = set(self.padroes if campos_faltantes is None else campos_faltantes)
+
+        def registrar(indice: int, texto: str):
+            partes[indice] = texto
+            if campos_faltantes:
+                campos = self.extrair_campos(texto)
+                campos_faltantes.difference_update(c for c, v in campos.items() if v is not None)
+
+        def coletar_concluidos(bloquear: bool = False):
+            for indice, futuro in list(pendentes.items()):
+                if bloquear or futuro.done():
+                    registrar(indice, futuro.result())
+                    del pendentes[indice]
+
+        with ThreadPoolExecutor(max_workers=OCR_MAX_THREADS) as executor:
+            for indice, pagina in enumerate(documento):
+                if not campos_faltantes:
+                    break
+
+                texto = pagina.get_text()
+                if len(texto.strip()) >= MIN_CARACTERES_CAMADA_TEXTO or pytesseract is None:
+                    registrar(indice, texto)
+                else:
+                    chave_imagem, chave_texto = self._chaves_ocr(pagina)
+                    texto_ocr = self.cache_ocr.obter_texto(chave_texto) if chave_texto else None
+                    if texto_ocr is not None:
+                        # Página já reconhecida: nem renderização nem OCR
+                        registrar(indice, texto_ocr)
+                    else:
+                        # A renderização usa o PyMuPDF (não thread-safe) na thread atual;
+                        # o OCR roda no Tesseract, que libera o GIL
+                        pendentes[indice] = executor.submit(
+                            self._ocr_guardado, self._imagem_pagina(pagina, None, chave_imagem), chave_texto
+                        )
+
+                        # Limita as páginas renderizadas em memória
+                        if len(pendentes) >= OCR_MAX_THREADS * 2:
+                            next(iter(pendentes.values())).result()
+
+                coletar_concluidos()
+
+            if not campos_faltantes:
+                # Campos completos: páginas que ainda aguardam OCR são descartadas
+                for indice, futuro in list(pendentes.items()):
+                    if futuro.cancel():
+                        del pendentes[indice]
+            coletar_concluidos(bloquear=True)
+
+        return '\n'.join(partes[indice] for indice in sorted(partes))
+
+    def _chaves_ocr(self, pagina, recorte: Optional[Any] = None,
+                    impressao: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """Chaves da renderização e do texto da página (ou recorte) no cache do OCR; None se desativado"""
+        if not self.cache_ocr.habilitado:
+            return None, None
+        impressao = impressao or impressao_pagina(pagina)
+        area = tuple(round(valor, 2) for valor in recorte) if recorte is not None else None
+        chave_imagem = chave(impressao, area, OCR_DPI)
+        return chave_imagem, chave(chave_imagem, OCR_IDIOMA, versao_tesseract())
+
+    def _imagem_pagina(self, pagina, recorte: Optional[Any] = None, chave_imagem: Optional[str] = None) -> Any:
+        """Página (ou recorte) renderizada, do cache quando já foi renderizada antes"""
+        imagem = self.cache_ocr.obter_imagem(chave_imagem) if chave_imagem else None
+        if imagem is None:
+            imagem = self._renderizar_pagina(pagina, recorte)
+            if chave_imagem:
+                self.cache_ocr.gravar_imagem(chave_imagem, imagem)
+        return imagem
+
+    def _ocr_guardado(self, imagem, chave_texto: Optional[str]) -> str:
+        """OCR da imagem, com o texto guardado no cache"""
+        texto = self._ocr_imagem(imagem)
+        if chave_texto:
+            self.cache_ocr.gravar_texto(chave_texto, texto)
+        return texto
+
+    def _ocr_com_cache(self, chaves_texto: List[Optional[str]],
+                       imagens_faltantes: Callable[[List[int]], List[Any]]) -> List[str]:
+        """Textos do cache; só os faltantes têm a imagem obtida e o OCR executado (em paralelo)"""
+        textos = [self.cache_ocr.obter_texto(chave_texto) if chave_texto else None for chave_texto in chaves_texto]
+        faltantes = [indice for indice, texto in enumerate(textos) if texto is None]
+        if faltantes:
+            for indice, texto in zip(faltantes, self._ocr_imagens(imagens_faltantes(faltantes))):
+                textos[indice] = texto
+                if chaves_texto[indice]:
+                    self.cache_ocr.gravar_texto(chaves_texto[indice], texto)
+        return textos
+
+    def _ocr_recortes_pagina(self, pagina, recortes: List[Any]) -> List[str]:
+        """OCR de recortes de uma página PDF, renderizados nesta thread (PyMuPDF não é thread-safe)"""
+        impressao = impressao_pagina(pagina) if self.cache_ocr.habilitado else None
+        chaves = [self._chaves_ocr(pagina, recorte, impressao) for recorte in recortes]
+        return self._ocr_com_cache([chave_texto for _, chave_texto in chaves], lambda faltantes: [
+            self._imagem_pagina(pagina, recortes[indice], chaves[indice][0]) for indice in faltantes
+        ])
+
+    def _renderizar_pagina(self, pagina, recorte: Optional[Any] = None) -> Any:
+        """Renderiza a página (ou só o recorte) em tons de cinza para o OCR"""
+        pixmap = pagina.get_pixmap(dpi=OCR_DPI, colorspace=fitz.csGRAY, clip=recorte)
+        return Image.frombytes('L', (pixmap.width, pixmap.height), pixmap.samples)
+
+    def _ocr_imagem(self, imagem) -> str:
+        """Executa o OCR sobre uma imagem"""
+        if imagem.mode != 'L':
+            imagem = imagem.convert('L')
+        return pytesseract.image_to_string(imagem, lang=OCR_IDIOMA)
+
+    def _ocr_imagens(self, imagens: List[Any]) -> List[str]:
+        """OCR de vários recortes em paralelo (o Tesseract libera o GIL)"""
+        if len(imagens) == 1:
+            return [self._ocr_imagem(imagens[0])]
+        with ThreadPoolExecutor(max_workers=min(OCR_MAX_THREADS, len(imagens))) as executor:
+            return list(executor.map(self._ocr_imagem, imagens))
+
+    def compilar_padroes(self):
+        """
+        Compila os padrões uma única vez
+        Deve ser chamado novamente se self.padroes for alterado
+        """
+        self._padroes_compilados = {
+            campo: [re.compile(padrao, re.IGNORECASE) for padrao in padroes]
+            for campo, padroes in self.padroes.items()
+        }
+
+    def _normalizar_texto(self, texto: str) -> str:
+        """Normalização aplicada uma vez por documento antes das buscas"""
+        return texto.lower().replace('\n', ' ')
+
+    def _extrair_campo(self, texto: str, campo: str, normalizado: bool = False) -> Optional[str]:
         """Extrai um campo específico do texto usando regex"""
-        if campo not in self.padroes:
+        if campo not in self._padroes_compilados:
             return None
             
-        texto_limpo = texto.lower().replace('\n', ' ')
+        texto_limpo = texto if normalizado else self._normalizar_texto(texto)
         
-        for padrao in self.padroes[campo]:
-            match = re.search(padrao, texto_limpo, re.IGNORECASE)
+        for padrao in self._padroes_compilados[campo]:
+            match = padrao.search(texto_limpo)
             if match:
                 return match.group(1)
                 
         return None
 
+    def extrair_campos(self, texto: str) -> Dict[str, Optional[str]]:
+        """
+        Extrai todos os campos normalizando o texto uma única vez
+        Os padrões de cada campo são buscados em ordem de prioridade, como em _extrair_campo
+        (uma alternação única com finditer não serve: as ocorrências não se sobrepõem e um
+        padrão de menor prioridade consumiria o trecho que um de maior prioridade precisava)
+        """
+        texto_limpo = self._normalizar_texto(texto)
+        return {
+            campo: self._extrair_campo(texto_limpo, campo, normalizado=True)
+            for campo in self._padroes_compilados
+        }
+
     def _converter_valor_monetario(self, valor_str: str) -> float:
         """Converte string de valor monetário para float"""
         if not valor_str:
             return 0.0
             
         # Remove caracteres não numéricos exceto vírgula e ponto
-        valor_limpo = re.sub(r'[^\d,.]', '', valor_str)
+        valor_limpo = _NAO_MONETARIO.sub('', valor_str)
         
         # Converte vírgula para ponto (padrão brasileiro)
         valor_limpo = valor_limpo.replace(',', '.')
@@ -153,7 +576,7 @@ class ExtratorDados:
             return 0.0
             
         # Remove caracteres não numéricos exceto vírgula
-        consumo_limpo = re.sub(r'[^\d,]', '', consumo_str)
+        consumo_limpo = _NAO_NUMERICO.sub('', consumo_str)
         
         # Converte vírgula para ponto
         consumo_limpo = consumo_limpo.replace(',', '.')
@@ -0,0 +1,402 @@
+"""
+Módulo da fila assíncrona de auditorias
+Persiste os jobs em SQLite para sobreviver a reinicializações do processo,
+sem depender de um broker externo
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Optional
+
+from src.processamento import processar_conta
+
+# Estados possíveis de um job
+PENDENTE = 'pendente'
+PROCESSANDO = 'processando'
+CONCLUIDO = 'concluido'
+FALHOU = 'falhou'
+ESTADOS_FINAIS = {CONCLUIDO, FALHOU}
+
+# Erro dos jobs interrompidos (processo encerrado ou lease expirado) sem tentativas restantes
+ERRO_INTERROMPIDO = 'Processamento interrompido e tentativas esgotadas'
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    arquivo TEXT NOT NULL,
+    status TEXT NOT NULL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    disponivel_em REAL NOT NULL,
+    lease_ate REAL,
+    dono TEXT,
+    resultado TEXT,
+    erro TEXT,
+    criado_em TEXT NOT NULL,
+    atualizado_em TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_disponivel ON jobs (status, disponivel_em);
+CREATE TABLE IF NOT EXISTS eventos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    mensagem TEXT,
+    criado_em TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_eventos_job ON eventos (job_id, id);
+"""
+
+
+class FilaAuditoria:
+    """
+    Fila de jobs de auditoria com concorrência limitada e novas tentativas
+    O lease do job é renovado enquanto ele é processado; o resultado só é registrado
+    e gravado se o trabalhador ainda for o dono da tentativa
+    """
+
+    def __init__(self, caminho_db: Optional[str] = None, max_concorrencia: int = 2,
+                 max_tentativas: int = 3, tempo_limite: float = 600.0,
+                 processador: Callable[[str], Dict[str, Any]] = processar_conta,
+                 registrador: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        self.caminho_db = caminho_db
+        self.max_concorrencia = max_concorrencia
+        self.max_tentativas = max_tentativas
+        self.tempo_limite = tempo_limite
+        self.processador = processador
+        self.registrador = registrador
+        self.app = None
+        self.dono = f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()
+        self._novo_job = threading.Event()
+        self._parar = threading.Event()
+        self._trabalhadores: List[threading.Thread] = []
+
+    def init_app(self, app, processador: Optional[Callable[[str], Dict[str, Any]]] = None,
+                 registrador: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        """
+        Configura a fila a partir da aplicação Flask e inicia os trabalhadores
+        O registrador persiste o resultado e só é chamado enquanto o job pertence a este trabalhador
+        """
+        self.app = app
+        self.caminho_db = app.config.get('FILA_DATABASE_PATH', self.caminho_db)
+        self.max_concorrencia = app.config.get('FILA_MAX_CONCORRENCIA', self.max_concorrencia)
+        self.max_tentativas = app.config.get('FILA_MAX_TENTATIVAS', self.max_tentativas)
+        self.tempo_limite = app.config.get('FILA_TEMPO_LIMITE', self.tempo_limite)
+        if processador is not None:
+            self.processador = processador
+        if registrador is not None:
+            self.registrador = registrador
+        # Com FILA_INICIAR desligado (servidor com pré-carga) os trabalhadores são
+        # iniciados em cada processo depois do fork (src.servidor.apos_fork)
+        if app.config.get('FILA_INICIAR', True):
+            self.iniciar()
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Retorna a conexão SQLite da thread atual"""
+        conexao = getattr(self._local, 'conexao', None)
+        # Conexões herdadas pelo fork não podem ser reutilizadas no processo filho
+        if conexao is None or self._local.pid != os.getpid():
+            conexao = sqlite3.connect(self.caminho_db, timeout=30, isolation_level=None)
+            conexao.row_factory = sqlite3.Row
+            conexao.execute('PRAGMA journal_mode=WAL')
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    def iniciar(self):
+        """Cria as tabelas, recupera jobs interrompidos e inicia os trabalhadores"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.caminho_db)), exist_ok=True)
+        self._conexao().executescript(ESQUEMA)
+        self._recuperar_jobs_interrompidos()
+
+        # Com o reloader do Flask a inicialização pode acontecer mais de uma vez
+        self.dono = f"{socket.gethostname()}:{os.getpid()}"
+        self._parar.clear()
+        self._trabalhadores = [t for t in self._trabalhadores if t.is_alive()]
+        for indice in range(len(self._trabalhadores), self.max_concorrencia):
+            trabalhador = threading.Thread(
+                target=self._executar, name=f'fila-auditoria-{indice}', daemon=True
+            )
+            trabalhador.start()
+            self._trabalhadores.append(trabalhador)
+
+    def encerrar(self, timeout: Optional[float] = None):
+        """Sinaliza aos trabalhadores que parem após o job atual"""
+        self._parar.set()
+        self._novo_job.set()
+        for trabalhador in self._trabalhadores:
+            trabalhador.join(timeout)
+        self._trabalhadores = []
+
+    def _recuperar_jobs_interrompidos(self):
+        """Devolve à fila os jobs de processos deste host que não estão mais vivos"""
+        host = socket.gethostname()
+        conexao = self._conexao()
+        linhas = conexao.execute(
+            'SELECT id, dono, tentativas FROM jobs WHERE status = ?', (PROCESSANDO,)
+        ).fetchall()
+
+        for linha in linhas:
+            dono_host, _, dono_pid = (linha['dono'] or '').rpartition(':')
+            if dono_host != host or not dono_pid.isdigit() or _processo_ativo(int(dono_pid)):
+                # Jobs de outros hosts são recuperados quando o lease expira
+                continue
+            if linha['tentativas'] >= self.max_tentativas:
+                # Um job que derruba o processo não é retomado indefinidamente
+                conexao.execute(
+                    'UPDATE jobs SET status = ?, erro = ?, lease_ate = NULL, atualizado_em = ? '
+                    'WHERE id = ? AND status = ?',
+                    (FALHOU, ERRO_INTERROMPIDO, _agora_iso(), linha['id'], PROCESSANDO)
+                )
+                self._registrar_evento(linha['id'], 'falhou', ERRO_INTERROMPIDO)
+                continue
+            conexao.execute(
+                'UPDATE jobs SET status = ?, lease_ate = NULL, dono = NULL, atualizado_em = ? '
+                'WHERE id = ? AND status = ?',
+                (PENDENTE, _agora_iso(), linha['id'], PROCESSANDO)
+            )
+            self._registrar_evento(linha['id'], 'recuperado',
+                                   'Job retomado após reinicialização do processo')
+
+    def enfileirar(self, filepath: str) -> str:
+        """Adiciona um arquivo à fila e retorna o identificador do job"""
+        job_id = uuid.uuid4().hex
+        agora = _agora_iso()
+        self._conexao().execute(
+            'INSERT INTO jobs (id, arquivo, status, disponivel_em, criado_em, atualizado_em) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (job_id, filepath, PENDENTE, time.time(), agora, agora)
+        )
+        self._registrar_evento(job_id, 'enfileirado', os.path.basename(filepath))
+        self._novo_job.set()
+        return job_id
+
+    def obter(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Retorna o estado atual do job"""
+        linha = self._conexao().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if linha is None:
+            return None
+
+        job = {
+            'job_id': linha['id'],
+            'arquivo': os.path.basename(linha['arquivo']),
+            'status': linha['status'],
+            'tentativas': linha['tentativas'],
+            'criado_em': linha['criado_em'],
+            'atualizado_em': linha['atualizado_em']
+        }
+        if linha['erro']:
+            job['erro'] = linha['erro']
+        if linha['resultado']:
+            job['resultado'] = json.loads(linha['resultado'])
+        return job
+
+    def eventos(self, job_id: str, apos_id: int = 0) -> List[Dict[str, Any]]:
+        """Retorna os eventos do job posteriores ao identificador informado"""
+        linhas = self._conexao().execute(
+            'SELECT id, tipo, mensagem, criado_em FROM eventos '
+            'WHERE job_id = ? AND id > ? ORDER BY id',
+            (job_id, apos_id)
+        ).fetchall()
+        return [dict(linha) for linha in linhas]
+
+    def _registrar_evento(self, job_id: str, tipo: str, mensagem: str = ''):
+        self._conexao().execute(
+            'INSERT INTO eventos (job_id, tipo, mensagem, criado_em) VALUES (?, ?, ?, ?)',
+            (job_id, tipo, mensagem, _agora_iso())
+        )
+
+    def _reservar_proximo(self) -> Optional[sqlite3.Row]:
+        """
+        Reserva atomicamente o próximo job disponível (ou com lease expirado)
+        Jobs com lease expirado que já esgotaram as tentativas são marcados como falhos
+        """
+        conexao = self._conexao()
+        agora = time.time()
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            esgotados = conexao.execute(
+                'SELECT id FROM jobs WHERE status = ? AND lease_ate < ? AND tentativas >= ?',
+                (PROCESSANDO, agora, self.max_tentativas)
+            ).fetchall()
+            for esgotado in esgotados:
+                conexao.execute(
+                    'UPDATE jobs SET status = ?, erro = ?, lease_ate = NULL, atualizado_em = ? WHERE id = ?',
+                    (FALHOU, ERRO_INTERROMPIDO, _agora_iso(), esgotado['id'])
+                )
+                self._registrar_evento(esgotado['id'], 'falhou', ERRO_INTERROMPIDO)
+
+            linha = conexao.execute(
+                'SELECT id, arquivo, tentativas FROM jobs '
+                'WHERE (status = ? AND disponivel_em <= ?) OR (status = ? AND lease_ate < ?) '
+                'ORDER BY disponivel_em LIMIT 1',
+                (PENDENTE, agora, PROCESSANDO, agora)
+            ).fetchone()
+            if linha is not None:
+                conexao.execute(
+                    'UPDATE jobs SET status = ?, tentativas = tentativas + 1, lease_ate = ?, '
+                    'dono = ?, atualizado_em = ? WHERE id = ?',
+                    (PROCESSANDO, agora + self.tempo_limite, self.dono, _agora_iso(), linha['id'])
+                )
+            conexao.execute('COMMIT')
+        except Exception:
+            conexao.execute('ROLLBACK')
+            raise
+        return linha
+
+    def _executar(self):
+        """Laço dos trabalhadores: reserva, processa e registra o resultado"""
+        while not self._parar.is_set():
+            try:
+                job = self._reservar_proximo()
+            except sqlite3.OperationalError:
+                job = None
+
+            if job is None:
+                # Aguarda um novo job ou reavalia os agendados para nova tentativa
+                self._novo_job.wait(timeout=1.0)
+                self._novo_job.clear()
+                continue
+
+            try:
+                self._processar_job(job['id'], job['arquivo'], job['tentativas'] + 1)
+            except sqlite3.OperationalError:
+                # Sem gravar a finalização o job volta à fila quando o lease expirar
+                continue
+
+    def _processar_job(self, job_id: str, filepath: str, tentativa: int):
+        self._registrar_evento(job_id, 'iniciado', f'Tentativa {tentativa} de {self.max_tentativas}')
+
+        # Renova o lease enquanto o processador trabalha, para o job não ser reservado de novo
+        concluido = threading.Event()
+        threading.Thread(
+            target=self._renovar_lease, args=(job_id, tentativa, concluido),
+            name=f'fila-auditoria-lease-{job_id[:8]}', daemon=True
+        ).start()
+        try:
+            try:
+                if self.app is not None:
+                    # O processador pode precisar do banco da aplicação
+                    with self.app.app_context():
+                        resultado = self.processador(filepath)
+                else:
+                    resultado = self.processador(filepath)
+                erro = resultado.get('erro') if resultado.get('status') == 'erro' else None
+            except Exception as e:
+                resultado = None
+                erro = f'Erro durante processamento: {str(e)}'
+        finally:
+            concluido.set()
+
+        self._finalizar_job(job_id, tentativa, resultado, erro)
+
+    def _renovar_lease(self, job_id: str, tentativa: int, concluido: threading.Event):
+        """Estende o lease da tentativa a cada terço do tempo limite até o job terminar"""
+        conexao = sqlite3.connect(self.caminho_db, timeout=30, isolation_level=None)
+        try:
+            while not concluido.wait(self.tempo_limite / 3):
+                try:
+                    cursor = conexao.execute(
+                        'UPDATE jobs SET lease_ate = ? '
+                        'WHERE id = ? AND dono = ? AND tentativas = ? AND status = ?',
+                        (time.time() + self.tempo_limite, job_id, self.dono, tentativa, PROCESSANDO)
+                    )
+                except sqlite3.OperationalError:
+                    continue
+                if cursor.rowcount == 0:
+                    # A tentativa foi recuperada por outro trabalhador; o resultado será descartado
+                    return
+        finally:
+            conexao.close()
+
+    def _finalizar_job(self, job_id: str, tentativa: int, resultado: Optional[Dict[str, Any]],
+                       erro: Optional[str]):
+        """
+        Registra o resultado e atualiza o job na mesma transação da fila
+        Se a tentativa não pertence mais a este trabalhador, o resultado é descartado
+        sem chamar o registrador
+        """
+        conexao = self._conexao()
+        posse = (job_id, self.dono, tentativa, PROCESSANDO)
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            atual = conexao.execute(
+                'SELECT 1 FROM jobs WHERE id = ? AND dono = ? AND tentativas = ? AND status = ?', posse
+            ).fetchone()
+            if atual is None:
+                self._registrar_evento(job_id, 'descartado',
+                                       f'Tentativa {tentativa} perdeu o lease; resultado descartado')
+                conexao.execute('COMMIT')
+                return
+
+            if erro is None and self.registrador is not None:
+                try:
+                    if self.app is not None:
+                        with self.app.app_context():
+                            self.registrador(resultado)
+                    else:
+                        self.registrador(resultado)
+                except Exception as e:
+                    erro = f'Erro ao registrar resultado: {str(e)}'
+
+            if erro is None:
+                cursor = conexao.execute(
+                    'UPDATE jobs SET status = ?, resultado = ?, erro = NULL, lease_ate = NULL, '
+                    'atualizado_em = ? WHERE id = ? AND dono = ? AND tentativas = ? AND status = ?',
+                    (CONCLUIDO, json.dumps(resultado, default=str), _agora_iso()) + posse
+                )
+                evento = ('concluido', resultado.get('resumo', {}).get('status_geral', ''))
+            elif tentativa < self.max_tentativas:
+                # Espera exponencial antes da próxima tentativa
+                espera = 2 ** tentativa
+                cursor = conexao.execute(
+                    'UPDATE jobs SET status = ?, erro = ?, disponivel_em = ?, lease_ate = NULL, '
+                    'atualizado_em = ? WHERE id = ? AND dono = ? AND tentativas = ? AND status = ?',
+                    (PENDENTE, erro, time.time() + espera, _agora_iso()) + posse
+                )
+                evento = ('nova_tentativa', f'{erro} (nova tentativa em {espera}s)')
+            else:
+                cursor = conexao.execute(
+                    'UPDATE jobs SET status = ?, erro = ?, resultado = ?, lease_ate = NULL, '
+                    'atualizado_em = ? WHERE id = ? AND dono = ? AND tentativas = ? AND status = ?',
+                    (FALHOU, erro, json.dumps(resultado, default=str) if resultado else None,
+                     _agora_iso()) + posse
+                )
+                evento = ('falhou', erro)
+
+            if cursor.rowcount == 0:
+                conexao.execute('ROLLBACK')
+                self._registrar_evento(job_id, 'descartado',
+                                       f'Tentativa {tentativa} perdeu o lease; resultado descartado')
+                return
+            self._registrar_evento(job_id, *evento)
+            conexao.execute('COMMIT')
+        except Exception:
+            conexao.execute('ROLLBACK')
+            raise
+
+
+def _agora_iso() -> str:
+    return datetime.now().isoformat()
+
+
+def _processo_ativo(pid: int) -> bool:
+    """Verifica se o processo com o PID informado ainda existe"""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Instância compartilhada, configurada em main.py
+fila_auditoria = FilaAuditoria()
@@ -0,0 +1,260 @@
+"""
+Módulo do histórico de consumo por unidade consumidora
+Guarda, para cada numero_instalacao, o consumo dos últimos JANELA_MESES meses e
+as somas (total, quadrados e por mês do ano) usadas pela detecção de anomalias.
+Cada conta auditada atualiza as somas em O(1): meses fora de ordem entram na
+janela se couberem nela, e a reauditoria de um mês substitui o valor anterior
+"""
+
+import json
+import math
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Optional
+
+from src.tarifas import competencia_de
+
+# Meses mantidos por unidade consumidora
+JANELA_MESES = 24
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS historico_consumo (
+    numero_instalacao TEXT PRIMARY KEY,
+    estatisticas TEXT NOT NULL,
+    atualizado_em TEXT NOT NULL
+);
+"""
+
+
+def indice_mes(competencia: str) -> int:
+    """Converte '2025-05' em um número de meses contínuo (ano * 12 + mês - 1)"""
+    ano, mes = competencia.split('-')
+    return int(ano) * 12 + int(mes) - 1
+
+
+def competencia_do_indice(indice: int) -> str:
+    return f"{indice // 12:04d}-{indice % 12 + 1:02d}"
+
+
+class ResumoConsumo:
+    """Estatísticas de uma unidade consumidora sem o mês da conta auditada"""
+
+    __slots__ = ('meses', 'media', 'desvio', 'media_sazonal', 'meses_sazonais')
+
+    def __init__(self, meses: int, media: float, desvio: float,
+                 media_sazonal: Optional[float], meses_sazonais: int):
+        self.meses = meses
+        self.media = media
+        self.desvio = desvio
+        self.media_sazonal = media_sazonal
+        self.meses_sazonais = meses_sazonais
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'meses': self.meses,
+            'media': self.media,
+            'desvio': self.desvio,
+            'media_sazonal': self.media_sazonal,
+            'meses_sazonais': self.meses_sazonais
+        }
+
+
+class EstatisticasInstalacao:
+    """Consumos da janela de uma unidade consumidora e suas somas acumuladas"""
+
+    __slots__ = ('ultimo', 'consumos', 'n', 'soma', 'soma_quadrados', 'sazonal')
+
+    def __init__(self):
+        self.ultimo: Optional[int] = None
+        self.consumos: Dict[int, float] = {}
+        self.n = 0
+        self.soma = 0.0
+        self.soma_quadrados = 0.0
+        # [quantidade, soma] por mês do ano (0 = janeiro)
+        self.sazonal = [[0, 0.0] for _ in range(12)]
+
+    def _adicionar(self, indice: int, consumo: float):
+        self.consumos[indice] = consumo
+        self.n += 1
+        self.soma += consumo
+        self.soma_quadrados += consumo * consumo
+        mes = self.sazonal[indice % 12]
+        mes[0] += 1
+        mes[1] += consumo
+
+    def _remover(self, indice: int):
+        consumo = self.consumos.pop(indice)
+        self.n -= 1
+        mes = self.sazonal[indice % 12]
+        mes[0] -= 1
+        if self.n == 0:
+            # Sem valores na janela: zera as somas para não acumular erro de arredondamento
+            self.soma = self.soma_quadrados = 0.0
+            mes[1] = 0.0
+            return
+        self.soma -= consumo
+        self.soma_quadrados -= consumo * consumo
+        mes[1] = mes[1] - consumo if mes[0] else 0.0
+
+    def registrar(self, indice: int, consumo: float) -> bool:
+        """Inclui ou substitui o consumo do mês; retorna False se o mês já saiu da janela"""
+        if self.ultimo is not None and indice <= self.ultimo - JANELA_MESES:
+            return False
+        if self.ultimo is None or indice > self.ultimo:
+            self.ultimo = indice
+            # No máximo JANELA_MESES valores a descartar
+            for antigo in [antigo for antigo in self.consumos if antigo <= indice - JANELA_MESES]:
+                self._remover(antigo)
+        if indice in self.consumos:
+            self._remover(indice)
+        self._adicionar(indice, consumo)
+        return True
+
+    def resumo(self, indice: Optional[int] = None) -> Optional[ResumoConsumo]:
+        """Estatísticas da janela sem o consumo do mês informado (a própria conta)"""
+        if indice is not None and self.ultimo is not None and indice <= self.ultimo - JANELA_MESES:
+            return None
+        n, soma, soma_quadrados = self.n, self.soma, self.soma_quadrados
+        meses_sazonais, soma_sazonal = self.sazonal[indice % 12] if indice is not None else (0, 0.0)
+        proprio = self.consumos.get(indice) if indice is not None else None
+        if proprio is not None:
+            n -= 1
+            soma -= proprio
+            soma_quadrados -= proprio * proprio
+            meses_sazonais -= 1
+            soma_sazonal -= proprio
+        if n <= 0:
+            return None
+        media = soma / n
+        variancia = max(soma_quadrados / n - media * media, 0.0)
+        return ResumoConsumo(
+            n, media, math.sqrt(variancia),
+            soma_sazonal / meses_sazonais if meses_sazonais > 0 else None, meses_sazonais
+        )
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'ultimo': self.ultimo,
+            'consumos': {str(indice): consumo for indice, consumo in self.consumos.items()},
+            'n': self.n,
+            'soma': self.soma,
+            'soma_quadrados': self.soma_quadrados,
+            'sazonal': self.sazonal
+        })
+
+    @classmethod
+    def from_json(cls, texto: str) -> 'EstatisticasInstalacao':
+        dados = json.loads(texto)
+        estatisticas = cls()
+        estatisticas.ultimo = dados['ultimo']
+        estatisticas.consumos = {int(indice): consumo for indice, consumo in dados['consumos'].items()}
+        estatisticas.n = dados['n']
+        estatisticas.soma = dados['soma']
+        estatisticas.soma_quadrados = dados['soma_quadrados']
+        estatisticas.sazonal = dados['sazonal']
+        return estatisticas
+
+
+class HistoricoConsumo:
+    """Histórico de consumo por unidade consumidora persistido em SQLite"""
+
+    def __init__(self, caminho_db: Optional[str] = None):
+        # Sem caminho configurado o histórico fica desabilitado (consultas retornam None)
+        self.caminho_db = caminho_db
+        self._local = threading.local()
+
+    def init_app(self, app):
+        """Configura o banco do histórico a partir da aplicação Flask"""
+        self.caminho_db = app.config.get('HISTORICO_CONSUMO_DATABASE_PATH', self.caminho_db)
+        if self.caminho_db:
+            os.makedirs(os.path.dirname(os.path.abspath(self.caminho_db)), exist_ok=True)
+            self._conexao().executescript(ESQUEMA)
+
+    @property
+    def habilitado(self) -> bool:
+        return bool(self.caminho_db)
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Retorna a conexão SQLite da thread atual (reaberta em processos filhos do lote)"""
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            conexao = sqlite3.connect(self.caminho_db, timeout=30, isolation_level=None)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.executescript(ESQUEMA)
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    def estatisticas(self, numero_instalacao: str) -> Optional[EstatisticasInstalacao]:
+        linha = self._conexao().execute(
+            'SELECT estatisticas FROM historico_consumo WHERE numero_instalacao = ?',
+            (numero_instalacao,)
+        ).fetchone()
+        return EstatisticasInstalacao.from_json(linha[0]) if linha else None
+
+    def consultar(self, numero_instalacao: Any, mes_referencia: Any) -> Optional[ResumoConsumo]:
+        """Resumo do histórico da unidade para auditar a conta do mês informado"""
+        if not self.habilitado or not numero_instalacao:
+            return None
+        competencia = competencia_de(mes_referencia)
+        if competencia is None:
+            return None
+        estatisticas = self.estatisticas(str(numero_instalacao))
+        return estatisticas.resumo(indice_mes(competencia)) if estatisticas else None
+
+    def registrar(self, numero_instalacao: Any, mes_referencia: Any, consumo_kwh: Any) -> bool:
+        """Atualiza o histórico com o consumo de uma conta auditada"""
+        if not self.habilitado or not numero_instalacao:
+            return False
+        competencia = competencia_de(mes_referencia)
+        try:
+            consumo = float(consumo_kwh)
+        except (TypeError, ValueError):
+            return False
+        if competencia is None or not math.isfinite(consumo):
+            return False
+
+        numero_instalacao = str(numero_instalacao)
+        conexao = self._conexao()
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            estatisticas = self.estatisticas(numero_instalacao) or EstatisticasInstalacao()
+            registrado = estatisticas.registrar(indice_mes(competencia), consumo)
+            if registrado:
+                conexao.execute(
+                    'INSERT OR REPLACE INTO historico_consumo (numero_instalacao, estatisticas, atualizado_em) '
+                    'VALUES (?, ?, ?)',
+                    (numero_instalacao, estatisticas.to_json(), datetime.now().isoformat())
+                )
+            conexao.execute('COMMIT')
+        except Exception:
+            conexao.execute('ROLLBACK')
+            raise
+        return registrado
+
+    def registrar_resultados(self, resultados: Iterable[Dict[str, Any]]) -> int:
+        """Atualiza o histórico com os resultados processados com sucesso"""
+        registrados = 0
+        for resultado in resultados:
+            if resultado.get('status') == 'erro':
+                continue
+            dados = resultado.get('dados_extraidos') or {}
+            registrados += self.registrar(
+                dados.get('numero_instalacao'), dados.get('mes_referencia'), dados.get('consumo_kwh')
+            )
+        return registrados
+
+    def consumos(self, numero_instalacao: str) -> List[Dict[str, Any]]:
+        """Consumos da janela em ordem cronológica"""
+        estatisticas = self.estatisticas(numero_instalacao) if self.habilitado else None
+        if estatisticas is None:
+            return []
+        return [
+            {'competencia': competencia_do_indice(indice), 'consumo_kwh': estatisticas.consumos[indice]}
+            for indice in sorted(estatisticas.consumos)
+        ]
+
+
+historico_consumo = HistoricoConsumo()
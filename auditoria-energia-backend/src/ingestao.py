@@ -0,0 +1,195 @@
+"""
+Módulo de ingestão de arquivos com várias contas
+ZIPs com centenas de contas e PDFs que concatenam contas de instalações ou meses
+diferentes são percorridos sob demanda: os membros do ZIP e as páginas do PDF são
+lidos um de cada vez e cada conta é entregue assim que o seu fim é encontrado
+(mudança do número da instalação ou do mês de referência entre páginas). A memória
+usada não depende do tamanho do arquivo, apenas da maior conta
+"""
+
+import itertools
+import os
+import shutil
+import zipfile
+import zlib
+from typing import Dict, Iterator, Optional, Tuple
+
+from werkzeug.utils import secure_filename
+
+from src.extrator_dados import ExtratorDados, CAMPOS_IDENTIFICACAO, fitz
+from src.processamento import extrator_dados
+
+EXTENSOES = {'pdf', 'png', 'jpg', 'jpeg'}
+
+# Membros do ZIP maiores que isso são copiados para um arquivo temporário em vez de lidos para a memória
+TAMANHO_MAXIMO_MEMORIA = 16 * 1024 * 1024
+
+# Falhas de leitura de um membro corrompido (CRC, dados comprimidos inválidos ou disco)
+ERROS_LEITURA_ZIP = (zipfile.BadZipFile, zlib.error, OSError, EOFError)
+
+
+class ContaIngerida:
+    """
+    Uma conta encontrada na ingestão: nome para o pipeline, origem legível e conteúdo (ou caminho)
+    Um arquivo que não pôde ser lido vira uma conta com erro, registrada sem passar pelo pipeline
+    """
+
+    __slots__ = ('nome', 'origem', 'conteudo', 'caminho', 'paginas', 'erro')
+
+    def __init__(self, nome: str, origem: str, conteudo: Optional[bytes] = None,
+                 caminho: Optional[str] = None, paginas: Optional[str] = None, erro: Optional[str] = None):
+        self.nome = nome
+        self.origem = origem
+        self.conteudo = conteudo
+        self.caminho = caminho
+        self.paginas = paginas
+        self.erro = erro
+
+    def __repr__(self):
+        return f'<ContaIngerida {self.origem}>'
+
+
+def _extensao(nome: str) -> str:
+    return nome.rsplit('.', 1)[-1].lower() if '.' in nome else ''
+
+
+def _nova_conta(atual: Dict[str, str], identificacao: Dict[str, Optional[str]]) -> bool:
+    """A página traz uma identificação diferente da conta em andamento"""
+    return any(
+        valor is not None and atual.get(campo) not in (None, valor)
+        for campo, valor in identificacao.items()
+    )
+
+
+def limites_contas(documento, extrator: Optional[ExtratorDados] = None) -> Iterator[Tuple[int, int]]:
+    """
+    Intervalos de páginas [início, fim) de cada conta do documento, entregues à medida
+    que as páginas são lidas; páginas sem identificação pertencem à conta em andamento
+    """
+    extrator = extrator or extrator_dados
+    inicio = 0
+    atual: Dict[str, str] = {}
+    for indice in range(len(documento)):
+        identificacao = extrator.identificar_pagina(documento[indice])
+        if indice > inicio and _nova_conta(atual, identificacao):
+            yield inicio, indice
+            inicio, atual = indice, {}
+        for campo in CAMPOS_IDENTIFICACAO:
+            if identificacao.get(campo) is not None:
+                atual.setdefault(campo, identificacao[campo])
+    if len(documento):
+        yield inicio, len(documento)
+
+
+def _recortar(documento, inicio: int, fim: int) -> bytes:
+    """PDF só com as páginas [início, fim) do documento"""
+    with fitz.open() as novo:
+        novo.insert_pdf(documento, from_page=inicio, to_page=fim - 1)
+        return novo.tobytes(garbage=1)
+
+
+def contas_pdf(nome: str, origem: str, caminho: Optional[str] = None, conteudo: Optional[bytes] = None,
+               extrator: Optional[ExtratorDados] = None) -> Iterator[ContaIngerida]:
+    """
+    Contas de um PDF; um PDF com uma única conta segue inteiro, sem ser regravado
+    Cada conta de um PDF concatenado vira um PDF próprio com as suas páginas
+    """
+    inteiro = ContaIngerida(nome, origem, conteudo, caminho)
+    if fitz is None:
+        yield inteiro
+        return
+
+    try:
+        documento = fitz.open(caminho) if conteudo is None else fitz.open(stream=conteudo, filetype='pdf')
+    except Exception:
+        # PDF inválido: segue inteiro e o pipeline trata a conta
+        yield inteiro
+        return
+
+    with documento:
+        intervalos = limites_contas(documento, extrator)
+        primeiros = list(itertools.islice(intervalos, 2))
+        if len(primeiros) < 2:
+            yield inteiro
+            return
+
+        base = nome.rsplit('.', 1)[0]
+        for inicio, fim in itertools.chain(primeiros, intervalos):
+            paginas = f'{inicio + 1}-{fim}'
+            yield ContaIngerida(
+                f'{base}_p{paginas}.pdf', f'{origem}#p{paginas}', _recortar(documento, inicio, fim),
+                paginas=paginas
+            )
+
+
+def contas_arquivo(nome: str, caminho: Optional[str] = None, conteudo: Optional[bytes] = None,
+                   origem: Optional[str] = None,
+                   extrator: Optional[ExtratorDados] = None) -> Iterator[ContaIngerida]:
+    """Contas de um arquivo de conta (PDF, possivelmente concatenado, ou imagem)"""
+    origem = origem or nome
+    extensao = _extensao(nome)
+    if extensao == 'pdf':
+        yield from contas_pdf(nome, origem, caminho, conteudo, extrator)
+    elif extensao in EXTENSOES:
+        yield ContaIngerida(nome, origem, conteudo, caminho)
+
+
+def contas_zip(caminho: str, nome: Optional[str] = None, pasta: Optional[str] = None,
+               extrator: Optional[ExtratorDados] = None) -> Iterator[ContaIngerida]:
+    """
+    Contas dos membros do ZIP, lidos um de cada vez
+    Membros grandes são copiados para a pasta (padrão: a do ZIP); a cópia é removida depois
+    de dividida, ou fica para quem consumir a conta quando ela é entregue pelo caminho
+    Membros corrompidos viram contas com erro e a leitura segue para os próximos
+    """
+    nome = nome or os.path.basename(caminho)
+    pasta = pasta or os.path.dirname(os.path.abspath(caminho))
+
+    try:
+        arquivo_zip = zipfile.ZipFile(caminho)
+    except ERROS_LEITURA_ZIP as e:
+        yield ContaIngerida(nome, nome, erro=f'Erro ao ler arquivo ZIP: {str(e)}')
+        return
+
+    with arquivo_zip:
+        for indice, membro in enumerate(arquivo_zip.infolist()):
+            extensao = _extensao(membro.filename)
+            if membro.is_dir() or extensao not in EXTENSOES:
+                continue
+            nome_membro = secure_filename(os.path.basename(membro.filename)) or f'conta.{extensao}'
+            origem = f'{nome}/{membro.filename}'
+
+            if membro.file_size <= TAMANHO_MAXIMO_MEMORIA:
+                try:
+                    conteudo = arquivo_zip.read(membro)
+                except ERROS_LEITURA_ZIP as e:
+                    yield ContaIngerida(nome_membro, origem, erro=f'Erro ao ler arquivo: {str(e)}')
+                    continue
+                yield from contas_arquivo(nome_membro, conteudo=conteudo, origem=origem, extrator=extrator)
+                continue
+
+            temporario = os.path.join(pasta, f'{indice:05d}_{nome_membro}')
+            try:
+                with arquivo_zip.open(membro) as entrada, open(temporario, 'wb') as saida:
+                    shutil.copyfileobj(entrada, saida, 1024 * 1024)
+            except ERROS_LEITURA_ZIP as e:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+                yield ContaIngerida(nome_membro, origem, erro=f'Erro ao ler arquivo: {str(e)}')
+                continue
+            manter = False
+            for conta in contas_arquivo(nome_membro, caminho=temporario, origem=origem, extrator=extrator):
+                manter = manter or conta.caminho == temporario
+                yield conta
+            if not manter:
+                os.remove(temporario)
+
+
+def iterar_contas(caminho: str, nome: Optional[str] = None, pasta: Optional[str] = None,
+                  extrator: Optional[ExtratorDados] = None) -> Iterator[ContaIngerida]:
+    """Contas de um arquivo enviado: ZIP, PDF (possivelmente concatenado) ou imagem"""
+    nome = nome or os.path.basename(caminho)
+    if _extensao(nome) == 'zip':
+        yield from contas_zip(caminho, nome, pasta, extrator)
+    else:
+        yield from contas_arquivo(nome, caminho=caminho, extrator=extrator)
@@ -0,0 +1,172 @@
+"""
+Módulo dos layouts de conta por distribuidora
+Cada distribuidora imprime a conta sempre do mesmo jeito: o layout reconhece a
+primeira página por âncoras no texto do cabeçalho e indica as regiões da página
+(frações da largura e da altura) onde estão os campos, com padrões aplicados só
+ao texto de cada região. Campos não encontrados voltam aos padrões genéricos do extrator
+
+Layouts adicionais vêm de um arquivo JSON (LAYOUTS_ARQUIVO):
+
+    [{"nome": "energisa_ro", "distribuidora": "ENERGISA RONDÔNIA", "ancoras": ["energisa", "rondonia"],
+      "regioes": [{"retangulo": [0.05, 0.09, 0.6, 0.12],
+                   "campos": {"numero_instalacao": ["instalacao[:\\\\s]*(\\\\d+)"]}}]}]
+"""
+
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+# Faixa do topo da primeira página lida para identificar o layout (x0, y0, x1, y1)
+REGIAO_CABECALHO = (0.0, 0.0, 1.0, 0.2)
+
+_ESPACOS = re.compile(r'\s+')
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sem acentos e com espaços simples (o OCR costuma perder acentos)"""
+    decomposto = unicodedata.normalize('NFKD', texto.lower())
+    return _ESPACOS.sub(' ', ''.join(c for c in decomposto if not unicodedata.combining(c))).strip()
+
+
+class RegiaoLayout:
+    """Retângulo da página (frações) e padrões dos campos impressos nele"""
+
+    __slots__ = ('retangulo', 'campos')
+
+    def __init__(self, retangulo: Tuple[float, float, float, float], campos: Dict[str, Iterable[str]]):
+        x0, y0, x1, y1 = (float(valor) for valor in retangulo)
+        if not (0.0 <= x0 < x1 <= 1.0 and 0.0 <= y0 < y1 <= 1.0):
+            raise ValueError(f"Retângulo inválido: {retangulo}")
+        self.retangulo = (x0, y0, x1, y1)
+        self.campos = {
+            campo: tuple(re.compile(padrao) for padrao in padroes) for campo, padroes in campos.items()
+        }
+
+    def extrair(self, texto: str) -> Dict[str, str]:
+        """Campos encontrados no texto normalizado da região"""
+        encontrados = {}
+        for campo, padroes in self.campos.items():
+            for padrao in padroes:
+                match = padrao.search(texto)
+                if match:
+                    encontrados[campo] = match.group(1)
+                    break
+        return encontrados
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'retangulo': list(self.retangulo),
+            'campos': {campo: [padrao.pattern for padrao in padroes] for campo, padroes in self.campos.items()}
+        }
+
+
+class LayoutDistribuidora:
+    """Layout de conta de uma distribuidora"""
+
+    __slots__ = ('nome', 'distribuidora', 'ancoras', 'regioes')
+
+    def __init__(self, nome: str, distribuidora: str, ancoras: Iterable[str], regioes: Iterable[RegiaoLayout]):
+        self.nome = nome
+        self.distribuidora = distribuidora
+        self.ancoras = tuple(normalizar(ancora) for ancora in ancoras)
+        self.regioes = tuple(regioes)
+        if not self.ancoras:
+            raise ValueError(f"Layout {nome} sem âncoras")
+
+    @property
+    def campos(self) -> List[str]:
+        return [campo for regiao in self.regioes for campo in regiao.campos]
+
+    def confere(self, cabecalho: str) -> bool:
+        """Todas as âncoras presentes no cabeçalho normalizado"""
+        return all(ancora in cabecalho for ancora in self.ancoras)
+
+    @classmethod
+    def from_dict(cls, dados: Dict[str, Any]) -> 'LayoutDistribuidora':
+        return cls(
+            dados['nome'], dados['distribuidora'], dados['ancoras'],
+            [RegiaoLayout(regiao['retangulo'], regiao['campos']) for regiao in dados['regioes']]
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'nome': self.nome,
+            'distribuidora': self.distribuidora,
+            'ancoras': list(self.ancoras),
+            'regioes': [regiao.to_dict() for regiao in self.regioes]
+        }
+
+    def __repr__(self):
+        return f'<LayoutDistribuidora {self.nome}>'
+
+
+class RegistroLayouts:
+    """Layouts conhecidos, consultados na ordem de registro"""
+
+    def __init__(self):
+        self._layouts: Dict[str, LayoutDistribuidora] = {}
+        self.versao = self._calcular_versao()
+
+    def _calcular_versao(self) -> str:
+        definicao = json.dumps([layout.to_dict() for layout in self._layouts.values()], sort_keys=True)
+        return hashlib.sha256(definicao.encode('utf-8')).hexdigest()[:8]
+
+    def registrar(self, layout: LayoutDistribuidora):
+        """Registra o layout (substitui o de mesmo nome)"""
+        self._layouts[layout.nome] = layout
+        self.versao = self._calcular_versao()
+
+    def layouts(self) -> List[LayoutDistribuidora]:
+        return list(self._layouts.values())
+
+    def __len__(self):
+        return len(self._layouts)
+
+    def identificar(self, cabecalho: str) -> Optional[LayoutDistribuidora]:
+        """Layout cujas âncoras aparecem no texto do cabeçalho, ou None"""
+        cabecalho = normalizar(cabecalho)
+        for layout in self._layouts.values():
+            if layout.confere(cabecalho):
+                return layout
+        return None
+
+    def carregar(self, definicoes: Iterable[Dict[str, Any]]):
+        for definicao in definicoes:
+            self.registrar(LayoutDistribuidora.from_dict(definicao))
+
+    def carregar_arquivo(self, caminho: str):
+        """Registra os layouts de um arquivo JSON (lista de definições)"""
+        with open(caminho, encoding='utf-8') as arquivo:
+            self.carregar(json.load(arquivo))
+
+
+# Padrões aplicados ao texto normalizado de cada região
+_NUMERO = r'(\d+(?:,\d+)?)'
+_MOEDA = r'r\$\s*(\d+(?:,\d+)?)'
+
+# Conta da ENERGISA RONDÔNIA: identificação, classificação/consumo e valores em
+# faixas da coluna esquerda, logo abaixo do nome da distribuidora
+ENERGISA_RONDONIA = LayoutDistribuidora(
+    'energisa_rondonia', 'ENERGISA RONDÔNIA', ('energisa', 'rondonia'),
+    (
+        RegiaoLayout((0.05, 0.089, 0.6, 0.121), {
+            'numero_instalacao': (r'instalacao[:\s]*(\d+)',),
+            'mes_referencia': (r'referencia[:\s]*(\d{2}/\d{4})',),
+        }),
+        RegiaoLayout((0.05, 0.121, 0.6, 0.154), {
+            'subgrupo': (r'subgrupo[:\s]*([ab]\d[a-z]?)',),
+            'consumo_kwh': (_NUMERO + r'\s*kwh',),
+        }),
+        RegiaoLayout((0.05, 0.154, 0.6, 0.225), {
+            'valor_energia': (r'energia\s+eletrica\s*' + _MOEDA,),
+            'bandeira_tarifaria': (r'bandeira\s+(verde|amarela|vermelha)',),
+            'icms': (r'icms\s*' + _MOEDA,),
+            'valor_total': (r'total\s+a\s+pagar\s*' + _MOEDA,),
+        }),
+    )
+)
+
+registro_layouts = RegistroLayouts()
+registro_layouts.registrar(ENERGISA_RONDONIA)
@@ -3,43 +3,134 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
 from src.models.user import db
 from src.routes.user import user_bp
-from src.routes.auditoria import auditoria_bp
+from src.routes.auditoria import auditoria_bp, registrar_resultado
+from src.routes.metricas import metricas_bp
+from src.routes.saude import saude_bp
+from src.routes.simulacao import simulacao_bp
+from src.fila_auditoria import fila_auditoria
+from src.processamento import processar_conta, regras_auditoria, extrator_dados
+from src.historico_consumo import historico_consumo
+from src.cache_auditoria import cache_auditoria
+from src.cache_ocr import cache_ocr
+from src.anomalias_portfolio import detector_anomalias
+from src.simulacao_tarifas import simulador_tarifas
+from src import resumos
+from src.estaticos import ativos_estaticos
+from src.layouts_distribuidora import registro_layouts
+from src.upload import RequestUpload, retencao_uploads
+from src.metricas import metricas
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
+# Uploads gravados em disco enquanto chegam, com limite de tamanho e validação do conteúdo
+app.request_class = RequestUpload
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', '/tmp/uploads')
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 200 * 1024 * 1024))
+app.config['UPLOAD_TAMANHO_MAXIMO_ARQUIVO'] = int(os.environ.get('UPLOAD_TAMANHO_MAXIMO_ARQUIVO', 50 * 1024 * 1024))
+app.config['UPLOAD_RETENCAO_HORAS'] = float(os.environ.get('UPLOAD_RETENCAO_HORAS', 24))
+app.config['UPLOAD_CACHE_TAMANHO_MAXIMO'] = int(os.environ.get('UPLOAD_CACHE_TAMANHO_MAXIMO', 256 * 1024 * 1024))
+os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+retencao_uploads.init_app(app)
+
 # Habilitar CORS para permitir requisições do frontend
 CORS(app)
 
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(auditoria_bp, url_prefix='/api')
+app.register_blueprint(metricas_bp, url_prefix='/api')
+app.register_blueprint(saude_bp, url_prefix='/api')
+app.register_blueprint(simulacao_bp, url_prefix='/api')
+
+# Métricas de desempenho em /api/metrics; perfil por amostragem opcional (cabeçalho X-Perfil)
+app.config['METRICAS_HABILITADAS'] = os.environ.get('METRICAS_HABILITADAS', '1') != '0'
+app.config['METRICAS_PERFIL_HABILITADO'] = os.environ.get('METRICAS_PERFIL_HABILITADO', '0') == '1'
+metricas.init_app(app)
+
+# Bancos SQLite da aplicação, do histórico, do cache e da fila (DIRETORIO_DADOS muda o local)
+DIRETORIO_DADOS = os.environ.get('DIRETORIO_DADOS', os.path.join(os.path.dirname(__file__), 'database'))
+os.makedirs(DIRETORIO_DADOS, exist_ok=True)
 
 # uncomment if you need to use database
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(DIRETORIO_DADOS, 'app.db')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 with app.app_context():
     db.create_all()
+    # create_all só cria tabelas ausentes: índices novos em tabelas existentes são criados aqui
+    for tabela in db.metadata.sorted_tables:
+        for indice in tabela.indexes:
+            indice.create(db.engine, checkfirst=True)
+
+# Resumos mensais mantidos a cada auditoria (comando flask reconstruir-resumos para recalcular)
+resumos.init_app(app)
+
+# Tabela de tarifas por distribuidora e vigência (JSON ou SQLite); sem ela valem os valores de referência
+app.config['TARIFAS_ARQUIVO'] = os.environ.get('TARIFAS_ARQUIVO')
+if app.config['TARIFAS_ARQUIVO']:
+    regras_auditoria.carregar_tarifas(app.config['TARIFAS_ARQUIVO'])
+
+# Layouts de conta adicionais por distribuidora (JSON); os embutidos valem sem configuração
+app.config['LAYOUTS_ARQUIVO'] = os.environ.get('LAYOUTS_ARQUIVO')
+if app.config['LAYOUTS_ARQUIVO']:
+    registro_layouts.carregar_arquivo(app.config['LAYOUTS_ARQUIVO'])
+
+# Modo de demonstração: arquivos sem texto legível recebem dados simulados em vez de erro
+app.config['EXTRACAO_SIMULADA'] = os.environ.get('EXTRACAO_SIMULADA', '0') == '1'
+extrator_dados.simulado = app.config['EXTRACAO_SIMULADA']
+
+# Seleção das regras de auditoria (nomes separados por vírgula); sem configuração, todas valem
+app.config['REGRAS_HABILITADAS'] = os.environ.get('REGRAS_HABILITADAS')
+app.config['REGRAS_DESABILITADAS'] = os.environ.get('REGRAS_DESABILITADAS', '')
+regras_auditoria.configurar_regras(
+    habilitadas=app.config['REGRAS_HABILITADAS'].split(',') if app.config['REGRAS_HABILITADAS'] else None,
+    desabilitadas=[nome for nome in app.config['REGRAS_DESABILITADAS'].split(',') if nome]
+)
+
+# Histórico de consumo por unidade consumidora usado na detecção de consumo anômalo
+app.config['HISTORICO_CONSUMO_DATABASE_PATH'] = os.path.join(DIRETORIO_DADOS, 'historico_consumo.db')
+historico_consumo.init_app(app)
+
+# Cache de resultados por dados normalizados e versão das regras/tarifas: LRU em memória
+# e nível SQLite compartilhado entre processos (CACHE_AUDITORIA_DATABASE_PATH vazio o desativa)
+app.config['CACHE_AUDITORIA_CAPACIDADE'] = int(os.environ.get('CACHE_AUDITORIA_CAPACIDADE', 4096))
+app.config['CACHE_AUDITORIA_DATABASE_PATH'] = os.environ.get(
+    'CACHE_AUDITORIA_DATABASE_PATH', os.path.join(DIRETORIO_DADOS, 'cache_auditoria.db')
+) or None
+app.config['CACHE_AUDITORIA_MAX_LINHAS'] = int(os.environ.get('CACHE_AUDITORIA_MAX_LINHAS', 200000))
+cache_auditoria.init_app(app)
+
+# Páginas renderizadas e textos do OCR por conteúdo da página: reextrair contas digitalizadas
+# após mudar padrões ou regras não repete o OCR (CACHE_OCR_PASTA vazio o desativa)
+app.config['CACHE_OCR_PASTA'] = os.environ.get('CACHE_OCR_PASTA', os.path.join(DIRETORIO_DADOS, 'cache_ocr')) or None
+app.config['CACHE_OCR_TAMANHO_TEXTOS'] = int(os.environ.get('CACHE_OCR_TAMANHO_TEXTOS', 64 * 1024 * 1024))
+app.config['CACHE_OCR_TAMANHO_IMAGENS'] = int(os.environ.get('CACHE_OCR_TAMANHO_IMAGENS', 1024 * 1024 * 1024))
+cache_ocr.init_app(app)
+
+# Análise periódica de anomalias em todas as auditorias (comando flask detectar-anomalias)
+app.config['ANOMALIAS_TAMANHO_BLOCO'] = int(os.environ.get('ANOMALIAS_TAMANHO_BLOCO', 5000))
+app.config['ANOMALIAS_MAX_PROCESSOS'] = int(os.environ.get('ANOMALIAS_MAX_PROCESSOS', os.cpu_count() or 1))
+detector_anomalias.init_app(app)
+
+# Simulação "e se?" de modalidade tarifária sobre os últimos meses de cada unidade (cache por cenário)
+app.config['SIMULACAO_MESES'] = int(os.environ.get('SIMULACAO_MESES', 12))
+app.config['SIMULACAO_MAX_CENARIOS'] = int(os.environ.get('SIMULACAO_MAX_CENARIOS', 32))
+simulador_tarifas.init_app(app)
+
+# Fila assíncrona de auditorias (SQLite, sem broker externo)
+app.config['FILA_DATABASE_PATH'] = os.path.join(DIRETORIO_DADOS, 'fila.db')
+app.config['FILA_MAX_CONCORRENCIA'] = int(os.environ.get('FILA_MAX_CONCORRENCIA', 2))
+app.config['FILA_MAX_TENTATIVAS'] = int(os.environ.get('FILA_MAX_TENTATIVAS', 3))
+app.config['FILA_INICIAR'] = os.environ.get('FILA_INICIAR', '1') != '0'
+fila_auditoria.init_app(app, processador=processar_conta, registrador=registrar_resultado)
 
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+# Frontend compilado servido de um manifesto em memória (versões .br/.gz geradas no build)
+app.config['ESTATICOS_PASTA'] = app.static_folder
+ativos_estaticos.init_app(app)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,383 @@
+"""
+Módulo de métricas de desempenho no formato texto do Prometheus
+Contadores, medidores e histogramas com rótulos, mais um perfilador por
+amostragem que pode ser ativado para requisições individuais
+"""
+
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Tuple
+
+from flask import current_app, g, request
+
+# Limites (segundos) dos histogramas de duração
+BUCKETS_DURACAO = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Perfilador por amostragem
+PERFIL_INTERVALO = 0.005
+PERFIL_MAX_PROFUNDIDADE = 64
+PERFIL_MAX_ARMAZENADOS = 20
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _formatar_rotulos(nomes: Tuple[str, ...], valores: Tuple[str, ...], extra: str = '') -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _formatar_numero(valor: float) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    """Base das métricas: uma série por combinação de valores dos rótulos"""
+
+    tipo = ''
+
+    def __init__(self, registro: 'RegistroMetricas', nome: str, ajuda: str, rotulos: Tuple[str, ...] = ()):
+        self.registro = registro
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _nova_serie(self):
+        raise NotImplementedError
+
+    def rotular(self, *valores, **rotulos):
+        """Série dos valores de rótulo informados; guarde o retorno nos caminhos quentes"""
+        if rotulos:
+            valores = tuple(str(rotulos[nome]) for nome in self.rotulos)
+        else:
+            valores = tuple(str(valor) for valor in valores)
+        serie = self._series.get(valores)
+        if serie is None:
+            with self._lock:
+                serie = self._series.setdefault(valores, self._nova_serie())
+        return serie
+
+    def _linhas(self) -> List[str]:
+        raise NotImplementedError
+
+    def renderizar(self) -> List[str]:
+        return [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} {self.tipo}'] + self._linhas()
+
+
+class _SerieContador:
+    __slots__ = ('registro', 'valor', '_lock')
+
+    def __init__(self, registro):
+        self.registro = registro
+        self.valor = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, valor: float = 1):
+        if self.registro.habilitado:
+            with self._lock:
+                self.valor += valor
+
+
+class Contador(_Metrica):
+    """Valor que só cresce (eventos, bytes recebidos)"""
+
+    tipo = 'counter'
+
+    def _nova_serie(self):
+        return _SerieContador(self.registro)
+
+    def inc(self, valor: float = 1, **rotulos):
+        self.rotular(**rotulos).inc(valor)
+
+    def _linhas(self) -> List[str]:
+        return [
+            f'{self.nome}{_formatar_rotulos(self.rotulos, valores)} {_formatar_numero(serie.valor)}'
+            for valores, serie in sorted(self._series.items())
+        ]
+
+
+class _SerieMedidor(_SerieContador):
+    __slots__ = ()
+
+    def dec(self, valor: float = 1):
+        self.inc(-valor)
+
+    def definir(self, valor: float):
+        with self._lock:
+            self.valor = valor
+
+
+class Medidor(Contador):
+    """Valor que sobe e desce (requisições em andamento)"""
+
+    tipo = 'gauge'
+
+    def _nova_serie(self):
+        return _SerieMedidor(self.registro)
+
+    def dec(self, valor: float = 1, **rotulos):
+        self.rotular(**rotulos).dec(valor)
+
+
+class _SerieHistograma:
+    __slots__ = ('registro', 'limites', 'contagens', 'soma', 'total', '_lock')
+
+    def __init__(self, registro, limites: Tuple[float, ...]):
+        self.registro = registro
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float):
+        if not self.registro.habilitado:
+            return
+        posicao = bisect_left(self.limites, valor)
+        with self._lock:
+            self.contagens[posicao] += 1
+            self.soma += valor
+            self.total += 1
+
+    @contextmanager
+    def cronometrar(self):
+        """Observa a duração do bloco em segundos"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio)
+
+
+class Histograma(_Metrica):
+    """Distribuição de valores em faixas cumulativas (durações)"""
+
+    tipo = 'histogram'
+
+    def __init__(self, registro, nome, ajuda, rotulos=(), buckets: Tuple[float, ...] = BUCKETS_DURACAO):
+        super().__init__(registro, nome, ajuda, rotulos)
+        self.limites = tuple(sorted(buckets))
+
+    def _nova_serie(self):
+        return _SerieHistograma(self.registro, self.limites)
+
+    def observar(self, valor: float, **rotulos):
+        self.rotular(**rotulos).observar(valor)
+
+    def cronometrar(self, **rotulos):
+        return self.rotular(**rotulos).cronometrar()
+
+    def _linhas(self) -> List[str]:
+        linhas = []
+        for valores, serie in sorted(self._series.items()):
+            with serie._lock:
+                contagens = list(serie.contagens)
+                soma, total = serie.soma, serie.total
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float('inf'),), contagens):
+                acumulado += contagem
+                rotulo_le = f'le="{_formatar_numero(float(limite))}"'
+                linhas.append(
+                    f'{self.nome}_bucket{_formatar_rotulos(self.rotulos, valores, rotulo_le)} {acumulado}'
+                )
+            rotulos = _formatar_rotulos(self.rotulos, valores)
+            linhas.append(f'{self.nome}_sum{rotulos} {_formatar_numero(soma)}')
+            linhas.append(f'{self.nome}_count{rotulos} {total}')
+        return linhas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas do processo; desabilitado, as observações viram no-op"""
+
+    def __init__(self):
+        self.habilitado = True
+        self._metricas: Dict[str, _Metrica] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Habilita as métricas e instala os ganchos de duração, requisições em andamento e perfil"""
+        self.habilitado = app.config.get('METRICAS_HABILITADAS', True)
+
+        @app.before_request
+        def iniciar_requisicao():
+            g.inicio_requisicao = time.perf_counter()
+            requisicoes_em_andamento.inc()
+            # Perfil sob demanda: cabeçalho X-Perfil em requisições individuais
+            if request.headers.get('X-Perfil') and current_app.config.get('METRICAS_PERFIL_HABILITADO'):
+                g.perfil = PerfilAmostragem()
+                g.perfil.iniciar()
+
+        @app.after_request
+        def finalizar_requisicao(response):
+            inicio = g.pop('inicio_requisicao', None)
+            if inicio is not None:
+                duracao_requisicao.observar(
+                    time.perf_counter() - inicio, endpoint=request.endpoint or 'desconhecido',
+                    metodo=request.method, status=response.status_code
+                )
+            perfil = g.pop('perfil', None)
+            if perfil is not None:
+                perfil.parar()
+                response.headers['X-Perfil-Id'] = str(perfis_recentes.adicionar(
+                    perfil, endpoint=request.endpoint, caminho=request.path, status=response.status_code
+                ))
+            return response
+
+        @app.teardown_request
+        def encerrar_requisicao(erro=None):
+            requisicoes_em_andamento.dec()
+            perfil = g.pop('perfil', None)
+            if perfil is not None:
+                perfil.parar()
+
+    @contextmanager
+    def desativadas(self):
+        """Suspende as observações no bloco (aquecimento e verificações internas não entram nas métricas)"""
+        habilitado, self.habilitado = self.habilitado, False
+        try:
+            yield
+        finally:
+            self.habilitado = habilitado
+
+    def _registrar(self, classe, nome: str, *args, **kwargs):
+        with self._lock:
+            metrica = self._metricas.get(nome)
+            if metrica is None:
+                metrica = self._metricas[nome] = classe(self, nome, *args, **kwargs)
+            return metrica
+
+    def contador(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = ()) -> Contador:
+        return self._registrar(Contador, nome, ajuda, rotulos)
+
+    def medidor(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = ()) -> Medidor:
+        return self._registrar(Medidor, nome, ajuda, rotulos)
+
+    def histograma(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = (),
+                   buckets: Tuple[float, ...] = BUCKETS_DURACAO) -> Histograma:
+        return self._registrar(Histograma, nome, ajuda, rotulos, buckets=buckets)
+
+    def renderizar(self) -> str:
+        """Todas as métricas no formato de exposição em texto do Prometheus"""
+        linhas = []
+        for nome in sorted(self._metricas):
+            linhas.extend(self._metricas[nome].renderizar())
+        return '\n'.join(linhas) + '\n'
+
+
+class PerfilAmostragem:
+    """
+    Perfilador por amostragem de uma thread: uma thread auxiliar lê a pilha da
+    thread alvo em intervalos fixos e conta as pilhas no formato "collapsed"
+    (funções separadas por ';'), aceito por ferramentas de flame graph
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, intervalo: float = PERFIL_INTERVALO):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.intervalo = intervalo
+        self.pilhas: Counter = Counter()
+        self.amostras = 0
+        self.inicio = 0.0
+        self.duracao = 0.0
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def iniciar(self):
+        self.inicio = time.perf_counter()
+        self._thread = threading.Thread(target=self._amostrar, name='perfil-amostragem', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duracao = time.perf_counter() - self.inicio
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            quadro = sys._current_frames().get(self.thread_id)
+            if quadro is None:
+                continue
+            funcoes = []
+            while quadro is not None and len(funcoes) < PERFIL_MAX_PROFUNDIDADE:
+                codigo = quadro.f_code
+                funcoes.append(f'{codigo.co_name} ({codigo.co_filename}:{quadro.f_lineno})')
+                quadro = quadro.f_back
+            self.pilhas[';'.join(reversed(funcoes))] += 1
+            self.amostras += 1
+
+    def to_dict(self, limite: int = 50) -> Dict[str, Any]:
+        return {
+            'duracao': self.duracao,
+            'intervalo': self.intervalo,
+            'amostras': self.amostras,
+            'pilhas': [
+                {'pilha': pilha, 'amostras': contagem}
+                for pilha, contagem in self.pilhas.most_common(limite)
+            ]
+        }
+
+
+class PerfisRecentes:
+    """Perfis das últimas requisições perfiladas (buffer circular)"""
+
+    def __init__(self, tamanho: int = PERFIL_MAX_ARMAZENADOS):
+        self._perfis = deque(maxlen=tamanho)
+        self._proximo_id = 1
+        self._lock = threading.Lock()
+
+    def adicionar(self, perfil: PerfilAmostragem, **contexto) -> int:
+        with self._lock:
+            perfil_id = self._proximo_id
+            self._proximo_id += 1
+            self._perfis.append({'id': perfil_id, **contexto, **perfil.to_dict()})
+        return perfil_id
+
+    def listar(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(reversed(self._perfis))
+
+
+metricas = RegistroMetricas()
+perfis_recentes = PerfisRecentes()
+
+# Métricas do pipeline de auditoria
+duracao_etapa = metricas.histograma(
+    'auditoria_etapa_duracao_segundos', 'Duração de cada etapa do processamento de uma conta', ('etapa',)
+)
+duracao_regra = metricas.histograma(
+    'auditoria_regra_duracao_segundos', 'Duração de cada regra de auditoria', ('regra',)
+)
+avaliacoes_regra = metricas.contador(
+    'auditoria_regra_avaliacoes_total', 'Contas avaliadas por regra de auditoria', ('regra',)
+)
+irregularidades_regra = metricas.contador(
+    'auditoria_regra_irregularidades_total', 'Irregularidades encontradas por regra de auditoria', ('regra',)
+)
+contas_processadas = metricas.contador(
+    'auditoria_contas_processadas_total', 'Contas processadas por resultado', ('status',)
+)
+
+# Métricas HTTP e de upload
+requisicoes_em_andamento = metricas.medidor(
+    'http_requisicoes_em_andamento', 'Requisições sendo atendidas no momento'
+)
+duracao_requisicao = metricas.histograma(
+    'http_requisicao_duracao_segundos', 'Duração das requisições por endpoint', ('endpoint', 'metodo', 'status')
+)
+bytes_upload = metricas.contador(
+    'auditoria_upload_bytes_total', 'Bytes recebidos em arquivos enviados'
+)
+arquivos_upload = metricas.contador(
+    'auditoria_upload_arquivos_total', 'Arquivos enviados por resultado', ('resultado',)
+)
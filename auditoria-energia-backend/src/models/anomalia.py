@@ -0,0 +1,71 @@
+from datetime import datetime
+
+from src.models.user import db
+
+
+class AnomaliaPortfolio(db.Model):
+    """Anomalia encontrada pela análise periódica de todas as auditorias armazenadas"""
+    __tablename__ = 'anomalia_portfolio'
+    __table_args__ = (
+        # Consultas sempre filtram pela execução, com paginação por cursor
+        db.Index('ix_anomalia_portfolio_execucao_id', 'execucao', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    execucao = db.Column(db.String(32), nullable=False)
+    data_execucao = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    tipo = db.Column(db.String(40), nullable=False)
+    numero_instalacao = db.Column(db.String(40))
+    distribuidora = db.Column(db.String(120))
+    subgrupo = db.Column(db.String(20))
+    tipo_ligacao = db.Column(db.String(20))
+    competencia = db.Column(db.String(7))
+    valor = db.Column(db.Float)
+    referencia = db.Column(db.Float)
+    escore = db.Column(db.Float)
+    descricao = db.Column(db.Text)
+
+    def __repr__(self):
+        return f'<AnomaliaPortfolio {self.id} {self.tipo}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'execucao': self.execucao,
+            'data_execucao': self.data_execucao.isoformat(),
+            'tipo': self.tipo,
+            'numero_instalacao': self.numero_instalacao,
+            'distribuidora': self.distribuidora,
+            'subgrupo': self.subgrupo,
+            'tipo_ligacao': self.tipo_ligacao,
+            'competencia': self.competencia,
+            'valor': self.valor,
+            'referencia': self.referencia,
+            'escore': self.escore,
+            'descricao': self.descricao
+        }
+
+
+class ExecucaoAnomalias(db.Model):
+    """Execução da análise de anomalias (registrada mesmo quando nada é encontrado)"""
+    __tablename__ = 'execucao_anomalias'
+
+    id = db.Column(db.String(32), primary_key=True)
+    data_execucao = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
+    auditorias = db.Column(db.Integer, nullable=False, default=0)
+    instalacoes = db.Column(db.Integer, nullable=False, default=0)
+    anomalias = db.Column(db.Integer, nullable=False, default=0)
+    duracao = db.Column(db.Float)
+
+    def __repr__(self):
+        return f'<ExecucaoAnomalias {self.id}>'
+
+    def to_dict(self):
+        return {
+            'execucao': self.id,
+            'data_execucao': self.data_execucao.isoformat(),
+            'auditorias': self.auditorias,
+            'instalacoes': self.instalacoes,
+            'anomalias': self.anomalias,
+            'duracao': self.duracao
+        }
@@ -0,0 +1,217 @@
+import json
+from datetime import datetime
+
+from src.models.user import db
+from src.tarifas import competencia_de
+from src.historico_consumo import historico_consumo
+from src.resumos import atualizar_resumos
+
+
+def _converter_data(valor):
+    if isinstance(valor, datetime):
+        return valor
+    try:
+        return datetime.fromisoformat(valor)
+    except (TypeError, ValueError):
+        return datetime.now()
+
+
+class Auditoria(db.Model):
+    __tablename__ = 'auditoria'
+    __table_args__ = (
+        # Índices compostos com o id atendem aos filtros com paginação por cursor
+        db.Index('ix_auditoria_instalacao_id', 'numero_instalacao', 'id'),
+        db.Index('ix_auditoria_mes_referencia_id', 'mes_referencia', 'id'),
+        db.Index('ix_auditoria_status_geral_id', 'status_geral', 'id'),
+        db.Index('ix_auditoria_distribuidora_id', 'distribuidora', 'id'),
+        # Período: o histórico filtrado por data é ordenado por (data_auditoria, id)
+        db.Index('ix_auditoria_data_id', 'data_auditoria', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    arquivo = db.Column(db.String(255), nullable=False)
+    data_auditoria = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    status = db.Column(db.String(20), nullable=False)
+    status_geral = db.Column(db.String(40), nullable=False)
+    numero_instalacao = db.Column(db.String(40))
+    mes_referencia = db.Column(db.String(7))
+    competencia = db.Column(db.String(7), index=True)
+    distribuidora = db.Column(db.String(120))
+    subgrupo = db.Column(db.String(20))
+    total_irregularidades = db.Column(db.Integer, nullable=False, default=0)
+    impacto_financeiro = db.Column(db.Float, nullable=False, default=0.0)
+    recomendacoes = db.Column(db.Text)
+    problemas_extracao = db.Column(db.Text)
+    erro = db.Column(db.Text)
+
+    irregularidades = db.relationship(
+        'Irregularidade', backref='auditoria', lazy='select',
+        cascade='all, delete-orphan', order_by='Irregularidade.id'
+    )
+    dados_extraidos = db.relationship(
+        'DadosExtraidos', backref='auditoria', uselist=False, lazy='select',
+        cascade='all, delete-orphan'
+    )
+
+    def __repr__(self):
+        return f'<Auditoria {self.id} {self.arquivo}>'
+
+    @classmethod
+    def from_resultado(cls, resultado):
+        """Cria a auditoria (com irregularidades e dados extraídos) a partir do resultado do pipeline"""
+        dados = resultado.get('dados_extraidos') or {}
+        resumo = resultado.get('resumo') or {}
+
+        auditoria = cls(
+            arquivo=resultado.get('arquivo', ''),
+            data_auditoria=_converter_data(
+                resultado.get('data_auditoria') or resultado.get('data_processamento')
+            ),
+            status=resultado.get('status', 'processado'),
+            status_geral=resumo.get('status_geral', 'Conforme'),
+            numero_instalacao=dados.get('numero_instalacao'),
+            mes_referencia=dados.get('mes_referencia'),
+            competencia=competencia_de(dados.get('mes_referencia')),
+            distribuidora=dados.get('distribuidora'),
+            subgrupo=dados.get('subgrupo'),
+            total_irregularidades=resumo.get('total_irregularidades', 0),
+            impacto_financeiro=resumo.get('impacto_financeiro', 0.0),
+            recomendacoes=json.dumps(resultado.get('recomendacoes', []), ensure_ascii=False),
+            problemas_extracao=json.dumps(resultado.get('problemas_extracao', {}), ensure_ascii=False),
+            erro=resultado.get('erro')
+        )
+
+        for irregularidade in resultado.get('irregularidades', []):
+            auditoria.irregularidades.append(Irregularidade(
+                tipo=irregularidade.get('tipo', ''),
+                descricao=irregularidade.get('descricao', ''),
+                severidade=irregularidade.get('severidade', ''),
+                impacto_financeiro=irregularidade.get('impacto_financeiro', 0.0),
+                recomendacao=irregularidade.get('recomendacao', '')
+            ))
+
+        if dados:
+            auditoria.dados_extraidos = DadosExtraidos.from_dict(dados)
+
+        return auditoria
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'data': self.data_auditoria.isoformat(),
+            'arquivo': self.arquivo,
+            'status': self.status_geral,
+            'irregularidades': self.total_irregularidades,
+            'impacto_financeiro': self.impacto_financeiro,
+            'numero_instalacao': self.numero_instalacao,
+            'mes_referencia': self.mes_referencia,
+            'distribuidora': self.distribuidora
+        }
+
+    def to_relatorio(self):
+        """Relatório detalhado da auditoria"""
+        relatorio = {
+            'id': self.id,
+            'data_auditoria': self.data_auditoria.isoformat(),
+            'arquivo_original': self.arquivo,
+            'status': self.status_geral,
+            'dados_extraidos': self.dados_extraidos.to_dict() if self.dados_extraidos else {},
+            'irregularidades': [irregularidade.to_dict() for irregularidade in self.irregularidades],
+            'recomendacoes': json.loads(self.recomendacoes or '[]'),
+            'problemas_extracao': json.loads(self.problemas_extracao or '{}'),
+            'resumo': {
+                'total_irregularidades': self.total_irregularidades,
+                'impacto_financeiro': self.impacto_financeiro,
+                'status_geral': self.status_geral
+            }
+        }
+        if self.erro:
+            relatorio['erro'] = self.erro
+        return relatorio
+
+
+class Irregularidade(db.Model):
+    __tablename__ = 'irregularidade'
+
+    id = db.Column(db.Integer, primary_key=True)
+    auditoria_id = db.Column(db.Integer, db.ForeignKey('auditoria.id'), nullable=False, index=True)
+    tipo = db.Column(db.String(80), nullable=False, index=True)
+    descricao = db.Column(db.Text)
+    severidade = db.Column(db.String(20))
+    impacto_financeiro = db.Column(db.Float, nullable=False, default=0.0)
+    recomendacao = db.Column(db.Text)
+
+    def __repr__(self):
+        return f'<Irregularidade {self.id} {self.tipo}>'
+
+    def to_dict(self):
+        return {
+            'tipo': self.tipo,
+            'descricao': self.descricao,
+            'severidade': self.severidade,
+            'impacto_financeiro': self.impacto_financeiro,
+            'recomendacao': self.recomendacao
+        }
+
+
+class DadosExtraidos(db.Model):
+    __tablename__ = 'dados_extraidos'
+
+    # Campos numéricos mais consultados ficam em colunas; o restante vai em JSON
+    COLUNAS = (
+        'consumo_kwh', 'valor_total', 'valor_energia', 'subgrupo', 'tipo_consumidor',
+        'tipo_ligacao', 'bandeira_tarifaria', 'valor_bandeira', 'icms', 'pis', 'cofins',
+        'numero_instalacao', 'mes_referencia', 'distribuidora'
+    )
+
+    auditoria_id = db.Column(db.Integer, db.ForeignKey('auditoria.id'), primary_key=True)
+    consumo_kwh = db.Column(db.Float)
+    valor_total = db.Column(db.Float)
+    valor_energia = db.Column(db.Float)
+    subgrupo = db.Column(db.String(20))
+    tipo_consumidor = db.Column(db.String(80))
+    tipo_ligacao = db.Column(db.String(20))
+    bandeira_tarifaria = db.Column(db.String(20))
+    valor_bandeira = db.Column(db.Float)
+    icms = db.Column(db.Float)
+    pis = db.Column(db.Float)
+    cofins = db.Column(db.Float)
+    numero_instalacao = db.Column(db.String(40))
+    mes_referencia = db.Column(db.String(7))
+    distribuidora = db.Column(db.String(120))
+    dados = db.Column(db.Text)
+
+    def __repr__(self):
+        return f'<DadosExtraidos {self.auditoria_id}>'
+
+    @classmethod
+    def from_dict(cls, dados):
+        colunas = {}
+        for coluna in cls.COLUNAS:
+            valor = dados.get(coluna)
+            if isinstance(valor, (int, float, str)) or valor is None:
+                colunas[coluna] = valor
+        return cls(dados=json.dumps(dados, ensure_ascii=False, default=str), **colunas)
+
+    def to_dict(self):
+        if self.dados:
+            return json.loads(self.dados)
+        return {coluna: getattr(self, coluna) for coluna in self.COLUNAS}
+
+
+def registrar_auditorias(resultados):
+    """
+    Persiste os resultados processados e os resumos mensais em uma única transação
+    e atualiza o histórico de consumo
+    """
+    auditorias = [
+        Auditoria.from_resultado(resultado)
+        for resultado in resultados
+        if resultado.get('status') != 'erro'
+    ]
+    if auditorias:
+        db.session.add_all(auditorias)
+        atualizar_resumos(auditorias)
+        db.session.commit()
+        historico_consumo.registrar_resultados(resultados)
+    return auditorias
@@ -0,0 +1,64 @@
+from src.models.user import db
+
+
+class ResumoMensalInstalacao(db.Model):
+    """
+    Totais das auditorias por distribuidora, unidade consumidora e competência,
+    mantidos a cada auditoria registrada (campos ausentes ficam como ''); reauditorias
+    substituem a auditoria anterior da mesma unidade e competência
+    """
+    __tablename__ = 'resumo_mensal_instalacao'
+
+    # A ordem da chave primária é a ordem do relatório consolidado
+    distribuidora = db.Column(db.String(120), primary_key=True)
+    numero_instalacao = db.Column(db.String(40), primary_key=True)
+    competencia = db.Column(db.String(7), primary_key=True)
+    auditorias = db.Column(db.Integer, nullable=False, default=0)
+    nao_conformes = db.Column(db.Integer, nullable=False, default=0)
+    irregularidades = db.Column(db.Integer, nullable=False, default=0)
+    impacto_financeiro = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<ResumoMensalInstalacao {self.distribuidora} {self.numero_instalacao} {self.competencia}>'
+
+    def to_dict(self):
+        return {
+            'distribuidora': self.distribuidora,
+            'numero_instalacao': self.numero_instalacao,
+            'competencia': self.competencia,
+            'auditorias': self.auditorias,
+            'nao_conformes': self.nao_conformes,
+            'irregularidades': self.irregularidades,
+            'impacto_financeiro': self.impacto_financeiro
+        }
+
+
+class ResumoMensal(db.Model):
+    """Totais das auditorias por competência, distribuidora e subgrupo (taxa de conformidade do painel)"""
+    __tablename__ = 'resumo_mensal'
+
+    competencia = db.Column(db.String(7), primary_key=True)
+    distribuidora = db.Column(db.String(120), primary_key=True)
+    subgrupo = db.Column(db.String(20), primary_key=True)
+    auditorias = db.Column(db.Integer, nullable=False, default=0)
+    nao_conformes = db.Column(db.Integer, nullable=False, default=0)
+    irregularidades = db.Column(db.Integer, nullable=False, default=0)
+    impacto_financeiro = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<ResumoMensal {self.competencia} {self.distribuidora} {self.subgrupo}>'
+
+
+class ResumoMensalIrregularidade(db.Model):
+    """Irregularidades e valores a recuperar por competência, distribuidora, subgrupo e tipo"""
+    __tablename__ = 'resumo_mensal_irregularidade'
+
+    competencia = db.Column(db.String(7), primary_key=True)
+    distribuidora = db.Column(db.String(120), primary_key=True)
+    subgrupo = db.Column(db.String(20), primary_key=True)
+    tipo = db.Column(db.String(80), primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    impacto_financeiro = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<ResumoMensalIrregularidade {self.competencia} {self.distribuidora} {self.subgrupo} {self.tipo}>'
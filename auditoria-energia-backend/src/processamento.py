@@ -0,0 +1,98 @@
+"""
+Módulo com o pipeline de processamento de contas de energia elétrica
+Reúne extração, validação, auditoria e recomendações sem depender do Flask,
+para que possa ser executado tanto nas rotas quanto em processos de trabalho
+"""
+
+import os
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from src.regras_auditoria import RegrasAuditoria
+from src.extrator_dados import ExtratorDados
+from src.historico_consumo import HistoricoConsumo, historico_consumo
+from src.cache_auditoria import CacheAuditoria, cache_auditoria
+from src.metricas import duracao_etapa, contas_processadas
+
+# Instâncias padrão utilizadas quando nenhuma é informada
+regras_auditoria = RegrasAuditoria()
+extrator_dados = ExtratorDados()
+
+# Séries de duração das etapas do pipeline
+_ETAPA_EXTRACAO = duracao_etapa.rotular('extracao')
+_ETAPA_VALIDACAO = duracao_etapa.rotular('validacao')
+_ETAPA_AUDITORIA = duracao_etapa.rotular('auditoria')
+
+
+def processar_conta(filepath: str,
+                    extrator: Optional[ExtratorDados] = None,
+                    regras: Optional[RegrasAuditoria] = None,
+                    conteudo: Optional[Any] = None,
+                    historico: Optional[HistoricoConsumo] = None,
+                    cache: Optional[CacheAuditoria] = None) -> Dict[str, Any]:
+    """
+    Função para processar a conta de energia com regras de auditoria
+    O conteúdo já em memória (bytes ou arquivo mapeado) dispensa a releitura do arquivo;
+    o histórico da unidade consumidora, quando habilitado, alimenta a detecção de anomalias;
+    dados normalizados já auditados com a mesma versão das regras vêm do cache
+    """
+    extrator = extrator or extrator_dados
+    regras = regras or regras_auditoria
+    historico = historico or historico_consumo
+    cache = cache or cache_auditoria
+
+    try:
+        # Extrair dados da conta
+        with _ETAPA_EXTRACAO.cronometrar():
+            dados_conta = extrator.extrair_dados_ocr(filepath, conteudo)
+
+        # Validar dados extraídos
+        with _ETAPA_VALIDACAO.cronometrar():
+            problemas_extracao = extrator.validar_dados_extraidos(dados_conta)
+
+        # Realizar auditoria e gerar recomendações (as estatísticas do histórico não entram nos dados extraídos)
+        with _ETAPA_AUDITORIA.cronometrar():
+            estatisticas = historico.consultar(
+                dados_conta.get('numero_instalacao'), dados_conta.get('mes_referencia')
+            )
+            dados_auditoria = dados_conta
+            if estatisticas is not None:
+                dados_auditoria = dict(dados_conta, estatisticas_consumo=estatisticas)
+            resultado_auditoria, recomendacoes = cache.auditar(regras, dados_auditoria)
+
+        # Adicionar dados extraídos e recomendações ao resultado
+        resultado_auditoria['dados_extraidos'] = dados_conta
+        resultado_auditoria['recomendacoes'] = recomendacoes
+        resultado_auditoria['problemas_extracao'] = problemas_extracao
+        resultado_auditoria['arquivo'] = os.path.basename(filepath)
+
+        contas_processadas.inc(status=resultado_auditoria.get('status', 'processado'))
+        return resultado_auditoria
+
+    except Exception as e:
+        contas_processadas.inc(status='erro')
+        return resultado_erro(filepath, f'Erro durante processamento: {str(e)}')
+
+
+def versao_pipeline(extrator: Optional[ExtratorDados] = None,
+                    regras: Optional[RegrasAuditoria] = None) -> str:
+    """Identifica a combinação de extrator e regras que produziu um resultado"""
+    extrator = extrator or extrator_dados
+    regras = regras or regras_auditoria
+    return f"extrator-{extrator.versao}_regras-{regras.versao}"
+
+
+def resultado_erro(filepath: str, mensagem: str) -> Dict[str, Any]:
+    """Monta o resultado padrão para uma conta que não pôde ser processada"""
+    return {
+        'status': 'erro',
+        'arquivo': os.path.basename(filepath),
+        'data_processamento': datetime.now().isoformat(),
+        'erro': mensagem,
+        'irregularidades': [],
+        'resumo': {
+            'total_irregularidades': 0,
+            'impacto_financeiro': 0.0,
+            'status_geral': 'Erro no Processamento'
+        }
+    }
@@ -0,0 +1,149 @@
+"""
+Módulo para processamento de contas de energia em lote
+Distribui extração e auditoria entre processos de trabalho, um por núcleo
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+from src.processamento import processar_conta, resultado_erro
+from src.ingestao import ContaIngerida
+
+ERRO_POOL = 'Erro durante processamento: processo de trabalho encerrado'
+
+
+def processar_conta_ingerida(conta: ContaIngerida) -> Dict[str, Any]:
+    """Executa o pipeline para uma conta da ingestão (executado nos processos de trabalho)"""
+    if conta.erro is not None:
+        resultado = resultado_erro(conta.nome, conta.erro)
+    elif conta.conteudo is not None:
+        resultado = processar_conta(conta.nome, conteudo=conta.conteudo)
+    else:
+        resultado = processar_conta(conta.caminho)
+    resultado['origem'] = conta.origem
+    if conta.paginas:
+        resultado['paginas'] = conta.paginas
+    return resultado
+
+
+class ProcessadorLote:
+    """Classe que executa o pipeline de auditoria em um pool de processos"""
+
+    def __init__(self, max_processos: Optional[int] = None):
+        self.max_processos = max_processos or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _obter_executor(self) -> ProcessPoolExecutor:
+        """Cria o pool sob demanda, reaproveitando-o entre requisições"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_processos)
+            return self._executor
+
+    def _descartar_executor(self):
+        """Descarta um pool quebrado para que o próximo lote crie outro"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def encerrar(self):
+        """Encerra os processos de trabalho"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def processar_contas(self, contas: Iterable[ContaIngerida],
+                         em_andamento: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Processa as contas à medida que a ingestão as encontra, com no máximo em_andamento
+        contas (padrão: 4 por processo) lidas e ainda não concluídas; o resultado mantém a ordem
+        """
+        em_andamento = em_andamento or self.max_processos * 4
+        contas = enumerate(contas)
+        resultados: Dict[int, Dict[str, Any]] = {}
+
+        if self.max_processos == 1:
+            for indice, conta in contas:
+                resultados[indice] = processar_conta_ingerida(conta)
+            return consolidar_resultados(resultados[indice] for indice in sorted(resultados))
+
+        futuros: Dict[Any, Tuple[int, str]] = {}
+        quebrado = False
+
+        def coletar(concluidos):
+            nonlocal quebrado
+            for futuro in concluidos:
+                indice, nome = futuros.pop(futuro)
+                try:
+                    resultados[indice] = futuro.result()
+                except BrokenProcessPool:
+                    quebrado = True
+                    resultados[indice] = resultado_erro(nome, ERRO_POOL)
+
+        executor = self._obter_executor()
+        for indice, conta in contas:
+            if conta.erro is not None:
+                # Arquivo ilegível na ingestão: não há o que enviar ao pool
+                resultados[indice] = processar_conta_ingerida(conta)
+                continue
+            if quebrado:
+                # Pool perdido: as contas restantes são registradas como erro, sem serem lidas pelo pool
+                resultados[indice] = resultado_erro(conta.nome, ERRO_POOL)
+                continue
+            try:
+                futuros[executor.submit(processar_conta_ingerida, conta)] = (indice, conta.nome)
+            except BrokenProcessPool:
+                quebrado = True
+                resultados[indice] = resultado_erro(conta.nome, ERRO_POOL)
+                continue
+            if len(futuros) >= em_andamento:
+                concluidos, _ = wait(futuros, return_when=FIRST_COMPLETED)
+                coletar(concluidos)
+        coletar(list(futuros))
+        if quebrado:
+            self._descartar_executor()
+
+        return consolidar_resultados(resultados[indice] for indice in sorted(resultados))
+
+
+def consolidar_resultados(resultados: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combina os resultados individuais em um resumo do lote"""
+    arquivos = []
+    total_irregularidades = 0
+    impacto_total = 0.0
+    processados = 0
+    erros = 0
+
+    for resultado in resultados:
+        resumo = resultado.get('resumo', {})
+        if resultado.get('status') == 'erro':
+            erros += 1
+        else:
+            processados += 1
+        total_irregularidades += resumo.get('total_irregularidades', 0)
+        impacto_total += resumo.get('impacto_financeiro', 0.0)
+        arquivos.append(resultado)
+
+    return {
+        'status': 'processado',
+        'data_processamento': datetime.now().isoformat(),
+        'arquivos': arquivos,
+        'resumo': {
+            'total_arquivos': len(arquivos),
+            'processados': processados,
+            'erros': erros,
+            'total_irregularidades': total_irregularidades,
+            'impacto_financeiro': impacto_total
+        }
+    }
+
+
+# Instância compartilhada pelas rotas
+processador_lote = ProcessadorLote()
@@ -0,0 +1,185 @@
+"""
+Módulo do registro de regras de auditoria
+Cada regra declara os campos que usa; os campos são convertidos uma única vez
+para uma conta normalizada e o motor monta, para cada subgrupo, a sequência de
+regras aplicáveis. Campos fora da conta normalizada ficam em conta.dados e devem
+ser declarados em campos_dados, pois entram na chave do cache de resultados. Novas
+regras entram pelo decorador regra, sem alterar auditar_conta:
+
+    @registro_regras.regra('demanda', campos=('consumo_kwh',), ordem=70)
+    def verificar_demanda(regras, conta):
+        return []
+"""
+
+import threading
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from src.tarifas import competencia_de
+from src.metricas import duracao_regra, avaliacoes_regra, irregularidades_regra
+
+
+# Campos da conta normalizada disponíveis para as regras
+CAMPOS = (
+    'consumo_kwh', 'valor_energia', 'valor_bandeira', 'valor_total', 'icms',
+    'subgrupo', 'subgrupo_informado', 'tipo_consumidor', 'tipo_ligacao', 'bandeira_tarifaria',
+    'distribuidora', 'competencia', 'historico_consumo', 'estatisticas_consumo'
+)
+
+
+class ContaNormalizada:
+    """
+    Campos da conta convertidos uma única vez. Campos numéricos ausentes valem 0 e
+    inválidos ficam None; campos de texto que não são str ficam None e o erro fica
+    guardado para ser relançado por texto(), como aconteceria na leitura direta
+    """
+
+    __slots__ = ('dados', 'erros') + CAMPOS
+
+    def __init__(self, dados: Dict[str, Any]):
+        get = dados.get
+        self.dados = dados
+        self.erros: Optional[Dict[str, Exception]] = None
+        
+        # Conversões escritas em linha: esta é a parte mais executada da auditoria
+        try:
+            self.consumo_kwh = float(get('consumo_kwh', 0))
+        except (ValueError, TypeError):
+            self.consumo_kwh = None
+        try:
+            self.valor_energia = float(get('valor_energia', 0))
+        except (ValueError, TypeError):
+            self.valor_energia = None
+        try:
+            self.valor_bandeira = float(get('valor_bandeira', 0))
+        except (ValueError, TypeError):
+            self.valor_bandeira = None
+        try:
+            self.valor_total = float(get('valor_total', 0))
+        except (ValueError, TypeError):
+            self.valor_total = None
+        try:
+            self.icms = float(get('icms', 0))
+        except (ValueError, TypeError):
+            self.icms = None
+        
+        subgrupo = get('subgrupo', 'B3')
+        self.subgrupo = subgrupo
+        try:
+            self.subgrupo_informado = get('subgrupo', '').upper()
+        except AttributeError as erro:
+            self._erro('subgrupo_informado', erro)
+        try:
+            self.tipo_consumidor = get('tipo_consumidor', '').lower()
+        except AttributeError as erro:
+            self._erro('tipo_consumidor', erro)
+        try:
+            self.tipo_ligacao = get('tipo_ligacao', 'monofasico').lower()
+        except AttributeError as erro:
+            self._erro('tipo_ligacao', erro)
+        try:
+            self.bandeira_tarifaria = get('bandeira_tarifaria', '').lower()
+        except AttributeError as erro:
+            self._erro('bandeira_tarifaria', erro)
+        
+        self.distribuidora = get('distribuidora')
+        self.competencia = competencia_de(get('mes_referencia'))
+        
+        # Últimos 3 meses, ou None se o histórico for curto ou inválido
+        try:
+            historico = get('historico_consumo', [])
+            self.historico_consumo = [float(consumo) for consumo in historico[-3:]] if len(historico) >= 3 else None
+        except (ValueError, TypeError):
+            self.historico_consumo = None
+        
+        # Resumo do histórico da unidade consumidora (src.historico_consumo), se houver
+        self.estatisticas_consumo = get('estatisticas_consumo')
+
+    def _erro(self, campo: str, erro: Exception):
+        setattr(self, campo, None)
+        if self.erros is None:
+            self.erros = {}
+        self.erros[campo] = erro
+
+    def texto(self, campo: str) -> str:
+        """Campo de texto normalizado; relança o erro de conversão, se houver"""
+        valor = getattr(self, campo)
+        if valor is None and self.erros and campo in self.erros:
+            raise self.erros[campo]
+        return valor
+
+
+class Regra:
+    """Regra de auditoria registrada"""
+
+    __slots__ = ('nome', 'verificar', 'campos', 'aplica_se', 'ordem', 'verificar_lote', 'campos_dados', 'metricas')
+
+    def __init__(self, nome: str, verificar: Callable, campos: Tuple[str, ...] = (),
+                 aplica_se: Optional[Callable] = None, ordem: int = 100,
+                 verificar_lote: Optional[Callable] = None, campos_dados: Tuple[str, ...] = ()):
+        """
+        Args:
+            nome: Identificador da regra (configuração e métricas)
+            verificar: Função (regras, conta) que retorna a lista de irregularidades
+            campos: Campos da conta normalizada usados pela regra
+            aplica_se: Função (regras, subgrupo_informado, subgrupo) que indica se a regra
+                pode gerar irregularidades para o subgrupo; None aplica sempre
+            ordem: Posição da regra no relatório
+            verificar_lote: Versão vetorizada (regras, avaliacao) usada por auditar_lote; sem ela
+                auditar_lote executa verificar conta a conta
+            campos_dados: Campos lidos de conta.dados (fora da conta normalizada); sem
+                declará-los, contas que diferem só nesses campos compartilhariam o resultado em cache
+        """
+        desconhecidos = set(campos) - set(CAMPOS)
+        if desconhecidos:
+            raise ValueError(f"Campos desconhecidos na regra {nome}: {', '.join(sorted(desconhecidos))}")
+        self.nome = nome
+        self.verificar = verificar
+        self.campos = tuple(campos)
+        self.aplica_se = aplica_se
+        self.ordem = ordem
+        self.verificar_lote = verificar_lote
+        self.campos_dados = tuple(campos_dados)
+        self.metricas = (
+            duracao_regra.rotular(nome), avaliacoes_regra.rotular(nome), irregularidades_regra.rotular(nome)
+        )
+
+    def __repr__(self):
+        return f'<Regra {self.nome}>'
+
+
+class RegistroRegras:
+    """Regras disponíveis, na ordem em que aparecem no relatório"""
+
+    def __init__(self):
+        self._regras: Dict[str, Regra] = {}
+        self._lock = threading.Lock()
+        # Incrementada a cada alteração para invalidar as sequências montadas
+        self.geracao = 0
+
+    def registrar(self, regra: Regra) -> Regra:
+        with self._lock:
+            self._regras[regra.nome] = regra
+            self.geracao += 1
+        return regra
+
+    def regra(self, nome: str, campos: Tuple[str, ...] = (), aplica_se: Optional[Callable] = None,
+              ordem: int = 100, verificar_lote: Optional[Callable] = None, campos_dados: Tuple[str, ...] = ()):
+        """Decorador que registra a função como regra de auditoria"""
+        def decorador(verificar):
+            self.registrar(Regra(nome, verificar, campos, aplica_se, ordem, verificar_lote, campos_dados))
+            return verificar
+        return decorador
+
+    def remover(self, nome: str):
+        with self._lock:
+            if self._regras.pop(nome, None) is not None:
+                self.geracao += 1
+
+    def regras(self) -> List[Regra]:
+        return sorted(self._regras.values(), key=lambda regra: regra.ordem)
+
+    def nomes(self) -> List[str]:
+        return [regra.nome for regra in self.regras()]
+
+
+registro_regras = RegistroRegras()
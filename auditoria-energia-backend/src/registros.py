@@ -0,0 +1,275 @@
+"""
+Módulo de registros compactos para contas e irregularidades
+Em lotes grandes, dicionários por conta e por irregularidade (com as descrições já
+formatadas) ocupam a maior parte da memória. Os registros abaixo usam __slots__,
+códigos de enumeração compartilhados para tipo e severidade e guardam apenas os
+valores das descrições, que são formatadas somente ao gerar o JSON (to_dict)
+"""
+
+import sys
+from enum import Enum
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+
+class Severidade(str, Enum):
+    ALTA = 'Alta'
+    MEDIA = 'Média'
+    BAIXA = 'Baixa'
+
+
+class TipoIrregularidade(str, Enum):
+    CLASSIFICACAO_TARIFARIA = 'Classificação Tarifária Incorreta'
+    CALCULO_CONSUMO = 'Cálculo de Consumo Incorreto'
+    DADOS_INCONSISTENTES = 'Dados Inconsistentes'
+    CUSTO_DISPONIBILIDADE = 'Custo de Disponibilidade Incorreto'
+    BANDEIRA_TARIFARIA = 'Bandeira Tarifária Incorreta'
+    ICMS = 'ICMS Incorreto'
+    CONSUMO_ANOMALO = 'Consumo Anômalo'
+
+
+class ModeloIrregularidade:
+    """Tipo, severidade e textos (modelos str.format) compartilhados por todas as ocorrências"""
+
+    __slots__ = ('tipo', 'severidade', 'descricao', 'recomendacao')
+
+    def __init__(self, tipo: TipoIrregularidade, severidade: Severidade, descricao: str, recomendacao: str):
+        self.tipo = tipo
+        self.severidade = severidade
+        self.descricao = descricao
+        self.recomendacao = recomendacao
+
+    def criar(self, impacto_financeiro: float = 0.0, *valores) -> 'RegistroIrregularidade':
+        return RegistroIrregularidade(self, impacto_financeiro, valores)
+
+    def __repr__(self):
+        return f'<ModeloIrregularidade {self.tipo.value}>'
+
+
+class RegistroIrregularidade:
+    """Irregularidade encontrada: modelo compartilhado, impacto e valores da descrição"""
+
+    __slots__ = ('modelo', 'impacto_financeiro', 'valores')
+
+    def __init__(self, modelo: ModeloIrregularidade, impacto_financeiro: float, valores: Tuple[Any, ...] = ()):
+        self.modelo = modelo
+        self.impacto_financeiro = impacto_financeiro
+        self.valores = valores
+
+    @property
+    def tipo(self) -> str:
+        return self.modelo.tipo.value
+
+    @property
+    def severidade(self) -> str:
+        return self.modelo.severidade.value
+
+    @property
+    def descricao(self) -> str:
+        return self.modelo.descricao.format(*self.valores)
+
+    @property
+    def recomendacao(self) -> str:
+        return self.modelo.recomendacao.format(*self.valores)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'tipo': self.tipo,
+            'descricao': self.descricao,
+            'severidade': self.severidade,
+            'impacto_financeiro': self.impacto_financeiro,
+            'recomendacao': self.recomendacao
+        }
+
+    def __repr__(self):
+        return f'<RegistroIrregularidade {self.tipo} {self.impacto_financeiro}>'
+
+
+class IrregularidadeDicionario:
+    """Irregularidade já em dicionário, de regras sem versão vetorizada, na interface dos registros"""
+
+    __slots__ = ('dados',)
+
+    def __init__(self, dados: Dict[str, Any]):
+        self.dados = dados
+
+    @property
+    def impacto_financeiro(self) -> float:
+        return self.dados.get('impacto_financeiro', 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.dados
+
+    def __repr__(self):
+        return f"<IrregularidadeDicionario {self.dados.get('tipo')} {self.impacto_financeiro}>"
+
+
+# Modelos das irregularidades das regras nativas (mesmos textos de auditar_conta)
+CLASSIFICACAO_INCORRETA = ModeloIrregularidade(
+    TipoIrregularidade.CLASSIFICACAO_TARIFARIA, Severidade.ALTA,
+    'Órgão público classificado como {0}, deveria ser B3 ou B4A',
+    'Solicitar reclassificação para subgrupo adequado'
+)
+CALCULO_INCORRETO = ModeloIrregularidade(
+    TipoIrregularidade.CALCULO_CONSUMO, Severidade.ALTA,
+    'Valor cobrado: R$ {0:.2f}, Valor esperado: R$ {1:.2f}',
+    'Verificar aplicação das tarifas TE e TUSD'
+)
+DADOS_INCONSISTENTES = ModeloIrregularidade(
+    TipoIrregularidade.DADOS_INCONSISTENTES, Severidade.MEDIA,
+    'Não foi possível verificar o cálculo do consumo devido a dados inválidos',
+    'Verificar dados da conta manualmente'
+)
+DISPONIBILIDADE_INCORRETA = ModeloIrregularidade(
+    TipoIrregularidade.CUSTO_DISPONIBILIDADE, Severidade.MEDIA,
+    'Consumo {0} kWh abaixo do mínimo {1} kWh para {2}',
+    'Verificar aplicação do custo mínimo de {1} kWh'
+)
+BANDEIRA_INCORRETA = ModeloIrregularidade(
+    TipoIrregularidade.BANDEIRA_TARIFARIA, Severidade.MEDIA,
+    'Valor bandeira {0}: R$ {1:.2f}, esperado: R$ {2:.2f}',
+    'Verificar aplicação da bandeira tarifária'
+)
+ICMS_INCORRETO = ModeloIrregularidade(
+    TipoIrregularidade.ICMS, Severidade.ALTA,
+    'ICMS cobrado: R$ {0:.2f}, esperado: R$ {1:.2f}',
+    'Verificar cálculo do ICMS'
+)
+CONSUMO_ACIMA_MEDIA = ModeloIrregularidade(
+    TipoIrregularidade.CONSUMO_ANOMALO, Severidade.BAIXA,
+    'Consumo atual ({0} kWh) 50% acima da média ({1:.1f} kWh)',
+    'Verificar possível vazamento ou equipamento com defeito'
+)
+CONSUMO_ABAIXO_MEDIA = ModeloIrregularidade(
+    TipoIrregularidade.CONSUMO_ANOMALO, Severidade.BAIXA,
+    'Consumo atual ({0} kWh) 50% abaixo da média ({1:.1f} kWh)',
+    'Verificar possível problema na medição'
+)
+CONSUMO_ACIMA_HISTORICO = ModeloIrregularidade(
+    TipoIrregularidade.CONSUMO_ANOMALO, Severidade.BAIXA,
+    'Consumo atual ({0} kWh) {2:.0%} acima da {3} ({1:.1f} kWh), em {4} meses de histórico',
+    'Verificar possível vazamento ou equipamento com defeito'
+)
+CONSUMO_ABAIXO_HISTORICO = ModeloIrregularidade(
+    TipoIrregularidade.CONSUMO_ANOMALO, Severidade.BAIXA,
+    'Consumo atual ({0} kWh) {2:.0%} abaixo da {3} ({1:.1f} kWh), em {4} meses de histórico',
+    'Verificar possível problema na medição'
+)
+
+
+class ResultadoAuditoria:
+    """
+    Resultado de auditoria de uma conta com irregularidades em registros compactos
+    Com erro (regra que falhou), o resumo fica zerado como em auditar_conta
+    """
+
+    __slots__ = ('status', 'data_auditoria', 'irregularidades', 'erro')
+
+    def __init__(self, data_auditoria: str, irregularidades: Optional[List[RegistroIrregularidade]] = None,
+                 status: str = 'processado', erro: Optional[str] = None):
+        self.status = status
+        self.data_auditoria = data_auditoria
+        self.irregularidades = irregularidades or ()
+        self.erro = erro
+
+    @property
+    def impacto_financeiro(self) -> float:
+        if not self.irregularidades:
+            return 0
+        return sum(irregularidade.impacto_financeiro for irregularidade in self.irregularidades)
+
+    @property
+    def status_geral(self) -> str:
+        return 'Não Conforme' if self.irregularidades else 'Conforme'
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Mesmo formato de RegrasAuditoria.auditar_conta"""
+        resultado = {
+            'status': self.status,
+            'data_auditoria': self.data_auditoria,
+            'irregularidades': [irregularidade.to_dict() for irregularidade in self.irregularidades],
+            'resumo': {
+                'total_irregularidades': len(self.irregularidades),
+                'impacto_financeiro': self.impacto_financeiro,
+                'status_geral': self.status_geral
+            }
+        }
+        if self.erro is not None:
+            resultado['resumo'] = {'total_irregularidades': 0, 'impacto_financeiro': 0.0, 'status_geral': 'Conforme'}
+            resultado['erro'] = self.erro
+        return resultado
+
+
+# Campos conhecidos dos dados extraídos de uma conta
+CAMPOS_CONTA = (
+    'consumo_kwh', 'valor_total', 'valor_energia', 'subgrupo', 'tipo_consumidor', 'tipo_ligacao',
+    'bandeira_tarifaria', 'valor_bandeira', 'icms', 'pis', 'cofins', 'numero_instalacao',
+    'mes_referencia', 'historico_consumo', 'distribuidora', 'endereco', 'data_vencimento', 'data_leitura'
+)
+
+# Campos de texto com poucos valores distintos, compartilhados entre as contas
+CAMPOS_INTERNADOS = frozenset((
+    'subgrupo', 'tipo_consumidor', 'tipo_ligacao', 'bandeira_tarifaria', 'mes_referencia', 'distribuidora'
+))
+
+# Marca de campo ausente (diferente de um campo presente com valor None); nas colunas de
+# colunas_de_registros faz a auditoria em lote aplicar o padrão do campo, como auditar_conta
+AUSENTE = object()
+
+
+class RegistroConta:
+    """Dados extraídos de uma conta; campos fora de CAMPOS_CONTA ficam em extras"""
+
+    __slots__ = CAMPOS_CONTA + ('extras',)
+
+    def __init__(self, **dados):
+        for campo in CAMPOS_CONTA:
+            valor = dados.pop(campo, AUSENTE)
+            if campo in CAMPOS_INTERNADOS and type(valor) is str:
+                valor = sys.intern(valor)
+            elif campo == 'historico_consumo' and isinstance(valor, list):
+                valor = tuple(valor)
+            setattr(self, campo, valor)
+        self.extras = dados or None
+
+    @classmethod
+    def from_dict(cls, dados: Dict[str, Any]) -> 'RegistroConta':
+        return cls(**dados)
+
+    def get(self, campo: str, padrao: Any = None) -> Any:
+        """Acesso no estilo de dicionário, para código que recebe dados_conta"""
+        valor = getattr(self, campo, AUSENTE) if campo in CAMPOS_CONTA else (self.extras or {}).get(campo, AUSENTE)
+        return padrao if valor is AUSENTE else valor
+
+    def to_dict(self) -> Dict[str, Any]:
+        dados = {}
+        for campo in CAMPOS_CONTA:
+            valor = getattr(self, campo)
+            if valor is not AUSENTE:
+                dados[campo] = list(valor) if campo == 'historico_consumo' and isinstance(valor, tuple) else valor
+        if self.extras:
+            dados.update(self.extras)
+        return dados
+
+
+# Campos numéricos: ausentes valem 0, como na auditoria individual
+CAMPOS_NUMERICOS = frozenset(('consumo_kwh', 'valor_total', 'valor_energia', 'valor_bandeira', 'icms', 'pis', 'cofins'))
+
+
+def colunas_de_registros(registros: Iterable[RegistroConta],
+                         campos: Tuple[str, ...] = CAMPOS_CONTA) -> Dict[str, List[Any]]:
+    """Converte registros de contas em colunas (formato aceito por RegrasAuditoria.auditar_lote)"""
+    colunas: Dict[str, List[Any]] = {campo: [] for campo in campos}
+    presentes = set()
+    for registro in registros:
+        for campo in campos:
+            valor = registro.get(campo, AUSENTE)
+            if valor is AUSENTE:
+                if campo in CAMPOS_NUMERICOS:
+                    valor = 0
+                elif campo == 'historico_consumo':
+                    valor = None
+            else:
+                presentes.add(campo)
+            colunas[campo].append(valor)
+    # Colunas ausentes em todos os registros são omitidas para que valham os padrões das regras
+    return {campo: valores for campo, valores in colunas.items() if campo in presentes}
@@ -3,14 +3,46 @@ Módulo de regras de auditoria para contas de energia elétrica
 Baseado na Resolução Normativa ANEEL nº 1.000/2021 e legislação aplicável
 """
 
+import hashlib
 import re
+import time
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+from src.tarifas import TabelaTarifas, competencia_de
+from src.metricas import metricas
+from src.historico_consumo import ResumoConsumo
+from src.registro_regras import ContaNormalizada, Regra, RegistroRegras, registro_regras
+from src.registros import (
+    AUSENTE, IrregularidadeDicionario, ResultadoAuditoria, CLASSIFICACAO_INCORRETA, CALCULO_INCORRETO,
+    DADOS_INCONSISTENTES, DISPONIBILIDADE_INCORRETA, BANDEIRA_INCORRETA, ICMS_INCORRETO,
+    CONSUMO_ACIMA_MEDIA, CONSUMO_ABAIXO_MEDIA, CONSUMO_ACIMA_HISTORICO, CONSUMO_ABAIXO_HISTORICO
+)
+
+# NumPy é necessário apenas para a auditoria vetorizada em lote
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Versão das regras; deve ser alterada sempre que a lógica de auditoria mudar,
+# pois compõe a chave dos resultados armazenados em cache
+VERSAO_REGRAS = '1.2.0'
+
+# Detecção de consumo anômalo pelo histórico da unidade consumidora: meses mínimos
+# de histórico, desvios-padrão e variação relativa a partir dos quais o consumo é anômalo
+HISTORICO_MESES_MINIMOS = 12
+HISTORICO_LIMITE_DESVIOS = 3.0
+HISTORICO_VARIACAO_MINIMA = 0.3
+
+# Limite de sequências de regras memorizadas (uma por combinação de subgrupo)
+MAX_PIPELINES = 1024
 
 class RegrasAuditoria:
     """Classe que implementa as regras de auditoria para contas de energia elétrica"""
     
-    def __init__(self):
+    def __init__(self, tabela_tarifas: Optional[TabelaTarifas] = None,
+                 registro: Optional[RegistroRegras] = None):
         # Tarifas de referência (valores exemplo - devem ser atualizados com dados reais)
         self.tarifas_grupo_b = {
             'B1': {'TUSD': 0.27440, 'TE': 0.25141},  # Residencial
@@ -43,6 +75,91 @@ class RegrasAuditoria:
             'PIS': {'aliquota': 0.0165, 'base_calculo': 'energia_consumida'},  # 1,65%
             'COFINS': {'aliquota': 0.076, 'base_calculo': 'energia_consumida'},  # 7,6%
         }
+        
+        # Tabela por distribuidora e vigência; os valores acima valem como referência
+        # para distribuidoras e períodos sem registro próprio
+        self.tabela_tarifas = tabela_tarifas or TabelaTarifas.de_valores_padrao(
+            self.tarifas_grupo_b, self.bandeiras_tarifarias, self.impostos['ICMS']['aliquota']
+        )
+        
+        # Regras registradas e seleção feita pela configuração
+        self.registro = registro or registro_regras
+        self.regras_habilitadas: Optional[frozenset] = None
+        self.regras_desabilitadas: frozenset = frozenset()
+        self._estado_pipelines = None
+        self._regras_ativas: Tuple[Regra, ...] = ()
+        self._campos_dados: Tuple[str, ...] = ()
+        self._pipelines: Dict[tuple, Tuple[Regra, ...]] = {}
+        self._versao = ''
+
+    @property
+    def versao(self) -> str:
+        """Versão das regras combinada com a tabela de tarifas carregada e as regras ativas"""
+        self._preparar_regras()
+        return self._versao
+
+    @property
+    def campos_dados(self) -> Tuple[str, ...]:
+        """Campos de conta.dados lidos pelas regras ativas (entram na chave do cache de resultados)"""
+        self._preparar_regras()
+        return self._campos_dados
+
+    def configurar_regras(self, habilitadas: Optional[Iterable[str]] = None,
+                          desabilitadas: Iterable[str] = ()):
+        """Seleciona as regras aplicadas: apenas as habilitadas (todas se None), exceto as desabilitadas"""
+        habilitadas = frozenset(habilitadas) if habilitadas is not None else None
+        desabilitadas = frozenset(desabilitadas)
+        desconhecidas = ((habilitadas or frozenset()) | desabilitadas) - set(self.registro.nomes())
+        if desconhecidas:
+            raise ValueError(f"Regras desconhecidas: {', '.join(sorted(desconhecidas))}")
+        self.regras_habilitadas = habilitadas
+        self.regras_desabilitadas = desabilitadas
+        self._estado_pipelines = None
+
+    def regras_ativas(self) -> List[Regra]:
+        """Regras registradas e habilitadas, na ordem do relatório"""
+        return [
+            regra for regra in self.registro.regras()
+            if (self.regras_habilitadas is None or regra.nome in self.regras_habilitadas)
+            and regra.nome not in self.regras_desabilitadas
+        ]
+
+    def _preparar_regras(self):
+        """Recalcula as regras ativas e a versão quando o registro, a configuração ou as tarifas mudam"""
+        estado = (self.registro.geracao, self.tabela_tarifas.versao)
+        if estado != self._estado_pipelines:
+            self._regras_ativas = tuple(self.regras_ativas())
+            self._campos_dados = tuple(sorted({campo for regra in self._regras_ativas for campo in regra.campos_dados}))
+            self._pipelines = {}
+            ativas = ','.join(regra.nome for regra in self._regras_ativas)
+            assinatura = hashlib.sha256(ativas.encode('utf-8')).hexdigest()[:8]
+            self._versao = f"{VERSAO_REGRAS}+{self.tabela_tarifas.versao}+{assinatura}"
+            self._estado_pipelines = estado
+
+    def _pipeline(self, conta: ContaNormalizada) -> Tuple[Regra, ...]:
+        """Regras que podem gerar irregularidades para o subgrupo da conta"""
+        if conta.erros:
+            # Campos com tipo inválido: todas as regras rodam para reportar o erro como antes
+            return self._regras_ativas
+        chave = (conta.subgrupo_informado, conta.subgrupo)
+        try:
+            return self._pipelines[chave]
+        except KeyError:
+            pass
+        except TypeError:
+            return self._regras_ativas
+        pipeline = tuple(
+            regra for regra in self._regras_ativas
+            if regra.aplica_se is None or regra.aplica_se(self, *chave)
+        )
+        if len(self._pipelines) >= MAX_PIPELINES:
+            self._pipelines = {}
+        self._pipelines[chave] = pipeline
+        return pipeline
+
+    def carregar_tarifas(self, caminho: str):
+        """Carrega uma nova tabela de tarifas (JSON ou SQLite), invalidando o cache de consultas"""
+        self.tabela_tarifas.carregar_arquivo(caminho)
 
     def auditar_conta(self, dados_conta: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -67,23 +184,16 @@ class RegrasAuditoria:
         }
         
         try:
-            # Verificar classificação tarifária
-            irregularidades.extend(self._verificar_classificacao_tarifaria(dados_conta))
-            
-            # Verificar cálculo de consumo
-            irregularidades.extend(self._verificar_calculo_consumo(dados_conta))
-            
-            # Verificar custo de disponibilidade
-            irregularidades.extend(self._verificar_custo_disponibilidade(dados_conta))
-            
-            # Verificar bandeira tarifária
-            irregularidades.extend(self._verificar_bandeira_tarifaria(dados_conta))
-            
-            # Verificar impostos
-            irregularidades.extend(self._verificar_impostos(dados_conta))
-            
-            # Verificar histórico de consumo
-            irregularidades.extend(self._verificar_historico_consumo(dados_conta))
+            # Campos convertidos uma vez; cada regra aplicável registra duração e achados
+            self._preparar_regras()
+            conta = ContaNormalizada(dados_conta)
+            pipeline = self._pipeline(conta)
+            if metricas.habilitado:
+                for regra in pipeline:
+                    irregularidades.extend(self._verificar_com_metricas(regra, conta))
+            else:
+                for regra in pipeline:
+                    irregularidades.extend(regra.verificar(self, conta))
             
             # Calcular impacto financeiro total
             impacto_total = sum(irreg.get('impacto_financeiro', 0) for irreg in irregularidades)
@@ -100,38 +210,45 @@ class RegrasAuditoria:
             
         return resultado
 
-    def _verificar_classificacao_tarifaria(self, dados_conta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _verificar_com_metricas(self, regra: Regra, conta: ContaNormalizada) -> List[Dict[str, Any]]:
+        """Executa a regra registrando duração, avaliação e irregularidades encontradas"""
+        duracao, avaliacoes, achados = regra.metricas
+        inicio = time.perf_counter()
+        encontradas = regra.verificar(self, conta)
+        duracao.observar(time.perf_counter() - inicio)
+        avaliacoes.inc()
+        if encontradas:
+            achados.inc(len(encontradas))
+        return encontradas
+
+    def _verificar_classificacao_tarifaria(self, conta: ContaNormalizada) -> List[Dict[str, Any]]:
         """Verifica se a classificação tarifária está correta"""
         irregularidades = []
         
-        subgrupo = dados_conta.get('subgrupo', '').upper()
-        tipo_consumidor = dados_conta.get('tipo_consumidor', '').lower()
+        subgrupo = conta.texto('subgrupo_informado')
+        tipo_consumidor = conta.texto('tipo_consumidor')
         
         # Verificar se órgão público está classificado corretamente
         if 'público' in tipo_consumidor or 'governo' in tipo_consumidor:
             if subgrupo not in ['B3', 'B4A']:
-                irregularidades.append({
-                    'tipo': 'Classificação Tarifária Incorreta',
-                    'descricao': f'Órgão público classificado como {subgrupo}, deveria ser B3 ou B4A',
-                    'severidade': 'Alta',
-                    'impacto_financeiro': 0.0,
-                    'recomendacao': 'Solicitar reclassificação para subgrupo adequado'
-                })
+                irregularidades.append(CLASSIFICACAO_INCORRETA.criar(0.0, subgrupo).to_dict())
         
         return irregularidades
 
-    def _verificar_calculo_consumo(self, dados_conta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _verificar_calculo_consumo(self, conta: ContaNormalizada) -> List[Dict[str, Any]]:
         """Verifica se o cálculo do consumo está correto"""
         irregularidades = []
         
         try:
-            consumo_kwh = float(dados_conta.get('consumo_kwh', 0))
-            valor_energia = float(dados_conta.get('valor_energia', 0))
-            subgrupo = dados_conta.get('subgrupo', 'B3')
+            consumo_kwh = conta.consumo_kwh
+            valor_energia = conta.valor_energia
+            if consumo_kwh is None or valor_energia is None:
+                raise ValueError('consumo ou valor de energia inválido')
+            tarifa = self.tabela_tarifas.tarifa(conta.distribuidora, conta.subgrupo, conta.competencia)
             
-            if subgrupo in self.tarifas_grupo_b:
-                tarifa_te = self.tarifas_grupo_b[subgrupo]['TE']
-                tarifa_tusd = self.tarifas_grupo_b[subgrupo]['TUSD']
+            if tarifa is not None:
+                tarifa_te = tarifa['TE']
+                tarifa_tusd = tarifa['TUSD']
                 
                 valor_esperado = consumo_kwh * (tarifa_te + tarifa_tusd)
                 diferenca = abs(valor_energia - valor_esperado)
@@ -140,149 +257,405 @@ class RegrasAuditoria:
                 tolerancia = valor_esperado * 0.05
                 
                 if diferenca > tolerancia:
-                    irregularidades.append({
-                        'tipo': 'Cálculo de Consumo Incorreto',
-                        'descricao': f'Valor cobrado: R$ {valor_energia:.2f}, Valor esperado: R$ {valor_esperado:.2f}',
-                        'severidade': 'Alta',
-                        'impacto_financeiro': diferenca,
-                        'recomendacao': 'Verificar aplicação das tarifas TE e TUSD'
-                    })
+                    irregularidades.append(
+                        CALCULO_INCORRETO.criar(diferenca, valor_energia, valor_esperado).to_dict()
+                    )
                     
         except (ValueError, TypeError):
-            irregularidades.append({
-                'tipo': 'Dados Inconsistentes',
-                'descricao': 'Não foi possível verificar o cálculo do consumo devido a dados inválidos',
-                'severidade': 'Média',
-                'impacto_financeiro': 0.0,
-                'recomendacao': 'Verificar dados da conta manualmente'
-            })
+            irregularidades.append(DADOS_INCONSISTENTES.criar(0.0).to_dict())
             
         return irregularidades
 
-    def _verificar_custo_disponibilidade(self, dados_conta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _verificar_custo_disponibilidade(self, conta: ContaNormalizada) -> List[Dict[str, Any]]:
         """Verifica se o custo de disponibilidade está sendo aplicado corretamente"""
         irregularidades = []
         
         try:
-            consumo_kwh = float(dados_conta.get('consumo_kwh', 0))
-            tipo_ligacao = dados_conta.get('tipo_ligacao', 'monofasico').lower()
+            consumo_kwh = conta.consumo_kwh
+            if consumo_kwh is None:
+                return irregularidades
+            tipo_ligacao = conta.texto('tipo_ligacao')
             
             if tipo_ligacao in self.custo_disponibilidade:
                 minimo_kwh = self.custo_disponibilidade[tipo_ligacao]
                 
                 if consumo_kwh < minimo_kwh:
                     # Deve ser cobrado o mínimo
-                    subgrupo = dados_conta.get('subgrupo', 'B3')
-                    if subgrupo in self.tarifas_grupo_b:
-                        tarifa_total = self.tarifas_grupo_b[subgrupo]['TE'] + self.tarifas_grupo_b[subgrupo]['TUSD']
+                    tarifa = self.tabela_tarifas.tarifa(conta.distribuidora, conta.subgrupo, conta.competencia)
+                    if tarifa is not None:
+                        tarifa_total = tarifa['TE'] + tarifa['TUSD']
                         valor_minimo_esperado = minimo_kwh * tarifa_total
-                        valor_cobrado = float(dados_conta.get('valor_energia', 0))
+                        valor_cobrado = conta.valor_energia
+                        if valor_cobrado is None:
+                            return irregularidades
                         
                         if abs(valor_cobrado - valor_minimo_esperado) > valor_minimo_esperado * 0.05:
-                            irregularidades.append({
-                                'tipo': 'Custo de Disponibilidade Incorreto',
-                                'descricao': f'Consumo {consumo_kwh} kWh abaixo do mínimo {minimo_kwh} kWh para {tipo_ligacao}',
-                                'severidade': 'Média',
-                                'impacto_financeiro': abs(valor_cobrado - valor_minimo_esperado),
-                                'recomendacao': f'Verificar aplicação do custo mínimo de {minimo_kwh} kWh'
-                            })
+                            irregularidades.append(DISPONIBILIDADE_INCORRETA.criar(
+                                abs(valor_cobrado - valor_minimo_esperado), consumo_kwh, minimo_kwh, tipo_ligacao
+                            ).to_dict())
                             
         except (ValueError, TypeError):
             pass
             
         return irregularidades
 
-    def _verificar_bandeira_tarifaria(self, dados_conta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _verificar_bandeira_tarifaria(self, conta: ContaNormalizada) -> List[Dict[str, Any]]:
         """Verifica se a bandeira tarifária está sendo aplicada corretamente"""
         irregularidades = []
         
         try:
-            bandeira = dados_conta.get('bandeira_tarifaria', '').lower()
-            consumo_kwh = float(dados_conta.get('consumo_kwh', 0))
-            valor_bandeira = float(dados_conta.get('valor_bandeira', 0))
+            bandeira = conta.texto('bandeira_tarifaria')
+            consumo_kwh = conta.consumo_kwh
+            valor_bandeira = conta.valor_bandeira
+            if consumo_kwh is None or valor_bandeira is None:
+                return irregularidades
             
-            if bandeira in self.bandeiras_tarifarias:
-                valor_esperado = consumo_kwh * self.bandeiras_tarifarias[bandeira]
+            valor_kwh_bandeira = self.tabela_tarifas.bandeira(bandeira, conta.competencia)
+            
+            if valor_kwh_bandeira is not None:
+                valor_esperado = consumo_kwh * valor_kwh_bandeira
                 diferenca = abs(valor_bandeira - valor_esperado)
                 
                 if diferenca > 0.01:  # Tolerância de R$ 0,01
-                    irregularidades.append({
-                        'tipo': 'Bandeira Tarifária Incorreta',
-                        'descricao': f'Valor bandeira {bandeira}: R$ {valor_bandeira:.2f}, esperado: R$ {valor_esperado:.2f}',
-                        'severidade': 'Média',
-                        'impacto_financeiro': diferenca,
-                        'recomendacao': 'Verificar aplicação da bandeira tarifária'
-                    })
+                    irregularidades.append(
+                        BANDEIRA_INCORRETA.criar(diferenca, bandeira, valor_bandeira, valor_esperado).to_dict()
+                    )
                     
         except (ValueError, TypeError):
             pass
             
         return irregularidades
 
-    def _verificar_impostos(self, dados_conta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _verificar_impostos(self, conta: ContaNormalizada) -> List[Dict[str, Any]]:
         """Verifica se os impostos estão sendo calculados corretamente"""
         irregularidades = []
         
         # Verificação básica de ICMS (implementação simplificada)
         try:
-            valor_total = float(dados_conta.get('valor_total', 0))
-            icms_cobrado = float(dados_conta.get('icms', 0))
+            valor_total = conta.valor_total
+            icms_cobrado = conta.icms
+            if valor_total is None or icms_cobrado is None:
+                return irregularidades
+            
+            # Alíquota vigente para a distribuidora no mês de referência
+            aliquota = self.tabela_tarifas.aliquota_icms(conta.distribuidora, conta.competencia)
+            if aliquota is None:
+                aliquota = self.impostos['ICMS']['aliquota']
             
             # ICMS é calculado sobre o valor total (incluindo ele mesmo)
             # Valor sem ICMS = Valor Total / (1 + alíquota)
-            valor_sem_icms = valor_total / (1 + self.impostos['ICMS']['aliquota'])
-            icms_esperado = valor_sem_icms * self.impostos['ICMS']['aliquota']
+            valor_sem_icms = valor_total / (1 + aliquota)
+            icms_esperado = valor_sem_icms * aliquota
             
             diferenca = abs(icms_cobrado - icms_esperado)
             
             if diferenca > valor_total * 0.01:  # Tolerância de 1%
-                irregularidades.append({
-                    'tipo': 'ICMS Incorreto',
-                    'descricao': f'ICMS cobrado: R$ {icms_cobrado:.2f}, esperado: R$ {icms_esperado:.2f}',
-                    'severidade': 'Alta',
-                    'impacto_financeiro': diferenca,
-                    'recomendacao': 'Verificar cálculo do ICMS'
-                })
+                irregularidades.append(ICMS_INCORRETO.criar(diferenca, icms_cobrado, icms_esperado).to_dict())
                 
         except (ValueError, TypeError):
             pass
             
         return irregularidades
 
-    def _verificar_historico_consumo(self, dados_conta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _verificar_historico_consumo(self, conta: ContaNormalizada) -> List[Dict[str, Any]]:
         """Verifica padrões anômalos no histórico de consumo"""
         irregularidades = []
         
-        try:
-            historico = dados_conta.get('historico_consumo', [])
-            if len(historico) >= 3:
-                consumos = [float(h) for h in historico[-3:]]  # Últimos 3 meses
-                media = sum(consumos) / len(consumos)
-                consumo_atual = consumos[-1]
-                
-                # Verificar variação superior a 50%
-                if consumo_atual > media * 1.5:
-                    irregularidades.append({
-                        'tipo': 'Consumo Anômalo',
-                        'descricao': f'Consumo atual ({consumo_atual} kWh) 50% acima da média ({media:.1f} kWh)',
-                        'severidade': 'Baixa',
-                        'impacto_financeiro': 0.0,
-                        'recomendacao': 'Verificar possível vazamento ou equipamento com defeito'
-                    })
-                elif consumo_atual < media * 0.5:
-                    irregularidades.append({
-                        'tipo': 'Consumo Anômalo',
-                        'descricao': f'Consumo atual ({consumo_atual} kWh) 50% abaixo da média ({media:.1f} kWh)',
-                        'severidade': 'Baixa',
-                        'impacto_financeiro': 0.0,
-                        'recomendacao': 'Verificar possível problema na medição'
-                    })
-                    
-        except (ValueError, TypeError):
-            pass
+        estatisticas = conta.estatisticas_consumo
+        if (estatisticas is not None and estatisticas.meses >= HISTORICO_MESES_MINIMOS
+                and conta.consumo_kwh is not None):
+            return self._verificar_estatisticas_consumo(conta.consumo_kwh, estatisticas)
+        
+        consumos = conta.historico_consumo  # Últimos 3 meses
+        if consumos is not None:
+            media = sum(consumos) / len(consumos)
+            consumo_atual = consumos[-1]
+            
+            # Verificar variação superior a 50%
+            if consumo_atual > media * 1.5:
+                irregularidades.append(CONSUMO_ACIMA_MEDIA.criar(0.0, consumo_atual, media).to_dict())
+            elif consumo_atual < media * 0.5:
+                irregularidades.append(CONSUMO_ABAIXO_MEDIA.criar(0.0, consumo_atual, media).to_dict())
             
         return irregularidades
 
+    def _verificar_estatisticas_consumo(self, consumo_atual: float, estatisticas: ResumoConsumo) -> List[Dict[str, Any]]:
+        """
+        Compara o consumo com a média do mesmo mês em anos anteriores (ou com a média
+        da janela, sem esse mês no histórico) usando o desvio-padrão da unidade consumidora
+        """
+        if estatisticas.media_sazonal is not None:
+            referencia, nome_referencia = estatisticas.media_sazonal, 'média do mesmo mês'
+        else:
+            referencia, nome_referencia = estatisticas.media, 'média mensal'
+        if referencia <= 0:
+            return []
+        
+        diferenca = consumo_atual - referencia
+        if abs(diferenca) < referencia * HISTORICO_VARIACAO_MINIMA:
+            return []
+        if abs(diferenca) < estatisticas.desvio * HISTORICO_LIMITE_DESVIOS:
+            return []
+        
+        modelo = CONSUMO_ACIMA_HISTORICO if diferenca > 0 else CONSUMO_ABAIXO_HISTORICO
+        return [modelo.criar(
+            0.0, consumo_atual, referencia, abs(diferenca) / referencia, nome_referencia, estatisticas.meses
+        ).to_dict()]
+
+    def auditar_lote(self, lote: Any, compacto: bool = False) -> List[Any]:
+        """
+        Audita várias contas de uma vez a partir de dados colunares
+        
+        Args:
+            lote: Dicionário de colunas (listas ou arrays NumPy) ou DataFrame com os
+                mesmos campos de dados_conta; historico_consumo pode ser uma matriz
+                (contas x meses, com NaN para meses ausentes) ou uma coluna de listas;
+                estatisticas_consumo não é considerada, vale sempre a regra dos 3 meses
+            compacto: Retorna ResultadoAuditoria com irregularidades em registros
+                compactos (descrições formatadas só em to_dict) em vez de dicionários
+            
+        Returns:
+            Lista com um resultado por conta, no mesmo formato de auditar_conta
+        """
+        avaliacao = self.avaliar_lote(lote)
+        total = avaliacao['total']
+        data_auditoria = datetime.now().isoformat()
+        
+        # Irregularidades de cada conta, na mesma ordem das verificações de auditar_conta
+        por_conta: Dict[int, List[Any]] = {}
+        # Regras sem versão vetorizada (plug-ins) rodam conta a conta sobre contas normalizadas
+        contas: Optional[List[ContaNormalizada]] = None
+        falhas: Dict[int, Tuple[str, int]] = {}
+        for regra in self.regras_ativas():
+            _, avaliacoes, achados = regra.metricas
+            if regra.verificar_lote is not None:
+                encontradas = 0
+                for indice, irregularidade in regra.verificar_lote(self, avaliacao):
+                    por_conta.setdefault(indice, []).append(irregularidade)
+                    encontradas += 1
+                avaliacoes.inc(total)
+                achados.inc(encontradas)
+                continue
+            
+            if contas is None:
+                self._preparar_regras()
+                contas = [ContaNormalizada(dados) for dados in _ColunasLote(lote).registros()]
+            avaliadas = encontradas = 0
+            for indice, conta in enumerate(contas):
+                if indice in falhas or regra not in self._pipeline(conta):
+                    continue
+                avaliadas += 1
+                try:
+                    irregularidades = regra.verificar(self, conta)
+                except Exception as e:
+                    # Como em auditar_conta: a conta fica com as irregularidades anteriores e o erro
+                    falhas[indice] = (f"Erro durante auditoria: {str(e)}", len(por_conta.get(indice, ())))
+                    continue
+                if irregularidades:
+                    por_conta.setdefault(indice, []).extend(
+                        IrregularidadeDicionario(irregularidade) for irregularidade in irregularidades
+                    )
+                    encontradas += len(irregularidades)
+            avaliacoes.inc(avaliadas)
+            achados.inc(encontradas)
+        
+        # Contas conformes compartilham o mesmo resultado compacto
+        conforme = ResultadoAuditoria(data_auditoria)
+        resultados = [
+            ResultadoAuditoria(data_auditoria, por_conta[indice]) if indice in por_conta else conforme
+            for indice in range(total)
+        ]
+        for indice, (erro, anteriores) in falhas.items():
+            resultados[indice] = ResultadoAuditoria(
+                data_auditoria, por_conta.get(indice, [])[:anteriores], erro=erro
+            )
+        if compacto:
+            return resultados
+        return [resultado.to_dict() for resultado in resultados]
+
+    def avaliar_lote(self, lote: Any) -> Dict[str, Any]:
+        """
+        Avalia todas as regras como operações vetoriais sobre o lote
+        Retorna as máscaras de irregularidade e os valores calculados de cada regra
+        """
+        if np is None:
+            raise RuntimeError('NumPy é necessário para a auditoria em lote')
+        
+        colunas = _ColunasLote(lote)
+        total = colunas.total
+        
+        consumo, consumo_invalido = colunas.numerica('consumo_kwh')
+        valor_energia, valor_energia_invalido = colunas.numerica('valor_energia')
+        valor_bandeira, valor_bandeira_invalido = colunas.numerica('valor_bandeira')
+        valor_total, valor_total_invalido = colunas.numerica('valor_total')
+        icms, icms_invalido = colunas.numerica('icms')
+        
+        # Colunas de texto são fatoradas uma vez; as regras trabalham com os valores distintos
+        subgrupo = colunas.categorias('subgrupo', 'B3')
+        tipo_ligacao = colunas.categorias('tipo_ligacao', 'monofasico').aplicar(str.lower)
+        bandeira = colunas.categorias('bandeira_tarifaria', '').aplicar(str.lower)
+        
+        avaliacao: Dict[str, Any] = {
+            'total': total, 'consumo': consumo, 'valor_energia': valor_energia,
+            'valor_bandeira': valor_bandeira, 'valor_total': valor_total, 'icms': icms,
+            'tipo_ligacao': tipo_ligacao, 'bandeira': bandeira
+        }
+        
+        # Classificação tarifária
+        orgao_publico = colunas.categorias('tipo_consumidor', '').mapear(
+            lambda tipo: 'público' in tipo.lower() or 'governo' in tipo.lower()
+        ).astype(bool)
+        subgrupo_informado = colunas.categorias('subgrupo', '').aplicar(str.upper)
+        avaliacao['subgrupo_informado'] = subgrupo_informado
+        avaliacao['classificacao'] = orgao_publico & ~subgrupo_informado.mapear(
+            lambda nome: nome in ('B3', 'B4A')
+        ).astype(bool)
+        
+        # Tarifas vigentes: uma consulta por combinação distinta de distribuidora,
+        # competência e subgrupo (NaN quando não há tarifa cadastrada)
+        distribuidora = colunas.categorias('distribuidora', '')
+        competencia = colunas.categorias('mes_referencia', '').aplicar(competencia_de)
+        
+        def tarifa_total_vigente(nome_distribuidora, nome_competencia, nome_subgrupo):
+            tarifa = self.tabela_tarifas.tarifa(nome_distribuidora, nome_subgrupo, nome_competencia)
+            return tarifa['TE'] + tarifa['TUSD'] if tarifa is not None else np.nan
+        
+        tarifa_total = _combinar(distribuidora, competencia, subgrupo).mapear(
+            lambda chave: tarifa_total_vigente(*chave)
+        )
+        tem_tarifa = ~np.isnan(tarifa_total)
+        
+        # Cálculo do consumo
+        dados_invalidos = consumo_invalido | valor_energia_invalido
+        esperado = consumo * tarifa_total
+        diferenca = np.abs(valor_energia - esperado)
+        avaliacao['calculo_invalido'] = dados_invalidos
+        avaliacao['calculo'] = ~dados_invalidos & tem_tarifa & (diferenca > esperado * 0.05)
+        avaliacao['calculo_esperado'] = esperado
+        avaliacao['calculo_diferenca'] = diferenca
+        
+        # Custo de disponibilidade
+        minimo = tipo_ligacao.mapear(lambda tipo: self.custo_disponibilidade.get(tipo, np.nan))
+        minimo_esperado = minimo * tarifa_total
+        diferenca_minimo = np.abs(valor_energia - minimo_esperado)
+        avaliacao['disponibilidade'] = (
+            ~dados_invalidos & ~np.isnan(minimo) & (consumo < minimo) & tem_tarifa &
+            (diferenca_minimo > minimo_esperado * 0.05)
+        )
+        avaliacao['disponibilidade_minimo'] = minimo
+        avaliacao['disponibilidade_diferenca'] = diferenca_minimo
+        
+        # Bandeira tarifária
+        def valor_bandeira_vigente(nome_bandeira, nome_competencia):
+            valor = self.tabela_tarifas.bandeira(nome_bandeira, nome_competencia)
+            return valor if valor is not None else np.nan
+        
+        valor_kwh_bandeira = _combinar(bandeira, competencia).mapear(
+            lambda chave: valor_bandeira_vigente(*chave)
+        )
+        esperado_bandeira = consumo * valor_kwh_bandeira
+        diferenca_bandeira = np.abs(valor_bandeira - esperado_bandeira)
+        avaliacao['bandeira_irregular'] = (
+            ~consumo_invalido & ~valor_bandeira_invalido & ~np.isnan(valor_kwh_bandeira) &
+            (diferenca_bandeira > 0.01)
+        )
+        avaliacao['bandeira_esperado'] = esperado_bandeira
+        avaliacao['bandeira_diferenca'] = diferenca_bandeira
+        
+        # Impostos (ICMS)
+        def aliquota_vigente(nome_distribuidora, nome_competencia):
+            aliquota = self.tabela_tarifas.aliquota_icms(nome_distribuidora, nome_competencia)
+            return aliquota if aliquota is not None else self.impostos['ICMS']['aliquota']
+        
+        aliquota = _combinar(distribuidora, competencia).mapear(lambda chave: aliquota_vigente(*chave))
+        icms_esperado = valor_total / (1 + aliquota) * aliquota
+        diferenca_icms = np.abs(icms - icms_esperado)
+        avaliacao['impostos'] = (
+            ~valor_total_invalido & ~icms_invalido & (diferenca_icms > valor_total * 0.01)
+        )
+        avaliacao['icms_esperado'] = icms_esperado
+        avaliacao['icms_diferenca'] = diferenca_icms
+        
+        # Histórico de consumo (últimos 3 meses)
+        historico = colunas.historico('historico_consumo', 3)
+        valido = ~np.isnan(historico).any(axis=1)
+        media = (historico[:, 0] + historico[:, 1] + historico[:, 2]) / 3
+        atual = historico[:, 2]
+        avaliacao['historico_acima'] = valido & (atual > media * 1.5)
+        avaliacao['historico_abaixo'] = valido & ~(atual > media * 1.5) & (atual < media * 0.5)
+        avaliacao['historico_media'] = media
+        avaliacao['historico_atual'] = atual
+        
+        return avaliacao
+
+    def _irregularidades_lote_classificacao(self, avaliacao):
+        indices = np.flatnonzero(avaliacao['classificacao'])
+        subgrupos = avaliacao['subgrupo_informado'].decodificar(indices)
+        for indice, subgrupo in zip(indices.tolist(), subgrupos):
+            yield indice, CLASSIFICACAO_INCORRETA.criar(0.0, subgrupo)
+
+    def _irregularidades_lote_calculo(self, avaliacao):
+        indices = np.flatnonzero(avaliacao['calculo'] | avaliacao['calculo_invalido'])
+        colunas = zip(
+            indices.tolist(),
+            avaliacao['calculo_invalido'][indices].tolist(),
+            avaliacao['valor_energia'][indices].tolist(),
+            avaliacao['calculo_esperado'][indices].tolist(),
+            avaliacao['calculo_diferenca'][indices].tolist()
+        )
+        for indice, invalido, valor_energia, valor_esperado, diferenca in colunas:
+            if invalido:
+                yield indice, DADOS_INCONSISTENTES.criar(0.0)
+                continue
+            yield indice, CALCULO_INCORRETO.criar(diferenca, valor_energia, valor_esperado)
+
+    def _irregularidades_lote_disponibilidade(self, avaliacao):
+        indices = np.flatnonzero(avaliacao['disponibilidade'])
+        colunas = zip(
+            indices.tolist(),
+            avaliacao['consumo'][indices].tolist(),
+            avaliacao['disponibilidade_minimo'][indices].astype(int).tolist(),
+            avaliacao['tipo_ligacao'].decodificar(indices),
+            avaliacao['disponibilidade_diferenca'][indices].tolist()
+        )
+        for indice, consumo_kwh, minimo_kwh, tipo_ligacao, diferenca in colunas:
+            yield indice, DISPONIBILIDADE_INCORRETA.criar(diferenca, consumo_kwh, minimo_kwh, tipo_ligacao)
+
+    def _irregularidades_lote_bandeira(self, avaliacao):
+        indices = np.flatnonzero(avaliacao['bandeira_irregular'])
+        colunas = zip(
+            indices.tolist(),
+            avaliacao['bandeira'].decodificar(indices),
+            avaliacao['valor_bandeira'][indices].tolist(),
+            avaliacao['bandeira_esperado'][indices].tolist(),
+            avaliacao['bandeira_diferenca'][indices].tolist()
+        )
+        for indice, bandeira, valor_bandeira, valor_esperado, diferenca in colunas:
+            yield indice, BANDEIRA_INCORRETA.criar(diferenca, bandeira, valor_bandeira, valor_esperado)
+
+    def _irregularidades_lote_impostos(self, avaliacao):
+        indices = np.flatnonzero(avaliacao['impostos'])
+        colunas = zip(
+            indices.tolist(),
+            avaliacao['icms'][indices].tolist(),
+            avaliacao['icms_esperado'][indices].tolist(),
+            avaliacao['icms_diferenca'][indices].tolist()
+        )
+        for indice, icms_cobrado, icms_esperado, diferenca in colunas:
+            yield indice, ICMS_INCORRETO.criar(diferenca, icms_cobrado, icms_esperado)
+
+    def _irregularidades_lote_historico(self, avaliacao):
+        indices = np.flatnonzero(avaliacao['historico_acima'] | avaliacao['historico_abaixo'])
+        colunas = zip(
+            indices.tolist(),
+            avaliacao['historico_acima'][indices].tolist(),
+            avaliacao['historico_atual'][indices].tolist(),
+            avaliacao['historico_media'][indices].tolist()
+        )
+        for indice, acima, consumo_atual, media in colunas:
+            modelo = CONSUMO_ACIMA_MEDIA if acima else CONSUMO_ABAIXO_MEDIA
+            yield indice, modelo.criar(0.0, consumo_atual, media)
+
     def gerar_recomendacoes(self, dados_conta: Dict[str, Any]) -> List[str]:
         """Gera recomendações para otimização do consumo"""
         recomendacoes = []
@@ -313,3 +686,184 @@ class RegrasAuditoria:
             
         return recomendacoes
 
+
+# Regras nativas; a ordem define a sequência das irregularidades no relatório
+registro_regras.registrar(Regra(
+    'classificacao', RegrasAuditoria._verificar_classificacao_tarifaria,
+    campos=('subgrupo_informado', 'tipo_consumidor'),
+    # Só órgãos públicos fora de B3/B4A geram irregularidade
+    aplica_se=lambda regras, subgrupo_informado, subgrupo: subgrupo_informado not in ('B3', 'B4A'),
+    ordem=10, verificar_lote=RegrasAuditoria._irregularidades_lote_classificacao
+))
+registro_regras.registrar(Regra(
+    'calculo', RegrasAuditoria._verificar_calculo_consumo,
+    campos=('consumo_kwh', 'valor_energia', 'subgrupo', 'distribuidora', 'competencia'),
+    ordem=20, verificar_lote=RegrasAuditoria._irregularidades_lote_calculo
+))
+registro_regras.registrar(Regra(
+    'disponibilidade', RegrasAuditoria._verificar_custo_disponibilidade,
+    campos=('consumo_kwh', 'tipo_ligacao', 'valor_energia', 'subgrupo', 'distribuidora', 'competencia'),
+    # Sem tarifa para o subgrupo não há valor mínimo a comparar
+    aplica_se=lambda regras, subgrupo_informado, subgrupo: subgrupo in regras.tabela_tarifas.subgrupos(),
+    ordem=30, verificar_lote=RegrasAuditoria._irregularidades_lote_disponibilidade
+))
+registro_regras.registrar(Regra(
+    'bandeira', RegrasAuditoria._verificar_bandeira_tarifaria,
+    campos=('bandeira_tarifaria', 'consumo_kwh', 'valor_bandeira', 'competencia'),
+    ordem=40, verificar_lote=RegrasAuditoria._irregularidades_lote_bandeira
+))
+registro_regras.registrar(Regra(
+    'impostos', RegrasAuditoria._verificar_impostos,
+    campos=('valor_total', 'icms', 'distribuidora', 'competencia'),
+    ordem=50, verificar_lote=RegrasAuditoria._irregularidades_lote_impostos
+))
+registro_regras.registrar(Regra(
+    'historico', RegrasAuditoria._verificar_historico_consumo,
+    campos=('historico_consumo', 'estatisticas_consumo', 'consumo_kwh'),
+    ordem=60, verificar_lote=RegrasAuditoria._irregularidades_lote_historico
+))
+
+
+class _ColunasLote:
+    """Acesso uniforme às colunas de um lote (dicionário de colunas ou DataFrame)"""
+
+    def __init__(self, lote: Any):
+        self.lote = lote
+        if hasattr(lote, 'columns'):
+            self.nomes = set(lote.columns)
+            self.total = len(lote)
+        else:
+            self.nomes = set(lote)
+            self.total = max((len(coluna) for coluna in lote.values()), default=0)
+        self._categorias: Dict[tuple, '_Categorias'] = {}
+
+    def _coluna(self, nome: str) -> Any:
+        coluna = self.lote[nome]
+        return coluna.to_numpy() if hasattr(coluna, 'to_numpy') else coluna
+
+    def numerica(self, nome: str):
+        """Retorna (valores float, máscara de valores inválidos); ausente vale 0"""
+        if nome not in self.nomes:
+            return np.zeros(self.total), np.zeros(self.total, dtype=bool)
+        
+        coluna = self._coluna(nome)
+        if isinstance(coluna, np.ndarray) and coluna.dtype.kind in 'fiub':
+            return coluna.astype(float, copy=False), np.zeros(self.total, dtype=bool)
+        
+        # Conversão elemento a elemento, como float() na auditoria individual
+        # (None, por exemplo, é inválido para float() mas viraria NaN no NumPy)
+        valores = np.zeros(self.total)
+        invalidos = np.zeros(self.total, dtype=bool)
+        for indice, valor in enumerate(coluna):
+            try:
+                valores[indice] = float(valor)
+            except (ValueError, TypeError):
+                invalidos[indice] = True
+        return valores, invalidos
+
+    def categorias(self, nome: str, padrao: str) -> '_Categorias':
+        """Fatora uma coluna de texto em valores distintos e códigos; ausente (coluna ou AUSENTE) vale o padrão"""
+        if nome not in self.nomes:
+            return _Categorias([padrao], np.zeros(self.total, dtype=np.intp))
+        
+        chave = (nome, padrao)
+        if chave not in self._categorias:
+            coluna = self._coluna(nome)
+            if isinstance(coluna, np.ndarray) and coluna.dtype.kind == 'U':
+                valores, codigos = np.unique(coluna, return_inverse=True)
+                valores = valores.tolist()
+            else:
+                indices: Dict[str, int] = {}
+                codigos = np.fromiter(
+                    (indices.setdefault(
+                        padrao if valor is AUSENTE else '' if valor is None else str(valor), len(indices)
+                    ) for valor in coluna),
+                    dtype=np.intp, count=self.total
+                )
+                valores = list(indices)
+            self._categorias[chave] = _Categorias(valores, codigos.reshape(-1))
+        return self._categorias[chave]
+
+    def registros(self) -> Iterable[Dict[str, Any]]:
+        """Dados de cada conta no formato de dados_conta; campos ausentes ficam de fora"""
+        colunas = {nome: self._coluna(nome) for nome in self.nomes}
+        for indice in range(self.total):
+            dados = {}
+            for nome, coluna in colunas.items():
+                valor = coluna[indice]
+                if valor is AUSENTE:
+                    continue
+                if isinstance(valor, np.ndarray):
+                    # Linha da matriz de histórico: meses ausentes (NaN) ficam de fora
+                    valor = [float(mes) for mes in valor if not np.isnan(mes)]
+                elif isinstance(valor, np.generic):
+                    valor = valor.item()
+                dados[nome] = valor
+            yield dados
+
+    def historico(self, nome: str, meses: int):
+        """Matriz (contas x meses) com os últimos meses do histórico; NaN se insuficiente"""
+        if nome not in self.nomes:
+            return np.full((self.total, meses), np.nan)
+        
+        coluna = self._coluna(nome)
+        if isinstance(coluna, np.ndarray) and coluna.ndim == 2 and coluna.dtype != object:
+            matriz = np.asarray(coluna, dtype=float)
+            if matriz.shape[1] < meses:
+                return np.full((self.total, meses), np.nan)
+            return matriz[:, -meses:]
+        
+        matriz = np.full((self.total, meses), np.nan)
+        for indice, historico in enumerate(coluna):
+            if historico is not None and len(historico) >= meses:
+                try:
+                    matriz[indice] = [float(valor) for valor in historico[-meses:]]
+                except (ValueError, TypeError):
+                    pass
+        return matriz
+
+
+class _Categorias:
+    """Coluna de texto fatorada: valores distintos e o código de cada conta"""
+
+    __slots__ = ('valores', 'codigos')
+
+    def __init__(self, valores: List[str], codigos):
+        self.valores = valores
+        self.codigos = codigos
+
+    def aplicar(self, funcao) -> '_Categorias':
+        """Transforma os valores distintos (ex.: str.lower), preservando os códigos"""
+        valores: Dict[str, int] = {}
+        novos_codigos = np.array(
+            [valores.setdefault(funcao(valor), len(valores)) for valor in self.valores],
+            dtype=np.intp
+        )
+        return _Categorias(list(valores), novos_codigos[self.codigos] if len(novos_codigos) else self.codigos)
+
+    def mapear(self, funcao):
+        """Array com funcao(valor) para cada conta, calculada uma vez por valor distinto"""
+        if not self.valores:
+            return np.zeros(len(self.codigos))
+        return np.array([funcao(valor) for valor in self.valores], dtype=float)[self.codigos]
+
+    def decodificar(self, indices) -> List[str]:
+        return [self.valores[codigo] for codigo in self.codigos[indices].tolist()]
+
+
+def _combinar(*categorias: _Categorias) -> _Categorias:
+    """Combina colunas fatoradas em uma única, cujos valores são tuplas"""
+    codigos = np.zeros(len(categorias[0].codigos), dtype=np.int64)
+    for categoria in categorias:
+        codigos = codigos * max(len(categoria.valores), 1) + categoria.codigos
+    unicos, inverso = np.unique(codigos, return_inverse=True)
+    
+    valores = []
+    for codigo in unicos.tolist():
+        chave = []
+        for categoria in reversed(categorias):
+            tamanho = max(len(categoria.valores), 1)
+            codigo, posicao = divmod(codigo, tamanho)
+            chave.append(categoria.valores[posicao])
+        valores.append(tuple(reversed(chave)))
+    return _Categorias(valores, inverso.reshape(-1))
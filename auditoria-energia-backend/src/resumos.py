@@ -0,0 +1,235 @@
+"""
+Módulo dos resumos mensais mantidos junto com as auditorias
+Cada auditoria registrada soma seus totais às linhas de resumo na mesma transação,
+para que relatórios e painéis leiam apenas os resumos e não as auditorias.
+Como na análise de anomalias, vale só a auditoria mais recente de cada unidade e
+competência: a reauditoria de uma conta subtrai a auditoria que ela substitui.
+Campos ausentes entram nas chaves como ''
+"""
+
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.sqlite import insert
+
+from src.models.user import db
+from src.models.resumo import ResumoMensalInstalacao, ResumoMensal, ResumoMensalIrregularidade
+
+NAO_CONFORME = 'Não Conforme'
+
+# Resumos mantidos: modelo, colunas da chave e colunas somadas
+RESUMOS = (
+    (ResumoMensalInstalacao, ('distribuidora', 'numero_instalacao', 'competencia'),
+     ('auditorias', 'nao_conformes', 'irregularidades', 'impacto_financeiro')),
+    (ResumoMensal, ('competencia', 'distribuidora', 'subgrupo'),
+     ('auditorias', 'nao_conformes', 'irregularidades', 'impacto_financeiro')),
+    (ResumoMensalIrregularidade, ('competencia', 'distribuidora', 'subgrupo', 'tipo'),
+     ('quantidade', 'impacto_financeiro')),
+)
+
+# Unidades consultadas por instrução ao buscar as auditorias substituídas (limite de parâmetros do SQLite)
+INSTALACOES_POR_CONSULTA = 500
+
+# Auditorias vigentes: sem reauditoria posterior da mesma unidade e competência (anomalias_portfolio)
+_VIGENTE = (
+    "NOT EXISTS (SELECT 1 FROM auditoria b WHERE b.numero_instalacao = a.numero_instalacao "
+    "AND +b.competencia IS a.competencia AND b.id > a.id)"
+)
+
+# Recalculo de cada resumo a partir das auditorias vigentes (mesma ordem de RESUMOS)
+_RECONSTRUCAO = (
+    "INSERT INTO resumo_mensal_instalacao "
+    "(distribuidora, numero_instalacao, competencia, auditorias, nao_conformes, irregularidades, impacto_financeiro) "
+    "SELECT COALESCE(distribuidora, ''), COALESCE(numero_instalacao, ''), COALESCE(competencia, ''), "
+    "COUNT(*), SUM(status_geral = :nao_conforme), SUM(total_irregularidades), SUM(impacto_financeiro) "
+    f"FROM auditoria a WHERE {_VIGENTE} GROUP BY 1, 2, 3",
+
+    "INSERT INTO resumo_mensal "
+    "(competencia, distribuidora, subgrupo, auditorias, nao_conformes, irregularidades, impacto_financeiro) "
+    "SELECT COALESCE(competencia, ''), COALESCE(distribuidora, ''), COALESCE(subgrupo, ''), "
+    "COUNT(*), SUM(status_geral = :nao_conforme), SUM(total_irregularidades), SUM(impacto_financeiro) "
+    f"FROM auditoria a WHERE {_VIGENTE} GROUP BY 1, 2, 3",
+
+    "INSERT INTO resumo_mensal_irregularidade "
+    "(competencia, distribuidora, subgrupo, tipo, quantidade, impacto_financeiro) "
+    "SELECT COALESCE(a.competencia, ''), COALESCE(a.distribuidora, ''), COALESCE(a.subgrupo, ''), i.tipo, "
+    "COUNT(*), SUM(i.impacto_financeiro) "
+    f"FROM irregularidade i JOIN auditoria a ON a.id = i.auditoria_id WHERE {_VIGENTE} GROUP BY 1, 2, 3, 4",
+)
+
+
+def _somar(modelo: Any, chaves: Tuple[str, ...], colunas: Tuple[str, ...],
+           totais: Dict[Tuple[Any, ...], List[Any]]):
+    """Insere as linhas novas e soma as existentes em uma única instrução"""
+    if not totais:
+        return
+    linhas = [dict(zip(chaves + colunas, chave + tuple(total))) for chave, total in totais.items()]
+    instrucao = insert(modelo)
+    db.session.execute(
+        instrucao.on_conflict_do_update(
+            index_elements=list(chaves),
+            set_={coluna: getattr(modelo, coluna) + getattr(instrucao.excluded, coluna) for coluna in colunas}
+        ),
+        linhas
+    )
+
+
+def _vigentes(auditorias: List[Any]) -> Dict[Tuple[str, Optional[str]], Any]:
+    """Auditoria vigente já gravada para cada unidade e competência das auditorias novas"""
+    # src.models.auditoria importa este módulo
+    from src.models.auditoria import Auditoria
+
+    instalacoes = sorted({auditoria.numero_instalacao for auditoria in auditorias if auditoria.numero_instalacao})
+    chaves = {(auditoria.numero_instalacao, auditoria.competencia) for auditoria in auditorias}
+    vigentes = {}
+    # As auditorias novas ainda não foram gravadas: a consulta vê só as anteriores
+    with db.session.no_autoflush:
+        for inicio in range(0, len(instalacoes), INSTALACOES_POR_CONSULTA):
+            consulta = db.select(Auditoria).where(
+                Auditoria.numero_instalacao.in_(instalacoes[inicio:inicio + INSTALACOES_POR_CONSULTA])
+            ).order_by(Auditoria.id)
+            for auditoria in db.session.scalars(consulta):
+                chave = (auditoria.numero_instalacao, auditoria.competencia)
+                if chave in chaves:
+                    vigentes[chave] = auditoria
+    return vigentes
+
+
+def atualizar_resumos(auditorias: Iterable[Any]):
+    """
+    Soma as auditorias aos resumos (chamada antes do commit que as grava)
+    A auditoria que cada uma substitui (mesma unidade e competência) é subtraída
+    """
+    auditorias = list(auditorias)
+    por_instalacao: Dict[Tuple[str, ...], List[Any]] = {}
+    por_subgrupo: Dict[Tuple[str, ...], List[Any]] = {}
+    por_tipo: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def acumular(auditoria, sinal):
+        competencia = auditoria.competencia or ''
+        distribuidora = auditoria.distribuidora or ''
+        subgrupo = auditoria.subgrupo or ''
+        valores = (
+            1, auditoria.status_geral == NAO_CONFORME,
+            auditoria.total_irregularidades or 0, auditoria.impacto_financeiro or 0.0
+        )
+        for totais, chave in ((por_instalacao, (distribuidora, auditoria.numero_instalacao or '', competencia)),
+                              (por_subgrupo, (competencia, distribuidora, subgrupo))):
+            total = totais.setdefault(chave, [0, 0, 0, 0.0])
+            for posicao, valor in enumerate(valores):
+                total[posicao] += sinal * valor
+        for irregularidade in auditoria.irregularidades:
+            total = por_tipo.setdefault((competencia, distribuidora, subgrupo, irregularidade.tipo), [0, 0.0])
+            total[0] += sinal
+            total[1] += sinal * (irregularidade.impacto_financeiro or 0.0)
+
+    vigentes = _vigentes(auditorias)
+    substituidas = 0
+    for auditoria in auditorias:
+        if auditoria.numero_instalacao:
+            chave = (auditoria.numero_instalacao, auditoria.competencia)
+            anterior = vigentes.get(chave)
+            if anterior is not None:
+                acumular(anterior, -1)
+                substituidas += 1
+            vigentes[chave] = auditoria
+        acumular(auditoria, 1)
+
+    for (modelo, chaves, colunas), totais in zip(RESUMOS, (por_instalacao, por_subgrupo, por_tipo)):
+        _somar(modelo, chaves, colunas, totais)
+        if substituidas:
+            # Linhas que ficaram só com auditorias substituídas
+            db.session.execute(db.delete(modelo).where(getattr(modelo, colunas[0]) <= 0))
+
+
+def reconstruir_resumos() -> Dict[str, int]:
+    """Recalcula os resumos a partir de todas as auditorias (carga inicial ou correção)"""
+    linhas = {}
+    for (modelo, _, _), instrucao in zip(RESUMOS, _RECONSTRUCAO):
+        db.session.execute(db.delete(modelo))
+        db.session.execute(text(instrucao), {'nao_conforme': NAO_CONFORME})
+        linhas[modelo.__tablename__] = db.session.query(modelo).count()
+    db.session.commit()
+    return linhas
+
+
+def resumo_painel(competencia_inicio: Optional[str] = None, competencia_fim: Optional[str] = None,
+                  distribuidora: Optional[str] = None, subgrupo: Optional[str] = None) -> Dict[str, Any]:
+    """Totais do painel (por mês, por distribuidora e por tipo de irregularidade) lidos só dos resumos"""
+
+    def filtrar(consulta, modelo):
+        if competencia_inicio:
+            consulta = consulta.where(modelo.competencia >= competencia_inicio)
+        if competencia_fim:
+            consulta = consulta.where(modelo.competencia <= competencia_fim)
+        if distribuidora is not None:
+            consulta = consulta.where(modelo.distribuidora == distribuidora)
+        if subgrupo is not None:
+            consulta = consulta.where(modelo.subgrupo == subgrupo)
+        return consulta
+
+    def totais_auditorias(agrupamento):
+        consulta = db.select(
+            agrupamento, func.sum(ResumoMensal.auditorias), func.sum(ResumoMensal.nao_conformes),
+            func.sum(ResumoMensal.irregularidades), func.sum(ResumoMensal.impacto_financeiro)
+        )
+        consulta = filtrar(consulta, ResumoMensal).group_by(agrupamento).order_by(agrupamento)
+        return [
+            {
+                'chave': chave,
+                'auditorias': auditorias,
+                'conformes': auditorias - nao_conformes,
+                'taxa_conformidade': (auditorias - nao_conformes) / auditorias if auditorias else None,
+                'irregularidades': irregularidades,
+                'impacto_financeiro': impacto or 0.0
+            }
+            for chave, auditorias, nao_conformes, irregularidades, impacto in db.session.execute(consulta)
+        ]
+
+    por_mes = totais_auditorias(ResumoMensal.competencia)
+    por_distribuidora = totais_auditorias(ResumoMensal.distribuidora)
+    for linha in por_mes:
+        linha['competencia'] = linha.pop('chave')
+    for linha in por_distribuidora:
+        linha['distribuidora'] = linha.pop('chave')
+
+    consulta = db.select(
+        ResumoMensalIrregularidade.tipo, func.sum(ResumoMensalIrregularidade.quantidade),
+        func.sum(ResumoMensalIrregularidade.impacto_financeiro)
+    )
+    consulta = filtrar(consulta, ResumoMensalIrregularidade).group_by(ResumoMensalIrregularidade.tipo)
+    por_tipo = sorted(
+        (
+            {'tipo': tipo, 'quantidade': quantidade, 'impacto_financeiro': round(impacto or 0.0, 2)}
+            for tipo, quantidade, impacto in db.session.execute(consulta)
+        ),
+        key=lambda linha: linha['impacto_financeiro'], reverse=True
+    )
+
+    auditorias = sum(linha['auditorias'] for linha in por_mes)
+    conformes = sum(linha['conformes'] for linha in por_mes)
+    impacto = sum(linha['impacto_financeiro'] for linha in por_mes)
+    for linha in por_mes + por_distribuidora:
+        linha['impacto_financeiro'] = round(linha['impacto_financeiro'], 2)
+    return {
+        'totais': {
+            'auditorias': auditorias,
+            'conformes': conformes,
+            'taxa_conformidade': conformes / auditorias if auditorias else None,
+            'irregularidades': sum(linha['irregularidades'] for linha in por_mes),
+            'impacto_financeiro': round(impacto, 2)
+        },
+        'por_mes': por_mes,
+        'por_distribuidora': por_distribuidora,
+        'por_tipo': por_tipo
+    }
+
+
+def init_app(app):
+    """Registra o comando reconstruir-resumos na CLI do Flask"""
+
+    @app.cli.command('reconstruir-resumos')
+    def reconstruir():
+        """Recalcula os resumos mensais a partir das auditorias armazenadas"""
+        for tabela, linhas in reconstruir_resumos().items():
+            print(f"{tabela}: {linhas} linhas")
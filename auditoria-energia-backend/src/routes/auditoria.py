@@ -1,29 +1,113 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, url_for, stream_with_context
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import os
 import json
+import re
+import shutil
+import sqlite3
+import time
+import zipfile
 from datetime import datetime
+from typing import Optional
 import sys
 
 # Adicionar o diretório src ao path para importar os módulos
 sys.path.append(os.path.dirname(__file__))
-from src.regras_auditoria import RegrasAuditoria
-from src.extrator_dados import ExtratorDados
+from src.processamento import processar_conta, regras_auditoria, versao_pipeline
+from src.cache_disco import CacheDisco
+from src.cache_ocr import cache_ocr
+from src.processamento_lote import processador_lote
+from src.ingestao import iterar_contas
+from src.fila_auditoria import fila_auditoria, ESTADOS_FINAIS
+from src.models.user import db
+from src.models.auditoria import Auditoria, registrar_auditorias
+from src.historico_consumo import historico_consumo
+from src.models.anomalia import AnomaliaPortfolio, ExecucaoAnomalias
+from src.anomalias_portfolio import ultima_execucao
+from src.exportacao import linhas_relatorio, gerar_csv, gerar_xlsx
+from src.resumos import resumo_painel
+from src.tarifas import competencia_de
+from src.upload import UploadInvalido, salvar_em, mapear_arquivo, retencao_uploads
 
 auditoria_bp = Blueprint('auditoria', __name__)
 
-# Configurações para upload de arquivos
-UPLOAD_FOLDER = '/tmp/uploads'
+# Configurações para upload de arquivos (a pasta vem de UPLOAD_FOLDER na configuração da aplicação)
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
 
-# Instanciar classes de processamento
-regras_auditoria = RegrasAuditoria()
-extrator_dados = ExtratorDados()
+# Cache de resultados por conteúdo do arquivo (evita reprocessar reenvios), criado em init_app
+# na subpasta cache da pasta de uploads
+CACHE_TAMANHO_MAXIMO = 256 * 1024 * 1024
+cache_uploads: Optional[CacheDisco] = None
+
+# Formatos do relatório consolidado: gerador e tipo de conteúdo
+FORMATOS_RELATORIO = {
+    'csv': (gerar_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (gerar_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+}
+
+# Paginação do histórico
+HISTORICO_LIMITE_PADRAO = 50
+HISTORICO_LIMITE_MAXIMO = 500
+
+@auditoria_bp.record_once
+def init_app(estado):
+    """Cria o cache de uploads na pasta configurada ao registrar o blueprint"""
+    global cache_uploads
+    config = estado.app.config
+    cache_uploads = CacheDisco(
+        os.path.join(config['UPLOAD_FOLDER'], 'cache'),
+        config.get('UPLOAD_CACHE_TAMANHO_MAXIMO', CACHE_TAMANHO_MAXIMO)
+    )
+
+@auditoria_bp.errorhandler(UploadInvalido)
+def upload_invalido(erro):
+    return jsonify({'error': erro.description}), 400
+
+@auditoria_bp.errorhandler(RequestEntityTooLarge)
+def upload_muito_grande(erro):
+    return jsonify({'error': 'Arquivo excede o tamanho máximo permitido'}), 413
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def is_zip(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() == 'zip'
+
+def salvar_upload(file):
+    """Salva o arquivo enviado com nome seguro e retorna (nome, caminho, hash do conteúdo)"""
+    # Criar diretório de upload se não existir
+    pasta_uploads = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(pasta_uploads, exist_ok=True)
+    retencao_uploads.talvez_executar()
+    
+    # O arquivo já foi gravado e o hash calculado durante o recebimento; aqui só recebe o nome final
+    filename = secure_filename(file.filename)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    filename = f"{timestamp}_{filename}"
+    filepath = os.path.join(pasta_uploads, filename)
+    hash_conteudo = salvar_em(file, filepath)
+    
+    return filename, filepath, hash_conteudo
+
+def chave_cache(hash_conteudo):
+    """Chave do cache: conteúdo do arquivo + versão do extrator e das regras"""
+    return f"{hash_conteudo}_{versao_pipeline()}"
+
+def registrar_resultado(resultado_auditoria):
+    """Persiste o resultado da conta no histórico"""
+    auditorias = registrar_auditorias([resultado_auditoria])
+    if auditorias:
+        resultado_auditoria['auditoria_id'] = auditorias[0].id
+    return resultado_auditoria
+
+def processar_e_registrar(filepath, conteudo=None):
+    """Processa a conta e persiste o resultado no histórico"""
+    return registrar_resultado(processar_conta(filepath, conteudo=conteudo))
+
 @auditoria_bp.route('/upload', methods=['POST'])
 def upload_conta():
     """Endpoint para upload de conta de energia"""
@@ -35,98 +119,327 @@ def upload_conta():
         return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
     
     if file and allowed_file(file.filename):
-        # Criar diretório de upload se não existir
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+        filename, filepath, hash_conteudo = salvar_upload(file)
         
-        # Salvar arquivo com nome seguro
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{timestamp}_{filename}"
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
+        # Conta já auditada com as mesmas versões: devolve o resultado armazenado
+        resultado_auditoria = cache_uploads.obter_json(chave_cache(hash_conteudo))
+        if resultado_auditoria is not None:
+            os.remove(filepath)
+            return jsonify({
+                'success': True,
+                'filename': filename,
+                'duplicado': True,
+                'resultado': resultado_auditoria
+            })
         
-        # Processar a conta com as regras de auditoria
-        resultado_auditoria = processar_conta(filepath)
+        # Processar a conta com as regras de auditoria lendo o arquivo mapeado em memória
+        with mapear_arquivo(filepath) as conteudo:
+            resultado_auditoria = processar_e_registrar(filepath, conteudo)
+        os.remove(filepath)
+        if resultado_auditoria.get('status') != 'erro':
+            cache_uploads.gravar_json(chave_cache(hash_conteudo), resultado_auditoria)
         
         return jsonify({
             'success': True,
             'filename': filename,
+            'duplicado': False,
             'resultado': resultado_auditoria
         })
     
     return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
 
-def processar_conta(filepath):
-    """Função para processar a conta de energia com regras de auditoria"""
+@auditoria_bp.route('/upload/assincrono', methods=['POST'])
+def upload_conta_assincrono():
+    """Endpoint para upload de conta processada em segundo plano"""
+    if 'file' not in request.files:
+        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+    
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
+    
+    if not allowed_file(file.filename):
+        return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
+    
+    filename, filepath, _ = salvar_upload(file)
+    job_id = fila_auditoria.enfileirar(filepath)
+    
+    return jsonify({
+        'success': True,
+        'filename': filename,
+        'job_id': job_id,
+        'status_url': url_for('auditoria.obter_job', job_id=job_id),
+        'eventos_url': url_for('auditoria.eventos_job', job_id=job_id)
+    }), 202
+
+@auditoria_bp.route('/jobs/<job_id>', methods=['GET'])
+def obter_job(job_id):
+    """Endpoint para consultar o estado de um job de auditoria"""
+    job = fila_auditoria.obter(job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    return jsonify(job)
+
+@auditoria_bp.route('/jobs/<job_id>/eventos', methods=['GET'])
+def eventos_job(job_id):
+    """Endpoint que transmite os eventos do job como Server-Sent Events"""
+    if fila_auditoria.obter(job_id) is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    
+    # Permite retomar a transmissão a partir do último evento recebido
+    ultimo_id = request.headers.get('Last-Event-ID', request.args.get('apos', '0'))
+    ultimo_id = int(ultimo_id) if str(ultimo_id).isdigit() else 0
+    
+    def gerar_eventos(ultimo_id):
+        while True:
+            for evento in fila_auditoria.eventos(job_id, ultimo_id):
+                ultimo_id = evento['id']
+                yield f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+            
+            job = fila_auditoria.obter(job_id)
+            if job['status'] in ESTADOS_FINAIS and not fila_auditoria.eventos(job_id, ultimo_id):
+                yield f"event: fim\ndata: {json.dumps(job, default=str)}\n\n"
+                return
+            time.sleep(0.5)
+    
+    return Response(gerar_eventos(ultimo_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@auditoria_bp.route('/upload/lote', methods=['POST'])
+def upload_lote():
+    """Endpoint para upload de várias contas (ZIPs e PDFs com várias contas) processadas em paralelo"""
+    files = [f for f in request.files.getlist('files') if f.filename]
+    if not files:
+        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+    retencao_uploads.talvez_executar()
+
+    # Cada lote recebe um diretório próprio para evitar colisões de nomes
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    lote_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], f"lote_{timestamp}")
+    os.makedirs(lote_folder, exist_ok=True)
+
+    arquivos = []
+    rejeitados = []
+    for indice, file in enumerate(files):
+        filename = secure_filename(file.filename)
+        filepath = os.path.join(lote_folder, f"{indice:05d}_{filename}")
+
+        if is_zip(filename):
+            salvar_em(file, filepath)
+            if not zipfile.is_zipfile(filepath):
+                rejeitados.append({'arquivo': filename, 'erro': 'Arquivo ZIP inválido'})
+                os.remove(filepath)
+                continue
+            arquivos.append((filepath, filename))
+        elif allowed_file(filename):
+            salvar_em(file, filepath)
+            arquivos.append((filepath, filename))
+        else:
+            rejeitados.append({'arquivo': filename, 'erro': 'Tipo de arquivo não permitido'})
+
+    # Membros dos ZIPs e contas dos PDFs concatenados são lidos sob demanda e enviados
+    # ao pool assim que encontrados, com número limitado de contas em memória
+    contas = (
+        conta
+        for filepath, filename in arquivos
+        for conta in iterar_contas(filepath, filename, pasta=lote_folder)
+    )
+    resultado_lote = processador_lote.processar_contas(contas)
+    if not resultado_lote['arquivos']:
+        shutil.rmtree(lote_folder, ignore_errors=True)
+        return jsonify({'error': 'Nenhum arquivo válido no lote', 'rejeitados': rejeitados}), 400
+
+    auditorias = registrar_auditorias(resultado_lote['arquivos'])
+    resultados_registrados = (r for r in resultado_lote['arquivos'] if r.get('status') != 'erro')
+    for resultado, auditoria in zip(resultados_registrados, auditorias):
+        resultado['auditoria_id'] = auditoria.id
+    resultado_lote['rejeitados'] = rejeitados
+    shutil.rmtree(lote_folder, ignore_errors=True)
+
+    return jsonify({
+        'success': True,
+        'resultado': resultado_lote
+    })
+
+@auditoria_bp.route('/cache/estatisticas', methods=['GET'])
+def estatisticas_cache():
+    """Endpoint com os contadores do cache de contas já auditadas e do cache do OCR"""
+    return jsonify(dict(cache_uploads.estatisticas(), ocr=cache_ocr.estatisticas()))
+
+@auditoria_bp.route('/tarifas/recarregar', methods=['POST'])
+def recarregar_tarifas():
+    """Endpoint para recarregar a tabela de tarifas configurada em TARIFAS_ARQUIVO"""
+    caminho = current_app.config.get('TARIFAS_ARQUIVO')
+    if not caminho:
+        return jsonify({'error': 'Nenhum arquivo de tarifas configurado'}), 400
+    
     try:
-        # Extrair dados da conta
-        dados_conta = extrator_dados.extrair_dados_ocr(filepath)
-        
-        # Validar dados extraídos
-        problemas_extracao = extrator_dados.validar_dados_extraidos(dados_conta)
-        
-        # Realizar auditoria
-        resultado_auditoria = regras_auditoria.auditar_conta(dados_conta)
-        
-        # Gerar recomendações
-        recomendacoes = regras_auditoria.gerar_recomendacoes(dados_conta)
-        
-        # Adicionar dados extraídos e recomendações ao resultado
-        resultado_auditoria['dados_extraidos'] = dados_conta
-        resultado_auditoria['recomendacoes'] = recomendacoes
-        resultado_auditoria['problemas_extracao'] = problemas_extracao
-        resultado_auditoria['arquivo'] = os.path.basename(filepath)
-        
-        return resultado_auditoria
-        
-    except Exception as e:
-        return {
-            'status': 'erro',
-            'arquivo': os.path.basename(filepath),
-            'data_processamento': datetime.now().isoformat(),
-            'erro': f'Erro durante processamento: {str(e)}',
-            'irregularidades': [],
-            'resumo': {
-                'total_irregularidades': 0,
-                'impacto_financeiro': 0.0,
-                'status_geral': 'Erro no Processamento'
-            }
-        }
+        regras_auditoria.carregar_tarifas(caminho)
+    except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+        return jsonify({'error': f'Erro ao carregar tarifas: {str(e)}'}), 400
+    
+    # Os processos do lote têm cópia própria das regras; serão recriados com a nova tabela
+    processador_lote.encerrar()
+    
+    return jsonify({'success': True, 'versao': regras_auditoria.versao})
 
 @auditoria_bp.route('/historico', methods=['GET'])
 def obter_historico():
-    """Endpoint para obter histórico de auditorias"""
-    # Placeholder - será implementado com dados do banco
+    """Endpoint para obter histórico de auditorias com paginação por cursor"""
+    try:
+        limite = min(max(int(request.args.get('limite', HISTORICO_LIMITE_PADRAO)), 1), HISTORICO_LIMITE_MAXIMO)
+        cursor = request.args.get('cursor', type=int)
+        data_inicio = request.args.get('data_inicio')
+        data_fim = request.args.get('data_fim')
+        data_inicio = datetime.fromisoformat(data_inicio) if data_inicio else None
+        data_fim = datetime.fromisoformat(data_fim) if data_fim else None
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de consulta inválidos'}), 400
+    
+    # Paginação por cursor (keyset): continua a partir do último id retornado. Com período,
+    # a ordem é (data_auditoria, id) e a data do cursor vira o limite superior do intervalo,
+    # percorrido no índice ix_auditoria_data_id sem ordenar; sem período, vale a chave primária
+    data_cursor = None
+    if cursor and (data_inicio or data_fim):
+        data_cursor = db.session.query(Auditoria.data_auditoria).filter(Auditoria.id == cursor).scalar()
+        if data_cursor is None:
+            return jsonify({'error': 'Cursor inválido'}), 400
+        data_fim = min(data_fim, data_cursor) if data_fim else data_cursor
+    
+    query = Auditoria.query
+    
+    # Filtros atendidos pelos índices de auditoria
+    for campo in ('numero_instalacao', 'mes_referencia', 'distribuidora'):
+        valor = request.args.get(campo)
+        if valor:
+            query = query.filter(getattr(Auditoria, campo) == valor)
+    status = request.args.get('status')
+    if status:
+        query = query.filter(Auditoria.status_geral == status)
+    if data_inicio:
+        query = query.filter(Auditoria.data_auditoria >= data_inicio)
+    if data_fim:
+        query = query.filter(Auditoria.data_auditoria <= data_fim)
+    
+    if data_inicio or data_fim:
+        if data_cursor is not None:
+            query = query.filter(or_(Auditoria.data_auditoria < data_cursor, Auditoria.id < cursor))
+        query = query.order_by(Auditoria.data_auditoria.desc(), Auditoria.id.desc())
+    else:
+        if cursor:
+            query = query.filter(Auditoria.id < cursor)
+        query = query.order_by(Auditoria.id.desc())
+    
+    auditorias = query.limit(limite + 1).all()
+    proximo_cursor = auditorias[limite - 1].id if len(auditorias) > limite else None
+    
     return jsonify({
-        'auditorias': [
-            {
-                'id': 1,
-                'data': '2025-06-19T14:30:00',
-                'arquivo': 'conta_energia_maio_2025.pdf',
-                'status': 'Conforme',
-                'irregularidades': 0
-            }
-        ]
+        'auditorias': [auditoria.to_dict() for auditoria in auditorias[:limite]],
+        'proximo_cursor': proximo_cursor
     })
 
-@auditoria_bp.route('/relatorio/<int:auditoria_id>', methods=['GET'])
-def gerar_relatorio(auditoria_id):
-    """Endpoint para gerar relatório detalhado de auditoria"""
-    # Placeholder - será implementado com dados reais
+def periodo_da_consulta():
+    """Competências inicial e final (parâmetros inicio e fim, em AAAA-MM ou MM/AAAA)"""
+    competencias = []
+    for parametro in ('inicio', 'fim'):
+        valor = request.args.get(parametro)
+        competencia = competencia_de(valor) if valor and '/' in valor else valor
+        if competencia and not re.fullmatch(r'\d{4}-\d{2}', competencia):
+            raise ValueError(f'Competência inválida em {parametro}; use AAAA-MM ou MM/AAAA')
+        competencias.append(competencia)
+    return competencias
+
+@auditoria_bp.route('/resumo', methods=['GET'])
+def obter_resumo():
+    """Endpoint com os totais do painel, calculados apenas a partir dos resumos mensais"""
+    try:
+        competencias = periodo_da_consulta()
+    except ValueError as erro:
+        return jsonify({'error': str(erro)}), 400
+    
+    return jsonify(resumo_painel(
+        *competencias,
+        distribuidora=request.args.get('distribuidora'),
+        subgrupo=request.args.get('subgrupo')
+    ))
+
+@auditoria_bp.route('/relatorios/consolidado', methods=['GET'])
+def exportar_relatorio_consolidado():
+    """
+    Endpoint do relatório consolidado por distribuidora, unidade consumidora e mês (CSV ou XLSX),
+    gerado em fluxo a partir dos resumos mensais
+    """
+    formato = request.args.get('formato', 'csv').lower()
+    if formato not in FORMATOS_RELATORIO:
+        return jsonify({'error': f"Formato inválido; use {', '.join(FORMATOS_RELATORIO)}"}), 400
+    
+    try:
+        competencias = periodo_da_consulta()
+    except ValueError as erro:
+        return jsonify({'error': str(erro)}), 400
+    
+    linhas = linhas_relatorio(*competencias, distribuidora=request.args.get('distribuidora'))
+    gerador, mimetype = FORMATOS_RELATORIO[formato]
+    nome = f"relatorio_consolidado_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    return Response(
+        stream_with_context(gerador(linhas)), mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{nome}"'}
+    )
+
+@auditoria_bp.route('/historico/anomalias', methods=['GET'])
+def obter_anomalias():
+    """Endpoint com as anomalias da última análise do portfólio (ou da execução informada)"""
+    try:
+        limite = min(max(int(request.args.get('limite', HISTORICO_LIMITE_PADRAO)), 1), HISTORICO_LIMITE_MAXIMO)
+        cursor = request.args.get('cursor', type=int)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de consulta inválidos'}), 400
+    
+    id_execucao = request.args.get('execucao')
+    execucao = db.session.get(ExecucaoAnomalias, id_execucao) if id_execucao else ultima_execucao()
+    if execucao is None:
+        return jsonify({'execucao': None, 'anomalias': [], 'proximo_cursor': None})
+    
+    query = AnomaliaPortfolio.query.filter(AnomaliaPortfolio.execucao == execucao.id)
+    for campo in ('tipo', 'numero_instalacao', 'distribuidora', 'subgrupo', 'competencia'):
+        valor = request.args.get(campo)
+        if valor:
+            query = query.filter(getattr(AnomaliaPortfolio, campo) == valor)
+    if cursor:
+        query = query.filter(AnomaliaPortfolio.id > cursor)
+    
+    anomalias = query.order_by(AnomaliaPortfolio.id).limit(limite + 1).all()
+    proximo_cursor = anomalias[limite - 1].id if len(anomalias) > limite else None
+    
+    return jsonify({
+        'execucao': execucao.to_dict(),
+        'anomalias': [anomalia.to_dict() for anomalia in anomalias[:limite]],
+        'proximo_cursor': proximo_cursor
+    })
+
+@auditoria_bp.route('/instalacoes/<numero_instalacao>/consumo', methods=['GET'])
+def obter_consumo_instalacao(numero_instalacao):
+    """Endpoint com os consumos mensais e as estatísticas da unidade consumidora"""
+    estatisticas = historico_consumo.estatisticas(numero_instalacao) if historico_consumo.habilitado else None
+    if estatisticas is None:
+        return jsonify({'error': 'Unidade consumidora sem histórico'}), 404
+    
+    resumo = estatisticas.resumo()
     return jsonify({
-        'id': auditoria_id,
-        'data_auditoria': '2025-06-19T14:30:00',
-        'arquivo_original': 'conta_energia_maio_2025.pdf',
-        'dados_extraidos': {
-            'consumo_kwh': 1500,
-            'valor_total': 450.75,
-            'tarifa_aplicada': 'B3',
-            'bandeira_tarifaria': 'Verde'
-        },
-        'irregularidades': [],
-        'recomendacoes': [
-            'Verificar possibilidade de migração para tarifa branca',
-            'Analisar padrão de consumo para otimização'
-        ]
+        'numero_instalacao': numero_instalacao,
+        'consumos': historico_consumo.consumos(numero_instalacao),
+        'estatisticas': resumo.to_dict() if resumo else None
     })
 
+@auditoria_bp.route('/relatorio/<int:auditoria_id>', methods=['GET'])
+def gerar_relatorio(auditoria_id):
+    """Endpoint para gerar relatório detalhado de auditoria"""
+    auditoria = Auditoria.query.options(
+        joinedload(Auditoria.dados_extraidos),
+        joinedload(Auditoria.irregularidades)
+    ).filter(Auditoria.id == auditoria_id).first()
+    
+    if auditoria is None:
+        return jsonify({'error': 'Auditoria não encontrada'}), 404
+    
+    return jsonify(auditoria.to_relatorio())
@@ -0,0 +1,14 @@
+from flask import Blueprint, Response, jsonify
+from src.metricas import metricas, perfis_recentes
+
+metricas_bp = Blueprint('metricas', __name__)
+
+@metricas_bp.route('/metrics', methods=['GET'])
+def exportar_metricas():
+    """Endpoint com as métricas no formato texto do Prometheus"""
+    return Response(metricas.renderizar(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@metricas_bp.route('/metrics/perfis', methods=['GET'])
+def listar_perfis():
+    """Endpoint com os perfis das últimas requisições enviadas com o cabeçalho X-Perfil"""
+    return jsonify(perfis_recentes.listar())
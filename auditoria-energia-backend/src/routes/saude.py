@@ -0,0 +1,41 @@
+import os
+
+from flask import Blueprint, current_app, jsonify
+from sqlalchemy import text
+
+from src.models.user import db
+from src.fila_auditoria import fila_auditoria
+from src.servidor import estado_servidor
+
+saude_bp = Blueprint('saude', __name__)
+
+@saude_bp.route('/saude', methods=['GET'])
+def verificar_saude():
+    """Endpoint de vivacidade: o processo responde"""
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+@saude_bp.route('/prontidao', methods=['GET'])
+def verificar_prontidao():
+    """Endpoint de prontidão: banco, fila e pasta de uploads disponíveis e servidor fora de drenagem"""
+    verificacoes = {'drenando': estado_servidor.drenando}
+
+    try:
+        db.session.execute(text('SELECT 1'))
+        verificacoes['banco'] = True
+    except Exception:
+        verificacoes['banco'] = False
+
+    try:
+        fila_auditoria._conexao().execute('SELECT 1')
+        verificacoes['fila'] = True
+    except Exception:
+        verificacoes['fila'] = False
+
+    pasta_uploads = current_app.config.get('UPLOAD_FOLDER')
+    verificacoes['uploads'] = bool(pasta_uploads) and os.access(pasta_uploads, os.W_OK)
+
+    pronto = not verificacoes['drenando'] and all(
+        valor for chave, valor in verificacoes.items() if chave != 'drenando'
+    )
+    return jsonify({'status': 'pronto' if pronto else 'indisponivel', 'verificacoes': verificacoes}), \
+        200 if pronto else 503
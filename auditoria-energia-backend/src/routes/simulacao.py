@@ -0,0 +1,52 @@
+from flask import Blueprint, jsonify, request
+
+from src.models.user import db
+from src.simulacao_tarifas import Cenario, simulador_tarifas
+
+simulacao_bp = Blueprint('simulacao', __name__)
+
+RANKING_LIMITE_PADRAO = 50
+RANKING_LIMITE_MAXIMO = 1000
+
+
+def _cenario_requisicao() -> Cenario:
+    return Cenario(
+        request.args.get('modalidade') or 'branca',
+        request.args.get('subgrupo'),
+        request.args.get('tipo_ligacao'),
+        request.args.get('ponta', type=float),
+        request.args.get('intermediario', type=float)
+    )
+
+
+@simulacao_bp.route('/simulacao', methods=['GET'])
+def simular_instalacao():
+    """Endpoint com as contas de uma unidade recalculadas no cenário (modalidade, subgrupo, ligação)"""
+    numero_instalacao = request.args.get('numero_instalacao')
+    if not numero_instalacao:
+        return jsonify({'error': 'Informe o numero_instalacao'}), 400
+    try:
+        cenario = _cenario_requisicao()
+        resultado = simulador_tarifas.simular_instalacao(db.engine.url.database, numero_instalacao, cenario)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    if resultado is None:
+        return jsonify({'error': 'Unidade sem histórico de consumo'}), 404
+    return jsonify(resultado)
+
+
+@simulacao_bp.route('/simulacao/ranking', methods=['GET'])
+def ranking_simulacao():
+    """Endpoint com as unidades da carteira de maior economia anual no cenário"""
+    try:
+        limite = min(max(int(request.args.get('limite', RANKING_LIMITE_PADRAO)), 1), RANKING_LIMITE_MAXIMO)
+        economia_minima = float(request.args.get('economia_minima', 0))
+        cenario = _cenario_requisicao()
+        resultado = simulador_tarifas.ranking(db.engine.url.database, cenario, limite, economia_minima)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify(resultado)
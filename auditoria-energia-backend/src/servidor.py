@@ -0,0 +1,113 @@
+"""
+Módulo do ciclo de vida do servidor em produção (pré-carga, fork e drenagem)
+Com pré-carga, a aplicação, os padrões compilados, as tabelas de tarifas e as
+bibliotecas de PDF/OCR são carregados uma vez no processo mestre; os processos
+de trabalho criados por fork compartilham essas páginas de memória (copy-on-write)
+"""
+
+import gc
+import os
+import signal
+import threading
+from typing import Dict, Any
+
+from src.models.user import db
+from src.fila_auditoria import fila_auditoria
+from src.processamento import regras_auditoria, extrator_dados
+from src.processamento_lote import processador_lote
+from src.metricas import metricas
+from src import extrator_dados as modulo_extrator
+
+
+class EstadoServidor:
+    """Estado do processo consultado pela verificação de prontidão"""
+
+    def __init__(self):
+        self._drenando = threading.Event()
+
+    @property
+    def drenando(self) -> bool:
+        return self._drenando.is_set()
+
+    def iniciar_drenagem(self):
+        """A prontidão passa a falhar; o processo continua atendendo as requisições que chegarem"""
+        self._drenando.set()
+
+    def drenar(self, timeout: float = 30.0):
+        """
+        Deixa de aceitar trabalho novo: a prontidão passa a falhar, os trabalhadores
+        da fila terminam o job atual (os pendentes continuam no SQLite) e o pool do lote é encerrado
+        """
+        self.iniciar_drenagem()
+        fila_auditoria.encerrar(timeout)
+        processador_lote.encerrar()
+
+
+estado_servidor = EstadoServidor()
+
+
+def instalar_drenagem(worker, espera: float):
+    """
+    Troca o tratamento de SIGTERM do processo de trabalho do Gunicorn: a prontidão falha
+    na hora, mas o laço de aceitação segue por `espera` segundos para o balanceador de carga
+    retirar o processo; só então vem o encerramento normal, que conclui as requisições em
+    andamento (espera somada a elas deve caber no graceful_timeout do mestre)
+    """
+    encerrar = worker.handle_exit
+
+    def ao_receber_sigterm(sinal, quadro):
+        if estado_servidor.drenando:
+            return
+        estado_servidor.iniciar_drenagem()
+        if espera <= 0:
+            encerrar(sinal, quadro)
+            return
+        temporizador = threading.Timer(espera, encerrar, args=(sinal, quadro))
+        temporizador.daemon = True
+        temporizador.start()
+
+    signal.signal(signal.SIGTERM, ao_receber_sigterm)
+
+
+def preparar_para_fork(app) -> Dict[str, Any]:
+    """Aquece no processo mestre o que os processos de trabalho vão compartilhar"""
+    # Contas de aquecimento não entram nos contadores de regras e etapas exportados
+    with metricas.desativadas():
+        # Sequências de regras e consultas de tarifas de cada subgrupo de referência
+        for subgrupo in regras_auditoria.tarifas_grupo_b:
+            regras_auditoria.auditar_conta({
+                'subgrupo': subgrupo, 'consumo_kwh': 100, 'valor_energia': 50.0, 'valor_total': 60.0,
+                'icms': 10.0, 'bandeira_tarifaria': 'verde', 'historico_consumo': [100, 100, 100]
+            })
+        versao = regras_auditoria.versao
+
+        # Padrões de extração já são compilados na importação; o texto vazio percorre todos
+        extrator_dados.extrair_dados_texto('')
+
+    # Verifica o OCR uma única vez (o executável do Tesseract carrega seus modelos por chamada)
+    ocr_disponivel = False
+    if modulo_extrator.pytesseract is not None:
+        try:
+            modulo_extrator.pytesseract.get_tesseract_version()
+            ocr_disponivel = True
+        except Exception:
+            pass
+
+    # Conexões abertas no mestre não podem ser usadas pelos filhos
+    with app.app_context():
+        db.engine.dispose()
+
+    # Objetos carregados até aqui não são mais percorridos pelo coletor de lixo,
+    # o que evita escrever nas páginas compartilhadas com os processos filhos
+    gc.collect()
+    gc.freeze()
+
+    return {'versao_regras': versao, 'ocr_disponivel': ocr_disponivel, 'objetos_congelados': gc.get_freeze_count()}
+
+
+def apos_fork(app):
+    """Inicializa em cada processo de trabalho o que não sobrevive ao fork"""
+    with app.app_context():
+        db.engine.dispose(close=False)
+    if app.config.get('FILA_DATABASE_PATH'):
+        fila_auditoria.iniciar()
@@ -0,0 +1,403 @@
+"""
+Módulo de simulação de modalidades tarifárias ("e se?")
+Recalcula as contas armazenadas de cada unidade consumidora em um cenário alternativo
+(tarifa branca no lugar da convencional, outro subgrupo ou outro tipo de ligação, que
+muda o custo de disponibilidade) e compara com a situação atual. O cálculo é vetorizado
+sobre os meses de todas as unidades de uma vez; o resultado de cada cenário fica em
+cache até novas auditorias ou uma nova tabela de tarifas
+
+Tarifa branca: a tabela de tarifas pode trazer os postos como subgrupos próprios
+(ex.: B3_BRANCA_PONTA, B3_BRANCA_INTERMEDIARIO, B3_BRANCA_FORA_PONTA); sem eles
+valem os FATORES_TARIFA_BRANCA sobre a tarifa convencional. Como as contas não
+informam o consumo por horário, a divisão entre os postos vem do perfil do cenário
+"""
+
+import math
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+
+# NumPy é necessário para a simulação
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Meses mais recentes de cada unidade usados na simulação
+MESES_SIMULACAO = 12
+
+# Cenários mantidos no cache
+MAX_CENARIOS = 32
+
+MODALIDADES = ('convencional', 'branca')
+POSTOS = ('ponta', 'intermediario', 'fora_ponta')
+
+# Tarifa de cada posto da tarifa branca relativa à convencional (valores de referência)
+FATORES_TARIFA_BRANCA = {'ponta': 1.94, 'intermediario': 1.24, 'fora_ponta': 0.83}
+
+# Consumo típico em cada posto quando o cenário não informa o perfil (3h de ponta e 2h intermediárias)
+PERFIL_PADRAO = {'ponta': 0.10, 'intermediario': 0.06}
+
+# Subgrupos que podem optar pela tarifa branca (baixa renda e iluminação pública não podem)
+SUBGRUPOS_TARIFA_BRANCA = {'B1', 'B2_RURAL', 'B2_COOPERATIVA', 'B2_IRRIGACAO', 'B3'}
+
+# Apenas a auditoria mais recente de cada unidade e competência, como na detecção de anomalias
+_CONSULTA_CONSUMOS = """
+SELECT a.id, a.numero_instalacao, a.competencia, a.distribuidora,
+       d.subgrupo, d.tipo_ligacao, d.consumo_kwh
+FROM auditoria a JOIN dados_extraidos d ON d.auditoria_id = a.id
+WHERE a.status != 'erro' AND a.numero_instalacao IS NOT NULL AND a.competencia IS NOT NULL
+  AND d.consumo_kwh > 0
+  AND NOT EXISTS (SELECT 1 FROM auditoria b
+                  WHERE b.numero_instalacao = a.numero_instalacao AND +b.competencia IS a.competencia
+                    AND b.id > a.id)
+"""
+
+
+class Cenario:
+    """Modalidade, subgrupo e tipo de ligação simulados (None mantém o atual da unidade)"""
+
+    __slots__ = ('modalidade', 'subgrupo', 'tipo_ligacao', 'ponta', 'intermediario')
+
+    def __init__(self, modalidade: str = 'branca', subgrupo: Optional[str] = None,
+                 tipo_ligacao: Optional[str] = None, ponta: Optional[float] = None,
+                 intermediario: Optional[float] = None):
+        if modalidade not in MODALIDADES:
+            raise ValueError(f"Modalidade inválida: {modalidade} (use {', '.join(MODALIDADES)})")
+        ponta = PERFIL_PADRAO['ponta'] if ponta is None else float(ponta)
+        intermediario = PERFIL_PADRAO['intermediario'] if intermediario is None else float(intermediario)
+        # NaN passaria pelas comparações abaixo e anularia todos os meses sem erro
+        if not (math.isfinite(ponta) and math.isfinite(intermediario)) \
+                or ponta < 0 or intermediario < 0 or ponta + intermediario > 1:
+            raise ValueError('Perfil inválido: ponta e intermediario devem ser frações que somam até 1')
+        self.modalidade = modalidade
+        self.subgrupo = subgrupo.upper() if subgrupo else None
+        self.tipo_ligacao = tipo_ligacao.lower() if tipo_ligacao else None
+        self.ponta = ponta
+        self.intermediario = intermediario
+
+    @classmethod
+    def from_dict(cls, dados: Dict[str, Any]) -> 'Cenario':
+        return cls(
+            dados.get('modalidade') or 'branca', dados.get('subgrupo'), dados.get('tipo_ligacao'),
+            dados.get('ponta'), dados.get('intermediario')
+        )
+
+    @property
+    def chave(self) -> tuple:
+        return (self.modalidade, self.subgrupo, self.tipo_ligacao, round(self.ponta, 4), round(self.intermediario, 4))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'modalidade': self.modalidade,
+            'subgrupo': self.subgrupo,
+            'tipo_ligacao': self.tipo_ligacao,
+            'perfil': {'ponta': self.ponta, 'intermediario': self.intermediario,
+                       'fora_ponta': round(1 - self.ponta - self.intermediario, 6)}
+        }
+
+
+def _texto(valores: List[Any], maiusculas: bool = False) -> 'np.ndarray':
+    """Coluna de texto normalizada (ausente vira '')"""
+    normalizados = [
+        '' if valor is None else (str(valor).strip().upper() if maiusculas else str(valor).strip().lower())
+        for valor in valores
+    ]
+    return np.array(normalizados, dtype=str)
+
+
+class _Coluna:
+    """Coluna categórica: valores distintos e o código de cada linha (comparar inteiros é mais rápido)"""
+
+    __slots__ = ('valores', 'codigos')
+
+    def __init__(self, valores: List[str], codigos: 'np.ndarray'):
+        self.valores = valores
+        self.codigos = codigos
+
+    @classmethod
+    def codificar(cls, coluna: 'np.ndarray') -> '_Coluna':
+        valores, codigos = np.unique(coluna, return_inverse=True)
+        return cls(valores.tolist(), codigos.reshape(-1))
+
+    @classmethod
+    def constante(cls, valor: str, linhas: int) -> '_Coluna':
+        return cls([valor], np.zeros(linhas, dtype=np.intp))
+
+    def __getitem__(self, indices) -> '_Coluna':
+        return _Coluna(self.valores, self.codigos[indices])
+
+    def valor(self, indice: int) -> Optional[str]:
+        return self.valores[self.codigos[indice]] or None
+
+
+def _mapear(funcao, *colunas: _Coluna) -> 'np.ndarray':
+    """funcao(*valores) para cada linha, calculada uma vez por combinação distinta das colunas"""
+    codigos = np.zeros(len(colunas[0].codigos), dtype=np.int64)
+    for coluna in colunas:
+        codigos = codigos * len(coluna.valores) + coluna.codigos
+    combinacoes, inverso = np.unique(codigos, return_inverse=True)
+
+    resultados = np.empty(len(combinacoes))
+    for posicao, codigo in enumerate(combinacoes.tolist()):
+        chave = []
+        for coluna in reversed(colunas):
+            codigo, indice = divmod(codigo, len(coluna.valores))
+            chave.append(coluna.valores[indice])
+        resultados[posicao] = funcao(*reversed(chave))
+    return resultados[inverso.reshape(-1)]
+
+
+class BaseConsumo:
+    """Consumos mensais das unidades em colunas (uma linha por unidade e competência)"""
+
+    def __init__(self, linhas: List[tuple], meses: int = MESES_SIMULACAO):
+        if not linhas:
+            vazia = _Coluna([], np.zeros(0, dtype=np.intp))
+            self.instalacoes = np.array([], dtype=str)
+            self.unidade = np.zeros(0, dtype=np.intp)
+            self.consumo = np.zeros(0)
+            self.competencia = self.distribuidora = self.subgrupo = self.tipo_ligacao = vazia
+            return
+
+        ids, instalacoes, competencias, distribuidoras, subgrupos, tipos, consumos = zip(*linhas)
+        ids = np.array(ids, dtype=np.int64)
+        instalacoes = np.array([str(instalacao) for instalacao in instalacoes], dtype=str)
+        competencia = _Coluna.codificar(np.array(competencias, dtype=str))
+        self.instalacoes, unidade = np.unique(instalacoes, return_inverse=True)
+        unidade = unidade.reshape(-1)
+
+        # Últimos meses de cada unidade: ordena por unidade e competência decrescente
+        ordem = np.lexsort((competencia.codigos, unidade))[::-1]
+        unidade_ordenada = unidade[ordem]
+        inicio_grupo = np.r_[0, np.flatnonzero(np.diff(unidade_ordenada)) + 1]
+        tamanho_grupo = np.diff(np.r_[inicio_grupo, len(ordem)])
+        posicao = np.arange(len(ordem)) - np.repeat(inicio_grupo, tamanho_grupo)
+        selecionadas = ordem[posicao < meses]
+
+        self.unidade = unidade[selecionadas]
+        self.competencia = competencia[selecionadas]
+        self.consumo = np.array(consumos, dtype=float)[selecionadas]
+
+        # Atributos da unidade vêm da auditoria mais recente (valem para todos os meses simulados)
+        mais_recente = np.zeros(len(self.instalacoes), dtype=np.intp)
+        ordem_id = np.argsort(ids, kind='stable')
+        mais_recente[unidade[ordem_id]] = ordem_id
+        self.distribuidora = _Coluna.codificar(_texto(distribuidoras, maiusculas=True)[mais_recente])
+        self.subgrupo = _Coluna.codificar(_texto(subgrupos, maiusculas=True)[mais_recente])
+        self.tipo_ligacao = _Coluna.codificar(_texto(tipos)[mais_recente])
+
+    def __len__(self):
+        return len(self.instalacoes)
+
+    def atributos(self, indice: int) -> Dict[str, Any]:
+        return {
+            'numero_instalacao': str(self.instalacoes[indice]),
+            'distribuidora': self.distribuidora.valor(indice),
+            'subgrupo': self.subgrupo.valor(indice),
+            'tipo_ligacao': self.tipo_ligacao.valor(indice)
+        }
+
+
+class SimuladorTarifas:
+    """Simulação de cenários tarifários sobre o histórico armazenado, com cache por cenário"""
+
+    def __init__(self, regras=None, meses: int = MESES_SIMULACAO, max_cenarios: int = MAX_CENARIOS):
+        self._regras = regras
+        self.meses = meses
+        self.max_cenarios = max_cenarios
+        self._base: Optional[BaseConsumo] = None
+        self._versao_dados: Optional[tuple] = None
+        self._cenarios: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.meses = app.config.get('SIMULACAO_MESES', self.meses)
+        self.max_cenarios = app.config.get('SIMULACAO_MAX_CENARIOS', self.max_cenarios)
+
+    @property
+    def regras(self):
+        if self._regras is None:
+            from src.processamento import regras_auditoria
+            self._regras = regras_auditoria
+        return self._regras
+
+    def _carregar(self, caminho_db: str) -> Tuple[BaseConsumo, tuple]:
+        """Base de consumos, relida só quando há auditorias novas ou removidas"""
+        conexao = sqlite3.connect(caminho_db, timeout=30)
+        try:
+            versao = conexao.execute('SELECT MAX(id), COUNT(*) FROM auditoria').fetchone()
+            with self._lock:
+                if self._base is not None and self._versao_dados == versao:
+                    return self._base, versao
+            linhas = conexao.execute(_CONSULTA_CONSUMOS).fetchall()
+        finally:
+            conexao.close()
+
+        base = BaseConsumo(linhas, self.meses)
+        with self._lock:
+            self._base, self._versao_dados = base, versao
+            self._cenarios.clear()
+        return base, versao
+
+    def _custos(self, base: BaseConsumo, unidade, competencia, consumo,
+                cenario: Optional[Cenario]) -> 'np.ndarray':
+        """Valor de cada mês (energia com ICMS) na situação atual (cenario None) ou no cenário"""
+        tabela = self.regras.tabela_tarifas
+        distribuidora = base.distribuidora[unidade]
+        subgrupo = base.subgrupo[unidade]
+        tipo_ligacao = base.tipo_ligacao[unidade]
+        if cenario is not None and cenario.subgrupo:
+            subgrupo = _Coluna.constante(cenario.subgrupo, len(unidade))
+        if cenario is not None and cenario.tipo_ligacao:
+            tipo_ligacao = _Coluna.constante(cenario.tipo_ligacao, len(unidade))
+
+        def tarifa_total(nome_distribuidora, nome_subgrupo, nome_competencia):
+            tarifa = tabela.tarifa(nome_distribuidora or None, nome_subgrupo, nome_competencia)
+            return tarifa['TE'] + tarifa['TUSD'] if tarifa is not None else np.nan
+
+        convencional = _mapear(tarifa_total, distribuidora, subgrupo, competencia)
+        minimo = _mapear(lambda tipo: self.regras.custo_disponibilidade.get(tipo, 0), tipo_ligacao)
+
+        if cenario is None or cenario.modalidade == 'convencional':
+            energia = np.maximum(consumo, minimo) * convencional
+        else:
+            fracoes = {'ponta': cenario.ponta, 'intermediario': cenario.intermediario,
+                       'fora_ponta': 1 - cenario.ponta - cenario.intermediario}
+            tarifa_media = np.zeros(len(unidade))
+            for posto in POSTOS:
+                def tarifa_posto(nome_distribuidora, nome_subgrupo, nome_competencia, posto=posto):
+                    if nome_subgrupo not in SUBGRUPOS_TARIFA_BRANCA:
+                        return np.nan
+                    tarifa = tabela.tarifa(nome_distribuidora or None, f'{nome_subgrupo}_BRANCA_{posto.upper()}',
+                                           nome_competencia)
+                    if tarifa is not None:
+                        return tarifa['TE'] + tarifa['TUSD']
+                    return tarifa_total(nome_distribuidora, nome_subgrupo, nome_competencia) * \
+                        FATORES_TARIFA_BRANCA[posto]
+                tarifa_media += fracoes[posto] * _mapear(tarifa_posto, distribuidora, subgrupo, competencia)
+            # Abaixo do mínimo, a diferença é cobrada pela tarifa convencional
+            energia = consumo * tarifa_media + np.maximum(minimo - consumo, 0) * convencional
+
+        aliquota = _mapear(
+            lambda nome_distribuidora, nome_competencia:
+                tabela.aliquota_icms(nome_distribuidora or None, nome_competencia) or 0.0,
+            distribuidora, competencia
+        )
+        # ICMS calculado "por dentro", como na conta
+        return energia / (1 - aliquota)
+
+    def simular(self, caminho_db: str, cenario: Cenario) -> Dict[str, Any]:
+        """Custo atual e no cenário de cada unidade (cache por cenário, dados e tarifas)"""
+        if np is None:
+            raise RuntimeError('NumPy é necessário para a simulação de tarifas')
+        base, versao_dados = self._carregar(caminho_db)
+        chave = (versao_dados, self.regras.tabela_tarifas.versao, cenario.chave)
+        with self._lock:
+            resultado = self._cenarios.get(chave)
+            if resultado is not None:
+                self._cenarios.move_to_end(chave)
+                return resultado
+
+        atual = self._custos(base, base.unidade, base.competencia, base.consumo, None)
+        simulado = self._custos(base, base.unidade, base.competencia, base.consumo, cenario)
+        # Meses sem tarifa (subgrupo desconhecido ou sem direito à tarifa branca) ficam fora
+        validos = ~(np.isnan(atual) | np.isnan(simulado))
+        unidades = len(base)
+        meses = np.bincount(base.unidade, weights=validos, minlength=unidades)
+        custo_atual = np.bincount(base.unidade, weights=np.where(validos, atual, 0), minlength=unidades)
+        custo_simulado = np.bincount(base.unidade, weights=np.where(validos, simulado, 0), minlength=unidades)
+        economia = custo_atual - custo_simulado
+        with np.errstate(divide='ignore', invalid='ignore'):
+            economia_anual = np.where(meses > 0, economia * 12 / meses, 0.0)
+
+        resultado = {
+            'base': base, 'meses': meses, 'custo_atual': custo_atual, 'custo_simulado': custo_simulado,
+            'economia': economia, 'economia_anual': economia_anual
+        }
+        with self._lock:
+            self._cenarios[chave] = resultado
+            while len(self._cenarios) > self.max_cenarios:
+                self._cenarios.popitem(last=False)
+        return resultado
+
+    def simular_instalacao(self, caminho_db: str, numero_instalacao: str, cenario: Cenario) -> Optional[Dict[str, Any]]:
+        """Contas de uma unidade mês a mês na situação atual e no cenário"""
+        if np is None:
+            raise RuntimeError('NumPy é necessário para a simulação de tarifas')
+        base, _ = self._carregar(caminho_db)
+        indice = int(np.searchsorted(base.instalacoes, numero_instalacao))
+        if indice >= len(base) or base.instalacoes[indice] != numero_instalacao:
+            return None
+
+        linhas = np.flatnonzero(base.unidade == indice)
+        linhas = linhas[np.argsort(base.competencia.codigos[linhas])]
+        unidade, competencia, consumo = base.unidade[linhas], base.competencia[linhas], base.consumo[linhas]
+        atual = self._custos(base, unidade, competencia, consumo, None)
+        simulado = self._custos(base, unidade, competencia, consumo, cenario)
+        validos = ~(np.isnan(atual) | np.isnan(simulado))
+
+        meses = [
+            {'competencia': comp, 'consumo_kwh': kwh, 'valor_atual': round(valor_atual, 2),
+             'valor_simulado': round(valor_simulado, 2), 'economia': round(valor_atual - valor_simulado, 2)}
+            for comp, kwh, valor_atual, valor_simulado in zip(
+                [competencia.valores[codigo] for codigo in competencia.codigos[validos].tolist()],
+                consumo[validos].tolist(),
+                atual[validos].tolist(), simulado[validos].tolist()
+            )
+        ]
+        total_atual = float(atual[validos].sum())
+        total_simulado = float(simulado[validos].sum())
+        return {
+            **base.atributos(indice),
+            'cenario': cenario.to_dict(),
+            'aplicavel': bool(meses),
+            'meses': meses,
+            'total_atual': round(total_atual, 2),
+            'total_simulado': round(total_simulado, 2),
+            'economia': round(total_atual - total_simulado, 2),
+            'economia_anual': round((total_atual - total_simulado) * 12 / len(meses), 2) if meses else 0.0
+        }
+
+    def ranking(self, caminho_db: str, cenario: Cenario, limite: int = 50,
+                economia_minima: float = 0.0) -> Dict[str, Any]:
+        """Unidades com maior economia anual no cenário e o total da carteira"""
+        resultado = self.simular(caminho_db, cenario)
+        base = resultado['base']
+        economia_anual = resultado['economia_anual']
+        simuladas = resultado['meses'] > 0
+        candidatas = np.flatnonzero(simuladas & (economia_anual > economia_minima))
+        # Seleção parcial das maiores economias antes de ordenar
+        if len(candidatas) > limite:
+            candidatas = candidatas[np.argpartition(-economia_anual[candidatas], limite - 1)[:limite]]
+        candidatas = candidatas[np.argsort(-economia_anual[candidatas], kind='stable')]
+
+        unidades = [
+            {
+                **base.atributos(indice),
+                'meses': int(resultado['meses'][indice]),
+                'custo_atual': round(float(resultado['custo_atual'][indice]), 2),
+                'custo_simulado': round(float(resultado['custo_simulado'][indice]), 2),
+                'economia': round(float(resultado['economia'][indice]), 2),
+                'economia_anual': round(float(economia_anual[indice]), 2),
+                'economia_percentual': round(
+                    float(resultado['economia'][indice] / resultado['custo_atual'][indice]), 4
+                ) if resultado['custo_atual'][indice] else 0.0
+            }
+            for indice in candidatas.tolist()
+        ]
+        com_economia = simuladas & (economia_anual > economia_minima)
+        return {
+            'cenario': cenario.to_dict(),
+            'carteira': {
+                'unidades': len(base),
+                'unidades_simuladas': int(simuladas.sum()),
+                'unidades_com_economia': int(com_economia.sum()),
+                'economia_anual_total': round(float(economia_anual[com_economia].sum()), 2)
+            },
+            'unidades': unidades
+        }
+
+
+simulador_tarifas = SimuladorTarifas()
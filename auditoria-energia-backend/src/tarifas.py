@@ -0,0 +1,224 @@
+"""
+Módulo da tabela de tarifas vigentes por distribuidora, subgrupo e período
+As tarifas (TE/TUSD), bandeiras e alíquotas de ICMS mudam com o tempo; cada
+registro vale a partir da sua vigência até a vigência seguinte da mesma chave
+
+Formato do arquivo JSON aceito por carregar_json:
+
+    {
+        "tarifas": [{"distribuidora": "ENERGISA RONDÔNIA", "subgrupo": "B3",
+                     "vigencia": "2024-12", "TE": 0.25141, "TUSD": 0.27440}],
+        "bandeiras": [{"vigencia": "2024-01", "bandeira": "amarela", "valor": 0.01885}],
+        "icms": [{"distribuidora": "ENERGISA RONDÔNIA", "vigencia": "2024-01", "aliquota": 0.175}]
+    }
+
+A distribuidora '*' vale para qualquer distribuidora sem registro próprio.
+O banco SQLite aceito por carregar_sqlite tem as tabelas tarifas, bandeiras
+e icms com as mesmas colunas
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from bisect import bisect_right
+from typing import Dict, List, Any, Optional, Tuple
+
+# Distribuidora curinga usada quando não há registro específico
+QUALQUER_DISTRIBUIDORA = '*'
+
+# Vigência dos valores de referência (anterior a qualquer conta)
+VIGENCIA_INICIAL = '0000-01'
+
+# Limite de consultas memorizadas no cache quente
+TAMANHO_CACHE = 65536
+
+
+def competencia_de(mes_referencia: Any) -> Optional[str]:
+    """Converte '05/2025' em '2025-05', formato que ordena cronologicamente"""
+    if not mes_referencia or '/' not in str(mes_referencia):
+        return None
+    mes, _, ano = str(mes_referencia).partition('/')
+    if not (mes.isdigit() and ano.isdigit()):
+        return None
+    return f"{int(ano):04d}-{int(mes):02d}"
+
+
+def _normalizar_vigencia(vigencia: str) -> str:
+    """Aceita 'AAAA-MM', 'AAAA-MM-DD' ou 'MM/AAAA' e retorna 'AAAA-MM'"""
+    vigencia = str(vigencia)
+    if '/' in vigencia:
+        return competencia_de(vigencia) or VIGENCIA_INICIAL
+    return vigencia[:7]
+
+
+def _normalizar_distribuidora(distribuidora: Any) -> str:
+    return str(distribuidora).strip().upper() if distribuidora else QUALQUER_DISTRIBUIDORA
+
+
+class _Serie:
+    """Valores de uma chave ordenados por vigência, para busca binária"""
+
+    __slots__ = ('vigencias', 'valores')
+
+    def __init__(self, registros: List[Tuple[str, Any]]):
+        registros = sorted(registros, key=lambda registro: registro[0])
+        self.vigencias = [vigencia for vigencia, _ in registros]
+        self.valores = [valor for _, valor in registros]
+
+    def vigente(self, competencia: Optional[str]) -> Any:
+        """Valor em vigor na competência (o mais recente se a competência for desconhecida)"""
+        if competencia is None:
+            return self.valores[-1]
+        posicao = bisect_right(self.vigencias, competencia) - 1
+        return self.valores[posicao] if posicao >= 0 else None
+
+
+class TabelaTarifas:
+    """Tarifas indexadas por (distribuidora, subgrupo) com busca por vigência em O(log n)"""
+
+    def __init__(self):
+        self._tarifas: Dict[Tuple[str, str], _Serie] = {}
+        self._bandeiras: Dict[str, _Serie] = {}
+        self._icms: Dict[str, _Serie] = {}
+        self._cache: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+        self._registros_base: Dict[str, List[Dict[str, Any]]] = {}
+        self.versao = 'vazia'
+
+    @classmethod
+    def de_valores_padrao(cls, tarifas_grupo_b: Dict[str, Dict[str, float]],
+                          bandeiras_tarifarias: Dict[str, float],
+                          aliquota_icms: float) -> 'TabelaTarifas':
+        """
+        Cria a tabela com valores de referência válidos para qualquer distribuidora e
+        período; eles continuam valendo como base nas cargas seguintes
+        """
+        tabela = cls()
+        tabela._registros_base = {
+            'tarifas': [
+                {'distribuidora': QUALQUER_DISTRIBUIDORA, 'subgrupo': subgrupo,
+                 'vigencia': VIGENCIA_INICIAL, 'TE': valores['TE'], 'TUSD': valores['TUSD']}
+                for subgrupo, valores in tarifas_grupo_b.items()
+            ],
+            'bandeiras': [
+                {'vigencia': VIGENCIA_INICIAL, 'bandeira': bandeira, 'valor': valor}
+                for bandeira, valor in bandeiras_tarifarias.items()
+            ],
+            'icms': [
+                {'distribuidora': QUALQUER_DISTRIBUIDORA, 'vigencia': VIGENCIA_INICIAL,
+                 'aliquota': aliquota_icms}
+            ]
+        }
+        tabela.carregar({})
+        return tabela
+
+    def carregar(self, dados: Dict[str, List[Dict[str, Any]]]):
+        """Substitui a tabela pelos registros informados e invalida o cache quente"""
+        dados = {
+            secao: self._registros_base.get(secao, []) + list(dados.get(secao, []))
+            for secao in ('tarifas', 'bandeiras', 'icms')
+        }
+        tarifas: Dict[Tuple[str, str], List[Tuple[str, Any]]] = {}
+        for registro in dados.get('tarifas', []):
+            chave = (_normalizar_distribuidora(registro.get('distribuidora')), str(registro['subgrupo']))
+            tarifas.setdefault(chave, []).append((
+                _normalizar_vigencia(registro['vigencia']),
+                {'TE': float(registro['TE']), 'TUSD': float(registro['TUSD'])}
+            ))
+
+        bandeiras: Dict[str, List[Tuple[str, Any]]] = {}
+        for registro in dados.get('bandeiras', []):
+            bandeiras.setdefault(str(registro['bandeira']).lower(), []).append(
+                (_normalizar_vigencia(registro['vigencia']), float(registro['valor']))
+            )
+
+        icms: Dict[str, List[Tuple[str, Any]]] = {}
+        for registro in dados.get('icms', []):
+            icms.setdefault(_normalizar_distribuidora(registro.get('distribuidora')), []).append(
+                (_normalizar_vigencia(registro['vigencia']), float(registro['aliquota']))
+            )
+
+        conteudo = json.dumps(dados, sort_keys=True, default=str).encode('utf-8')
+        with self._lock:
+            self._tarifas = {chave: _Serie(registros) for chave, registros in tarifas.items()}
+            self._bandeiras = {chave: _Serie(registros) for chave, registros in bandeiras.items()}
+            self._icms = {chave: _Serie(registros) for chave, registros in icms.items()}
+            self._cache = {}
+            self.versao = hashlib.sha256(conteudo).hexdigest()[:16]
+
+    def carregar_json(self, caminho: str):
+        with open(caminho, encoding='utf-8') as arquivo:
+            self.carregar(json.load(arquivo))
+
+    def carregar_sqlite(self, caminho: str):
+        conexao = sqlite3.connect(caminho)
+        conexao.row_factory = sqlite3.Row
+        try:
+            self.carregar({
+                tabela: [dict(linha) for linha in conexao.execute(f'SELECT * FROM {tabela}')]
+                for tabela in ('tarifas', 'bandeiras', 'icms')
+            })
+        finally:
+            conexao.close()
+
+    def carregar_arquivo(self, caminho: str):
+        """Carrega a tabela de um arquivo .json ou de um banco SQLite"""
+        if caminho.lower().endswith('.json'):
+            self.carregar_json(caminho)
+        else:
+            self.carregar_sqlite(caminho)
+
+    def _consultar(self, chave: tuple, buscar) -> Any:
+        """Consulta com cache quente; o cache é descartado a cada nova carga"""
+        cache = self._cache
+        try:
+            return cache[chave]
+        except KeyError:
+            pass
+        valor = buscar()
+        if len(cache) >= TAMANHO_CACHE:
+            cache.clear()
+        cache[chave] = valor
+        return valor
+
+    def tarifa(self, distribuidora: Any, subgrupo: str,
+               competencia: Optional[str]) -> Optional[Dict[str, float]]:
+        """Tarifas TE/TUSD vigentes para a distribuidora e subgrupo na competência"""
+        distribuidora = _normalizar_distribuidora(distribuidora)
+
+        def buscar():
+            # Sem registro da distribuidora em vigor, vale o registro geral
+            for chave in ((distribuidora, subgrupo), (QUALQUER_DISTRIBUIDORA, subgrupo)):
+                serie = self._tarifas.get(chave)
+                valor = serie.vigente(competencia) if serie is not None else None
+                if valor is not None:
+                    return valor
+            return None
+
+        return self._consultar(('tarifa', distribuidora, subgrupo, competencia), buscar)
+
+    def bandeira(self, bandeira: str, competencia: Optional[str]) -> Optional[float]:
+        """Valor em R$/kWh da bandeira vigente na competência"""
+        def buscar():
+            serie = self._bandeiras.get(bandeira)
+            return serie.vigente(competencia) if serie is not None else None
+
+        return self._consultar(('bandeira', bandeira, competencia), buscar)
+
+    def aliquota_icms(self, distribuidora: Any, competencia: Optional[str]) -> Optional[float]:
+        """Alíquota de ICMS vigente para a distribuidora na competência"""
+        distribuidora = _normalizar_distribuidora(distribuidora)
+
+        def buscar():
+            for chave in (distribuidora, QUALQUER_DISTRIBUIDORA):
+                serie = self._icms.get(chave)
+                valor = serie.vigente(competencia) if serie is not None else None
+                if valor is not None:
+                    return valor
+            return None
+
+        return self._consultar(('icms', distribuidora, competencia), buscar)
+
+    def subgrupos(self) -> List[str]:
+        return sorted({subgrupo for _, subgrupo in self._tarifas})
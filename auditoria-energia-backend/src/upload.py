@@ -0,0 +1,229 @@
+"""
+Módulo de recebimento de uploads em streaming
+Os arquivos enviados são gravados uma única vez, direto no diretório de uploads,
+enquanto o hash é calculado e o tipo real é validado pelos bytes iniciais
+"""
+
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Union
+
+from flask import Request, current_app
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+
+from src.metricas import duracao_etapa, bytes_upload, arquivos_upload
+
+# Diretório padrão dos uploads
+PASTA_UPLOADS = '/tmp/uploads'
+
+# Tamanho máximo de cada arquivo enviado (bytes)
+TAMANHO_MAXIMO_ARQUIVO = 50 * 1024 * 1024
+
+# Assinaturas (magic bytes) aceitas para cada extensão
+ASSINATURAS = {
+    'pdf': (b'%PDF-',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'jpg': (b'\xff\xd8\xff',),
+    'jpeg': (b'\xff\xd8\xff',),
+    'zip': (b'PK\x03\x04', b'PK\x05\x06'),
+}
+TAMANHO_ASSINATURA = max(len(assinatura) for lista in ASSINATURAS.values() for assinatura in lista)
+
+
+class UploadInvalido(BadRequest):
+    """Conteúdo do arquivo não corresponde à extensão informada"""
+
+
+class ArquivoEmRecebimento:
+    """
+    Destino de um arquivo do multipart: grava em disco, calcula o SHA-256,
+    limita o tamanho e confere a assinatura à medida que os blocos chegam
+    """
+
+    def __init__(self, pasta: str, nome_original: Optional[str], tamanho_maximo: int):
+        os.makedirs(pasta, exist_ok=True)
+        self.nome_original = nome_original or ''
+        self.extensao = self.nome_original.rsplit('.', 1)[1].lower() if '.' in self.nome_original else ''
+        self.tamanho_maximo = tamanho_maximo
+        self.tamanho = 0
+        self._hash = hashlib.sha256()
+        self._inicio = b''
+        self._assinatura_conferida = self.extensao not in ASSINATURAS
+        self._finalizado = False
+        self.inicio_recebimento = time.perf_counter()
+        self._arquivo = tempfile.NamedTemporaryFile(
+            dir=pasta, prefix='upload_', suffix='.parcial', delete=False
+        )
+        self.caminho = self._arquivo.name
+
+    @property
+    def hash(self) -> str:
+        return self._hash.hexdigest()
+
+    def write(self, dados: bytes) -> int:
+        self.tamanho += len(dados)
+        if self.tamanho > self.tamanho_maximo:
+            self.descartar()
+            arquivos_upload.inc(resultado='muito_grande')
+            raise RequestEntityTooLarge(f'Arquivo excede o limite de {self.tamanho_maximo} bytes')
+
+        if not self._assinatura_conferida:
+            self._inicio += dados[:TAMANHO_ASSINATURA]
+            if len(self._inicio) >= TAMANHO_ASSINATURA:
+                self._conferir_assinatura()
+
+        self._hash.update(dados)
+        return self._arquivo.write(dados)
+
+    def _conferir_assinatura(self):
+        self._assinatura_conferida = True
+        if not any(self._inicio.startswith(assinatura) for assinatura in ASSINATURAS[self.extensao]):
+            self.descartar()
+            arquivos_upload.inc(resultado='invalido')
+            raise UploadInvalido(f'Conteúdo do arquivo não corresponde ao tipo {self.extensao}')
+
+    def seek(self, *args):
+        # O parser volta ao início ao terminar: é o momento de validar arquivos curtos
+        if not self._assinatura_conferida:
+            self._conferir_assinatura()
+        return self._arquivo.seek(*args)
+
+    def finalizar(self, caminho_final: str) -> str:
+        """Fecha o arquivo e o move para o nome definitivo (mesmo diretório, sem cópia)"""
+        self._arquivo.close()
+        os.replace(self.caminho, caminho_final)
+        self.caminho = caminho_final
+        self._finalizado = True
+        return caminho_final
+
+    def descartar(self):
+        """Fecha e remove o arquivo parcial"""
+        self._arquivo.close()
+        try:
+            os.remove(self.caminho)
+        except OSError:
+            pass
+
+    def close(self):
+        # Chamado pelo Flask ao fim da requisição: arquivos não aproveitados são removidos
+        if not self._finalizado:
+            self.descartar()
+
+    def __getattr__(self, nome):
+        # read, readline, tell etc. vão direto para o arquivo em disco
+        if nome == '_arquivo':
+            raise AttributeError(nome)
+        return getattr(self._arquivo, nome)
+
+
+class RequestUpload(Request):
+    """Request que grava os arquivos do multipart diretamente no diretório de uploads"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        config = current_app.config
+        return ArquivoEmRecebimento(
+            config.get('UPLOAD_FOLDER', PASTA_UPLOADS), filename,
+            config.get('UPLOAD_TAMANHO_MAXIMO_ARQUIVO', TAMANHO_MAXIMO_ARQUIVO)
+        )
+
+
+def salvar_em(file, caminho: str) -> str:
+    """
+    Move o upload para o caminho definitivo e retorna o hash SHA-256 do conteúdo
+    Se o arquivo não veio por RequestUpload, copia em blocos calculando o hash
+    """
+    stream = file.stream
+    arquivos_upload.inc(resultado='aceito')
+    if isinstance(stream, ArquivoEmRecebimento):
+        stream.finalizar(caminho)
+        bytes_upload.inc(stream.tamanho)
+        duracao_etapa.observar(time.perf_counter() - stream.inicio_recebimento, etapa='recebimento')
+        return stream.hash
+
+    hash_conteudo = hashlib.sha256()
+    with duracao_etapa.cronometrar(etapa='recebimento'), open(caminho, 'wb') as destino:
+        while True:
+            bloco = stream.read(64 * 1024)
+            if not bloco:
+                break
+            hash_conteudo.update(bloco)
+            destino.write(bloco)
+            bytes_upload.inc(len(bloco))
+    return hash_conteudo.hexdigest()
+
+
+@contextmanager
+def mapear_arquivo(caminho: str) -> Iterator[Union[mmap.mmap, bytes]]:
+    """Mapeia o arquivo em memória para leitura sem carregá-lo inteiro"""
+    with open(caminho, 'rb') as arquivo:
+        if os.fstat(arquivo.fileno()).st_size == 0:
+            # Arquivos vazios não podem ser mapeados
+            yield b''
+            return
+        with mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            yield mapa
+
+
+class PoliticaRetencao:
+    """Remove periodicamente arquivos antigos do diretório de uploads"""
+
+    def __init__(self, pasta: str = PASTA_UPLOADS, idade_maxima: float = 24 * 3600,
+                 intervalo: float = 600, ignorar: tuple = ('cache',)):
+        self.pasta = pasta
+        self.idade_maxima = idade_maxima
+        self.intervalo = intervalo
+        self.ignorar = set(ignorar)
+        self._ultima_execucao = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Configura a pasta e a idade máxima a partir da configuração da aplicação"""
+        self.pasta = app.config.get('UPLOAD_FOLDER', self.pasta)
+        horas = app.config.get('UPLOAD_RETENCAO_HORAS')
+        if horas is not None:
+            self.idade_maxima = float(horas) * 3600
+
+    def talvez_executar(self) -> int:
+        """Executa a limpeza se o intervalo mínimo já passou; retorna os itens removidos"""
+        agora = time.time()
+        if agora - self._ultima_execucao < self.intervalo or not self._lock.acquire(blocking=False):
+            return 0
+        try:
+            self._ultima_execucao = agora
+            return self.executar(agora)
+        finally:
+            self._lock.release()
+
+    def executar(self, agora: Optional[float] = None) -> int:
+        """Remove arquivos e diretórios de lote mais antigos que a idade máxima"""
+        limite = (agora or time.time()) - self.idade_maxima
+        removidos = 0
+        try:
+            entradas = list(os.scandir(self.pasta))
+        except OSError:
+            return 0
+
+        for entrada in entradas:
+            if entrada.name in self.ignorar:
+                continue
+            try:
+                if entrada.stat(follow_symlinks=False).st_mtime >= limite:
+                    continue
+                if entrada.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entrada.path, ignore_errors=True)
+                else:
+                    os.remove(entrada.path)
+                removidos += 1
+            except OSError:
+                continue
+        return removidos
+
+
+retencao_uploads = PoliticaRetencao()
@@ -0,0 +1,13 @@
+"""
+Ponto de entrada WSGI para produção (o servidor de desenvolvimento continua em src/main.py)
+
+    gunicorn -c gunicorn.conf.py src.wsgi:app
+
+Com a pré-carga do gunicorn.conf.py este módulo é importado uma vez no processo
+mestre, antes do fork dos processos de trabalho
+"""
+
+from src.main import app
+from src.servidor import preparar_para_fork
+
+preparacao = preparar_para_fork(app)